@@ -0,0 +1,5 @@
+import time
+
+# app.py importeert deze module als eerste: het tijdstip waarop het importeren begon, zodat de importtijd
+# (streamlit, nest_asyncio, ...) gemeten kan worden zonder code vóór het importblok van app.py
+IMPORT_START = time.perf_counter()
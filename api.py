@@ -0,0 +1,224 @@
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import app
+import metrics
+
+logger = logging.getLogger("mba_zoekmachine.api")
+
+# Aantal verzoeken dat tegelijk afgehandeld wordt; de rest wacht in de wachtrij van de pool
+API_WORKERS = int(os.environ.get("MBA_API_WORKERS", "4"))
+
+
+############################################################
+# 1. Zoeken (zelfde logica als de Streamlit-applicatie)
+############################################################
+
+def available_gemeenten(manifest):
+    """
+    Gemeenten waarvoor een omgevingsplan in het corpus zit.
+    """
+    if manifest is not None:
+        return sorted({entry['name'] for entry in manifest if entry['category'] == "Omgevingsplan"})
+    cache = app.load_multiple_files()
+    return sorted({data['name'] for data in cache.values() if data['category'] == "Omgevingsplan"})
+
+
+def search(search_term, categories=None, gemeente=None, mode='headings', top_k=app.FULLTEXT_TOP_K):
+    """
+    Voert een zoekopdracht uit zoals main() in app.py dat doet (JSON, en bij geen resultaat Excel)
+    en retourneert een JSON-serialiseerbaar antwoord met de resultaten per categorie.
+    Met mode='fuzzy' worden ook koppen met een paar typefouten gevonden; met mode='fulltext' wordt
+    gerangschikt in de volledige tekst gezocht (top_k per categorie).
+    """
+    if mode == 'fulltext':
+        return search_fulltext(search_term, categories, gemeente, top_k)
+    start = time.perf_counter()
+    manifest = app.load_manifest()
+    if not categories:
+        categories = app.available_categories(manifest)
+    with metrics.query_trace(search_term, 'api', categories=sorted(categories), gemeente=gemeente, mode=mode):
+        heading_index = app.load_heading_index()
+        if manifest is not None:
+            cache = app.load_corpus_for_query(manifest, categories, gemeente, heading_index)
+        else:
+            cache = app.load_multiple_files()
+
+        grouped_results, _ = app.process_cache(
+            cache,
+            search_term,
+            categories,
+            selected_gemeente=gemeente,
+            heading_index=heading_index,
+            corpus_version=app.corpus_version(),
+            mode=app.MATCH_MODE_FUZZY if mode == 'fuzzy' else app.MATCH_MODE_EXACT
+        )
+        with metrics.stage('render'):
+            results = {}
+            for category in categories:
+                items = sorted(grouped_results.get(category, ()), key=lambda item: app.natural_sort_key(item[0]))
+                results[category] = [{'title': title, 'link': link, 'source': source} for title, link, source in items]
+    return {
+        'query': search_term,
+        'categories': categories,
+        'gemeente': gemeente,
+        'mode': mode,
+        'found': any(results.values()),
+        'results': results,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+    }
+
+
+def search_fulltext(search_term, categories=None, gemeente=None, top_k=app.FULLTEXT_TOP_K):
+    """
+    Full-text-zoekopdracht via de FTS5-database; de resultaten staan in volgorde van relevantie.
+    """
+    start = time.perf_counter()
+    if not categories:
+        categories = app.available_categories(app.load_manifest())
+    with metrics.query_trace(search_term, 'api', categories=sorted(categories), gemeente=gemeente, mode='fulltext'):
+        fulltext_results = app.search_fulltext(search_term, categories, gemeente, top_k)
+    results = {
+        category: [{'title': title, 'link': link, 'source': source, 'snippet': snippet}
+                   for title, link, source, snippet in items]
+        for category, items in fulltext_results.items()
+    }
+    return {
+        'query': search_term,
+        'categories': categories,
+        'gemeente': gemeente,
+        'mode': 'fulltext',
+        'found': any(results.values()),
+        'results': results,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+    }
+
+
+############################################################
+# 2. HTTP-server
+############################################################
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /search?q=...&category=...&gemeente=...  -> resultaten per categorie
+        (&mode=fuzzy: typefouten toegestaan; &mode=fulltext&k=20: gerangschikt zoeken in de volledige tekst)
+    GET /categories                              -> beschikbare categorieën en gemeenten
+    GET /metrics                                 -> tellers en fasetijden in Prometheus-tekstformaat
+    GET /health                                  -> status (ook of de warm-up klaar is), opstarttijden en cachetellers
+    """
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        try:
+            if parsed.path == '/search':
+                search_term = params.get('q', [''])[0].strip()
+                if not search_term:
+                    self.send_json(400, {'error': "Parameter 'q' (zoekterm) ontbreekt."})
+                    return
+                gemeente = params.get('gemeente', [None])[0] or None
+                mode = params.get('mode', ['headings'])[0]
+                if mode not in ('headings', 'fuzzy', 'fulltext'):
+                    self.send_json(400, {'error': "Parameter 'mode' moet 'headings', 'fuzzy' of 'fulltext' zijn."})
+                    return
+                try:
+                    top_k = int(params.get('k', [app.FULLTEXT_TOP_K])[0])
+                except ValueError:
+                    self.send_json(400, {'error': "Parameter 'k' moet een geheel getal zijn."})
+                    return
+                try:
+                    self.send_json(200, search(search_term, params.get('category'), gemeente, mode, top_k))
+                except FileNotFoundError as e:
+                    self.send_json(503, {'error': str(e)})
+            elif parsed.path == '/categories':
+                manifest = app.load_manifest()
+                self.send_json(200, {
+                    'categories': app.available_categories(manifest),
+                    'gemeenten': available_gemeenten(manifest)
+                })
+            elif parsed.path == '/metrics':
+                self.send_text(200, metrics.render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+            elif parsed.path == '/health':
+                self.send_json(200, {
+                    'status': 'warming_up' if app.start_background_warm_up().is_alive() else 'ok',
+                    'startup_s': metrics.startup_timings(),
+                    'result_cache': app.RESULT_CACHE.stats(),
+                    'excel_result_cache': app.EXCEL_RESULT_CACHE.stats(),
+                    'document_store': app.document_store().stats(),
+                    'segments': app.segment_loader().stats()
+                })
+            else:
+                self.send_json(404, {'error': f"Onbekend pad '{parsed.path}'."})
+        except Exception:
+            logger.exception("Fout bij afhandelen van %s", self.path)
+            self.send_json(500, {'error': "Interne fout bij het zoeken."})
+
+    def send_json(self, status, payload):
+        self.send_text(status, json.dumps(payload, ensure_ascii=False), 'application/json; charset=utf-8')
+
+    def send_text(self, status, text, content_type):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer die verzoeken afhandelt in een pool met een vast aantal threads, zodat het aantal
+    gelijktijdige zoekopdrachten begrensd blijft (ThreadingHTTPServer start per verzoek een thread).
+    """
+
+    def __init__(self, server_address, handler_class, workers):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_worker, request, client_address)
+
+    def process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON-zoek-API voor de MBA Zoekmachine.")
+    parser.add_argument('--host', default='127.0.0.1', help="Adres om op te luisteren (standaard 127.0.0.1).")
+    parser.add_argument('--port', type=int, default=8502, help="Poort (standaard 8502).")
+    parser.add_argument('--workers', type=int, default=API_WORKERS,
+                        help=f"Aantal gelijktijdig afgehandelde verzoeken (standaard {API_WORKERS}).")
+    args = parser.parse_args()
+
+    # Voorladen op de achtergrond: de server neemt meteen verzoeken aan, /health meldt wanneer het klaar is
+    app.start_background_warm_up()
+    server = PooledHTTPServer((args.host, args.port), SearchRequestHandler, max(1, args.workers))
+    logger.info("Zoek-API luistert op http://%s:%d met %d workers", args.host, args.port, max(1, args.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
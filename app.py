@@ -1,14 +1,28 @@
+import _startup  # als eerste: legt het begin van het importeren vast
 import streamlit as st
 import json
 import re
+import math
 import nest_asyncio
 import time
+import logging
+import gzip
+import sqlite3
+from contextlib import closing
+from urllib.request import pathname2url
+from collections import OrderedDict
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from collections import defaultdict
 from difflib import SequenceMatcher
 from typing import List
 
-# Nieuw voor Excel-ondersteuning:
-import pandas as pd
+# pandas (voor Excel-ondersteuning) wordt pas geïmporteerd als het nodig is; zie import_pandas
+import metrics
+import cache_files
+import excel_snapshot
+import mapped_corpus
 import os
 
 # Zorg ervoor dat er een event loop is voordat je nest_asyncio toepast
@@ -17,33 +31,983 @@ loop = asyncio.new_event_loop()
 asyncio.set_event_loop(loop)
 nest_asyncio.apply()
 
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+logger = logging.getLogger("mba_zoekmachine")
+metrics.record_startup('import', time.perf_counter() - _startup.IMPORT_START)
+
+# Cachebestanden worden parallel ingelezen: 'process' (schaalt met het aantal cores) of 'thread'
+LOAD_EXECUTOR = os.environ.get("MBA_LOAD_EXECUTOR", "process")
+LOAD_WORKERS = int(os.environ.get("MBA_LOAD_WORKERS", os.cpu_count() or 1))
+# Aantal processen voor de regex-scan per document in process_cache (1 = serieel)
+SEARCH_WORKERS = int(os.environ.get("MBA_SEARCH_WORKERS", "1"))
+# Categorieën in de volgorde waarin ze getoond worden
+ORDERED_CATEGORIES = [
+    "Besluit activiteiten leefomgeving",
+    "Omgevingsplan",
+    "Besluit bouwwerken leefomgeving",
+    "Besluit kwaliteit leefomgeving"
+]
+# Zoekmodi van process_cache: exact (substring / alle woorden) of met typefouten (trigram-index)
+MATCH_MODE_EXACT = 'exact'
+MATCH_MODE_FUZZY = 'fuzzy'
+# Full-text-index (SQLite FTS5) die jsonmaker.py bouwt, en het aantal resultaten per categorie daarin
+SECTIONS_DB_PATH = 'sections.db'
+FULLTEXT_TOP_K = int(os.environ.get("MBA_FULLTEXT_TOP_K", "20"))
+# Resultaatcache voor zoekopdrachten: maximaal aantal entries en levensduur in seconden
+RESULT_CACHE_SIZE = int(os.environ.get("MBA_RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = float(os.environ.get("MBA_RESULT_CACHE_TTL", "3600"))
+# Gemapt corpus (zie mapped_corpus.py); wordt gebruikt als het bestand er is en bij de JSON-bestanden past
+MAPPED_CORPUS_PATH = mapped_corpus.MAPPED_CORPUS_PATH
+# Indexsegmenten per document (jsonmaker.py --segments); een nieuwe generatie wordt zonder herstart opgepakt
+SEGMENTS_DIR = 'segments'
+# Geheugenbudget (MB) voor ingelezen omgevingsplannen in de documentstore; de besluiten blijven altijd geladen
+DOCUMENT_CACHE_MB = float(os.environ.get("MBA_DOCUMENT_CACHE_MB", "256"))
+
 
 ############################################################
 # 1. Hulpfuncties voor JSON-bestanden inladen en verwerken
 ############################################################
 
+# Cachebestanden van jsonmaker.py: JSON Lines met gzip-framing (één gzip-member per document)
+CACHE_FILES = [
+    'omgevingsplannen_1.jsonl.gz',
+    'omgevingsplannen_2.jsonl.gz',
+    'bal.jsonl.gz',
+    'bbl.jsonl.gz',
+    'bkl.jsonl.gz'
+]
+
+
+def resolve_cache_file(file_path):
+    """
+    Geeft het oude JSON-bestand (bijv. 'bal.json') terug als het JSON Lines-bestand nog niet bestaat,
+    zodat de applicatie ook werkt met caches van vóór het nieuwe formaat.
+    """
+    legacy_path = file_path[:-len('.jsonl.gz')] + '.json'
+    if not os.path.exists(file_path) and os.path.exists(legacy_path):
+        return legacy_path
+    return file_path
+
+
+def files_signature(file_paths):
+    """
+    Bepaalt per bestand (pad, mtime, grootte). Zolang deze signatuur gelijk blijft, hoeven
+    de bestanden niet opnieuw geparsed te worden; ontbrekende bestanden krijgen (pad, None, None).
+    """
+    signature = []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+            signature.append((file_path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((file_path, None, None))
+    return tuple(signature)
+
+
+def read_cache_file(file_path):
+    """
+    Leest één volledig cachebestand in als dict {url: record}. Draait in een worker van de
+    thread- of procespool; retourneert ook de duur, zodat die per bestand gerapporteerd kan worden.
+    """
+    start = time.perf_counter()
+    data = dict(cache_files.iter_cache_file(file_path))
+    return data, time.perf_counter() - start
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_files_cached(signature):
+    """
+    Parseert de cachebestanden één keer per serverproces; alle sessies delen het resultaat.
+    Door de signatuur als argument mee te geven wordt er alleen opnieuw geladen als een bestand wijzigt.
+    De bestanden worden tegelijk ingelezen in een thread- of procespool en daarna samengevoegd.
+    """
+    cache = {}
+    missing = [file_path for file_path, mtime, size in signature if mtime is None]
+    present = [(file_path, size) for file_path, mtime, size in signature if mtime is not None]
+    start = time.perf_counter()
+    workers = max(1, min(LOAD_WORKERS, len(present)))
+    executor_class = ProcessPoolExecutor if LOAD_EXECUTOR == "process" and workers > 1 else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        loaded = executor.map(read_cache_file, [file_path for file_path, size in present])
+        for (file_path, size), (data, seconds) in zip(present, loaded):
+            cache.update(data)  # Voeg inhoud van elk bestand toe aan de cache
+            logger.info("Geladen: %s (%d documenten, %.1f MB) in %.2fs",
+                        file_path, len(data), size / 1e6, seconds)
+    logger.info("Corpus geladen: %d documenten uit %d bestanden in %.2fs (%s, %d workers)",
+                len(cache), len(present), time.perf_counter() - start, executor_class.__name__, workers)
+    return cache, missing
+
+
+def cache_file_paths():
+    """
+    Bepaalt welke cachebestanden er zijn: de shards uit het manifest, of anders de vaste lijst CACHE_FILES
+    (met terugval op oude JSON-bestanden).
+    """
+    manifest = _load_manifest_cached(files_signature(['manifest.json']))
+    if manifest is not None and manifest.get('shards'):
+        return [shard['file'] for shard in manifest['shards']]
+    return [resolve_cache_file(path) for path in CACHE_FILES]
+
+
+def corpus_version():
+    """
+    Versie van het corpus: de signatuur (pad, mtime, grootte) van manifest, koppen-index, gemapt corpus,
+    de actuele segmentgeneratie, cachebestanden en het Excel-bestand. Verandert zodra jsonmaker.py iets ververst, waardoor oude resultaten in de
+    resultaatcache vanzelf niet meer gevonden worden.
+    """
+    return files_signature(['manifest.json', 'heading_index.json', MAPPED_CORPUS_PATH,
+                            os.path.join(SEGMENTS_DIR, 'CURRENT'), EXCEL_PATH] + cache_file_paths())
+
+
+class ResultCache:
+    """
+    Thread-safe LRU-cache met TTL voor zoekresultaten, met tellers voor hits, misses, verlopen
+    en verdrongen entries zodat de grootte afgestemd kan worden.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl_seconds=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # sleutel -> (tijdstip, waarde), minst recent gebruikt vooraan
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Retourneert (True, waarde) bij een geldige entry, anders (False, None).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'expired': self.expired,
+                'evictions': self.evictions
+            }
+
+
+def normalize_search_term(search_term):
+    """
+    Zoekterm zoals die gezocht en als cachesleutel gebruikt wordt: kleine letters, zonder witruimte aan
+    de randen en met enkele spaties, zodat 'Opslag  tank ' en 'opslag tank' dezelfde resultaten delen.
+    """
+    return ' '.join(search_term.lower().split())
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_result_caches():
+    """
+    Streamlit voert app.py bij elke interactie opnieuw uit; via st.cache_resource blijven de caches
+    over die herhalingen (en alle sessies) behouden.
+    """
+    return ResultCache(), ResultCache()
+
+
+# Eén cache per serverproces voor process_cache en één voor de Excel-terugval
+RESULT_CACHE, EXCEL_RESULT_CACHE = _shared_result_caches()
+
+
+def result_cache_gauges():
+    """
+    Stand van beide resultaatcaches voor de Prometheus-export (zie metrics.py).
+    """
+    gauges = {
+        'mba_result_cache_entries': ("Aantal entries in de resultaatcache.", {}),
+        'mba_result_cache_hits': ("Hits van de resultaatcache sinds de start.", {}),
+        'mba_result_cache_misses': ("Misses van de resultaatcache sinds de start.", {})
+    }
+    for name, cache in (('query', RESULT_CACHE), ('excel', EXCEL_RESULT_CACHE)):
+        stats = cache.stats()
+        labels = (('cache', name),)
+        gauges['mba_result_cache_entries'][1][labels] = stats['size']
+        gauges['mba_result_cache_hits'][1][labels] = stats['hits']
+        gauges['mba_result_cache_misses'][1][labels] = stats['misses']
+    return gauges
+
+
+metrics.register_gauges(result_cache_gauges)
+
+
+def copy_grouped_results(grouped_results):
+    """
+    Kopie van een {categorie: set(resultaten)}-dict, zodat aanroepers de gecachte sets niet wijzigen.
+    """
+    return defaultdict(set, {category: set(items) for category, items in grouped_results.items()})
+
+
+def available_categories(manifest):
+    """
+    Categorieën in de vaste volgorde, aangevuld met eventuele extra categorieën uit het manifest.
+    """
+    if manifest is None:
+        return list(ORDERED_CATEGORIES)
+    manifest_categories = {entry['category'] for entry in manifest}
+    return [c for c in ORDERED_CATEGORIES if c in manifest_categories] + \
+        sorted(manifest_categories - set(ORDERED_CATEGORIES))
+
+
 def load_multiple_files():
     """
     Laadt alle JSON-bestanden (omgevingsplannen en de besluiten) in één dict genaamd 'cache'.
+    Het resultaat wordt per serverproces gedeeld en pas opnieuw ingelezen als een bestand verandert.
     """
-    files = [
-        'omgevingsplannen_1.json',
-        'omgevingsplannen_2.json',
-        'bal.json',
-        'bbl.json',
-        'bkl.json'
+    with metrics.stage('load'):
+        cache, missing = _load_files_cached(files_signature(cache_file_paths()))
+    metrics.count('documents_loaded', len(cache))
+    for file_path in missing:
+        st.warning(f"Bestand '{file_path}' niet gevonden. Controleer of het bestand aanwezig is.")
+    return cache
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_mapped_corpus_cached(signature):
+    """
+    Opent het gemapte corpus één keer per serverproces (opnieuw zodra het of een bronbestand wijzigt).
+    Retourneert None als het er niet is, onleesbaar is, of ouder is dan de koppen-index of het manifest;
+    de app gebruikt dan de JSON-bestanden.
+    """
+    (corpus_path, mtime, size), *sources = signature
+    if mtime is None:
+        return None
+    try:
+        corpus = mapped_corpus.MappedCorpus(corpus_path)
+    except (OSError, ValueError) as e:
+        logger.warning("Gemapt corpus '%s' niet gebruikt: %s", corpus_path, e)
+        return None
+    # Een bronbestand dat ontbreekt is geen bezwaar (een replica kan alleen het gemapte corpus hebben)
+    stale = [path for path, mtime, size in sources if mtime is not None and (path, mtime, size) not in corpus.sources]
+    if stale:
+        logger.warning("Gemapt corpus '%s' is ouder dan %s en wordt niet gebruikt; bouw het opnieuw met "
+                       "'python mapped_corpus.py'.", corpus_path, ', '.join(stale))
+        return None
+    logger.info("Gemapt corpus geopend: %d documenten (%.1f MB)", len(corpus), size / 1e6)
+    return corpus
+
+
+def load_mapped_corpus():
+    return _load_mapped_corpus_cached(files_signature([MAPPED_CORPUS_PATH] + mapped_corpus.SOURCE_FILES))
+
+
+def prepare_index_entry(entry):
+    """
+    Vult een entry van de koppen-index (zoals jsonmaker.py die schrijft) aan met de opzoekstructuren
+    die de zoekfuncties gebruiken. Retourneert de entry.
+    """
+    # Vooraf de titels in kleine letters zetten, zodat een zoekopdracht alleen substring-checks doet.
+    # Artikelen staan wel in de koppenboom (voor ankers), maar zijn geen zoekresultaat.
+    entry['titles'] = [
+        (heading['title'], heading['title'].lower(), heading.get('anchor'))
+        for heading in entry['headings'] if heading['kind'].lower() != 'artikel'
     ]
-    cache = {}
-    for file_path in files:
+    # Inverted index per document: woord -> gesorteerde posities in entry['titles'], plus de gesorteerde
+    # woordenlijst voor prefix-lookups. Zo worden zoekopdrachten met meerdere woorden zonder scan beantwoord.
+    postings = defaultdict(list)
+    for position, (title, title_lower, anchor) in enumerate(entry['titles']):
+        for token in set(tokenize(title_lower)):
+            postings[token].append(position)
+    entry['postings'] = dict(postings)
+    entry['vocabulary'] = sorted(postings)
+    # Ankeropzoektabel: (soort, nummer) -> id uit de HTML, zodat een link één dict-lookup is
+    entry['anchors'] = {}
+    for heading in entry['headings']:
+        if heading.get('anchor'):
+            entry['anchors'].setdefault((normalize_heading_kind(heading['kind']), heading['number']), heading['anchor'])
+    return entry
+
+
+class SegmentGeneration:
+    """
+    Eén generatie indexsegmenten (zie IndexSegments in jsonmaker.py): het manifest van die generatie
+    en de voorbereide koppen-index. Wordt na het laden niet meer gewijzigd, zodat zoekopdrachten die
+    nog een oudere generatie vasthouden gewoon doorlopen.
+    """
+
+    def __init__(self, number, manifest, heading_index, index_files):
+        self.number = number
+        self.manifest = manifest
+        self.heading_index = heading_index
+        self.index_files = index_files  # url -> segmentbestand van de koppen-index
+
+
+class SegmentLoader:
+    """
+    Houdt de actuele generatie indexsegmenten bij. Bij elke aanvraag wordt (via de signatuur van CURRENT)
+    gecontroleerd of jsonmaker.py een nieuwe generatie heeft vastgelegd; zo ja, dan worden alleen de
+    gewijzigde segmenten geparsed (de rest komt uit de vorige generatie) en wordt de nieuwe generatie in
+    één keer actief. Werk dat daarna start ziet de nieuwe generatie; lopend werk houdt de oude.
+    """
+
+    def __init__(self, directory=SEGMENTS_DIR):
+        self.directory = directory
+        self.current_path = os.path.join(directory, 'CURRENT')
+        self._generation = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self.swaps = 0
+
+    def current(self):
+        """
+        Retourneert de actuele SegmentGeneration, of None als er geen segmenten zijn.
+        """
+        signature = self._current_signature()
+        if signature == self._signature:
+            return self._generation
+        with self._lock:
+            if signature != self._signature:
+                self._generation = self._load(signature)
+                self._signature = signature
+            return self._generation
+
+    def _current_signature(self):
+        # Met inode: CURRENT wordt via os.replace vervangen, en twee snel opeenvolgende generaties kunnen
+        # dezelfde mtime (grofkorrelige tijdstempels) en grootte hebben
         try:
-            with open(file_path, 'r', encoding='utf-8') as cache_file:
-                data = json.load(cache_file)
-                cache.update(data)  # Voeg inhoud van elk bestand toe aan de cache
+            stat = os.stat(self.current_path)
         except FileNotFoundError:
-            st.warning(f"Bestand '{file_path}' niet gevonden. Controleer of het bestand aanwezig is.")
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self, signature):
+        previous = self._generation
+        if signature is None:
+            return None
+        start = time.perf_counter()
+        try:
+            with open(self.current_path, 'r', encoding='utf-8') as current_file:
+                number = int(current_file.read().strip())
+            if previous is not None and previous.number == number:
+                return previous
+            with open(os.path.join(self.directory, f"generation-{number:06d}.json"), 'r', encoding='utf-8') as generation_file:
+                manifest = json.load(generation_file)['documents']
+            heading_index = {}
+            index_files = {}
+            parsed = 0
+            for entry in manifest:
+                url = entry['url']
+                index_files[url] = entry['index']
+                if previous is not None and previous.index_files.get(url) == entry['index']:
+                    heading_index[url] = previous.heading_index[url]
+                    continue
+                with open(entry['index'], 'r', encoding='utf-8') as index_file:
+                    heading_index[url] = prepare_index_entry(json.load(index_file))
+                parsed += 1
+        except (OSError, ValueError, KeyError) as e:
+            # Half opgeruimde of onleesbare generatie: de vorige blijft actief tot de volgende wijziging
+            logger.warning("Segmentgeneratie in '%s' niet geladen: %s", self.directory, e)
+            return previous
+        self.swaps += 1
+        logger.info("Segmentgeneratie %d actief: %d documenten, %d segmenten geparsed in %.2fs",
+                    number, len(manifest), parsed, time.perf_counter() - start)
+        return SegmentGeneration(number, manifest, heading_index, index_files)
+
+    def committed_ns(self):
+        """
+        mtime (ns) van CURRENT bij het laden van de actuele generatie, of None zonder generatie.
+        """
+        signature = self._signature
+        return signature[1] if signature is not None else None
+
+    def stats(self):
+        generation = self._generation
+        return {
+            'generation': generation.number if generation is not None else None,
+            'documents': len(generation.manifest) if generation is not None else 0,
+            'swaps': self.swaps
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def segment_loader():
+    """
+    Eén SegmentLoader per serverproces, gedeeld door alle sessies.
+    """
+    return SegmentLoader()
+
+
+def current_generation(manifest_path='manifest.json'):
+    """
+    De actuele generatie indexsegmenten, of None. Een generatie die ouder is dan manifest.json wordt
+    genegeerd: dan heeft jsonmaker.py daarna zonder --segments gedraaid en zijn de JSON-bestanden actueler.
+    """
+    loader = segment_loader()
+    generation = loader.current()
+    if generation is None:
+        return None
+    manifest_mtime = files_signature([manifest_path])[0][1]
+    if manifest_mtime is not None and manifest_mtime > loader.committed_ns():
+        logger.warning("Segmentgeneratie %d is ouder dan '%s' en wordt niet gebruikt.", generation.number, manifest_path)
+        return None
+    return generation
+
+
+def segment_gauges():
+    stats = segment_loader().stats()
+    return {
+        'mba_segment_generation': ("Actieve generatie indexsegmenten (-1 zonder segmenten).",
+                                   {(): stats['generation'] if stats['generation'] is not None else -1}),
+        'mba_segment_swaps': ("Aantal keer dat er een nieuwe generatie indexsegmenten actief werd.", {(): stats['swaps']})
+    }
+
+
+metrics.register_gauges(segment_gauges)
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_heading_index_cached(signature):
+    """
+    Parseert de koppen-index één keer per serverproces (opnieuw zodra het bestand wijzigt).
+    """
+    (index_path, mtime, size), = signature
+    if mtime is None:
+        return None
+    start = time.perf_counter()
+    with open(index_path, 'r', encoding='utf-8') as index_file:
+        index = json.load(index_file)
+    for entry in index.values():
+        prepare_index_entry(entry)
+    logger.info("Koppen-index geladen: %d documenten (%.1f MB) in %.2fs",
+                len(index), size / 1e6, time.perf_counter() - start)
+    return index
+
+
+def load_heading_index(index_path='heading_index.json'):
+    """
+    Laadt de koppen-index die jsonmaker.py bouwt (per URL alle Hoofdstuk/Afdeling/Paragraaf/§-koppen).
+    Met een actueel gemapt corpus komt de index daaruit, zonder JSON te parsen (zie mapped_corpus.py);
+    anders uit de actuele generatie indexsegmenten als jsonmaker.py die schrijft (--segments).
+    Retourneert None als er (nog) geen index is; de zoekfunctie valt dan terug op de regex-scan.
+    """
+    with metrics.stage('load'):
+        mapped = load_mapped_corpus()
+        if mapped is not None and mapped.heading_index is not None:
+            return mapped.heading_index
+        generation = current_generation()
+        if generation is not None:
+            return generation.heading_index
+        return _load_heading_index_cached(files_signature([index_path]))
+
+
+def fulltext_query(search_term):
+    """
+    Zet de zoekterm om in een FTS5-query: elk woord als los (gequote) token, alle woorden moeten voorkomen.
+    """
+    return ' '.join(f'"{token}"' for token in re.findall(r'\w+', search_term.lower()))
+
+
+def search_fulltext(search_term, selected_categories, selected_gemeente=None, top_k=FULLTEXT_TOP_K,
+                    sections_path=SECTIONS_DB_PATH):
+    """
+    Zoekt in de volledige tekst van alle secties (koppenpad en artikeltekst) via de FTS5-database en
+    retourneert per categorie de top_k beste secties op BM25-score (koppen wegen zwaarder dan tekst),
+    als lijst van (koppenpad, link, naam, fragment). De database wordt alleen-lezen geopend en blijft
+    op schijf; er wordt geen document-content in het geheugen geladen.
+    """
+    results = {category: [] for category in selected_categories}
+    query = fulltext_query(search_term)
+    if not query:
+        return results
+    if not os.path.exists(sections_path):
+        raise FileNotFoundError(f"Full-text-index '{sections_path}' niet gevonden. Draai jsonmaker.py (of --index-only).")
+    with metrics.stage('fulltext'), \
+            closing(sqlite3.connect(f"file:{pathname2url(os.path.abspath(sections_path))}?mode=ro", uri=True)) as connection:
+        for category in selected_categories:
+            sql = ("SELECT heading_path, url, name, anchor, snippet(sections, 1, '', '', '…', 16) "
+                   "FROM sections WHERE sections MATCH ? AND category = ?")
+            params = [query, category]
+            if category == "Omgevingsplan" and selected_gemeente:
+                sql += " AND lower(gemeente) = lower(?)"
+                params.append(selected_gemeente)
+            sql += " ORDER BY bm25(sections, 2.0, 1.0) LIMIT ?"
+            params.append(top_k)
+            for heading_path, url, name, anchor, snippet in connection.execute(sql, params):
+                results[category].append((heading_path, url + (f"#{anchor}" if anchor else ""), name, snippet))
+            metrics.count('results', len(results[category]))
+    return results
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_manifest_cached(signature):
+    """
+    Parseert het manifest één keer per serverproces (opnieuw zodra het bestand wijzigt).
+    """
+    (manifest_path, mtime, size), = signature
+    if mtime is None:
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def load_manifest(manifest_path='manifest.json'):
+    """
+    Laadt het manifest van jsonmaker.py: per document url, naam, categorie, bestand, offset en grootte,
+    zonder de content. Met indexsegmenten is dat het manifest van de actuele generatie.
+    Retourneert None als er geen manifest is.
+    """
+    generation = current_generation()
+    if generation is not None:
+        return generation.manifest
+    manifest = _load_manifest_cached(files_signature([manifest_path]))
+    return manifest['documents'] if manifest is not None else None
+
+
+def read_document(file_path, offset, size):
+    """
+    Leest één document-record uit een cachebestand op basis van byte-offset en -grootte.
+    In een .jsonl.gz-bestand is dat één los te decomprimeren gzip-member.
+    Retourneert (record, aantal bytes van de JSON na decompressie).
+    """
+    with open(file_path, 'rb') as cache_file:
+        cache_file.seek(offset)
+        data = cache_file.read(size)
+    if file_path.endswith('.gz'):
+        data = gzip.decompress(data)
+    return json.loads(data), len(data)
+
+
+class DocumentStore:
+    """
+    Thread-safe opslag van ingelezen document-records. De landelijke besluiten blijven resident (die zijn
+    bij vrijwel elke zoekopdracht nodig); omgevingsplannen staan in een LRU met een budget in bytes, zodat
+    het geheugen begrensd is door het budget en niet door het aantal gemeenten. De grootte van een
+    document is die van de JSON na decompressie. Een record wordt opnieuw ingelezen zodra het
+    cachebestand of de plek in het manifest verandert.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._resident = {}  # url -> (versie, record, bytes)
+        self._lru = OrderedDict()  # url -> (versie, record, bytes), minst recent gebruikt vooraan
+        self._lru_bytes = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def get(self, entry):
+        """
+        Retourneert de record van een manifest-regel, uit de store of (bij een miss) uit het cachebestand.
+        """
+        url = entry['url']
+        version = (entry['file'], entry['offset'], entry['size'], files_signature([entry['file']]))
+        resident = entry['category'] != "Omgevingsplan"
+        with self._lock:
+            stored = (self._resident if resident else self._lru).get(url)
+            if stored is not None and stored[0] == version:
+                if not resident:
+                    self._lru.move_to_end(url)
+                self.hits += 1
+                metrics.count('document_store_hits')
+                return stored[1]
+
+        # Buiten de lock inlezen, zodat andere zoekopdrachten niet wachten; in het ergste geval wordt een
+        # document tegelijk twee keer ingelezen
+        record, size = read_document(entry['file'], entry['offset'], entry['size'])
+        with self._lock:
+            self.loads += 1
+            if resident:
+                self._resident[url] = (version, record, size)
+            else:
+                previous = self._lru.pop(url, None)
+                if previous is not None:
+                    self._lru_bytes -= previous[2]
+                # Een document groter dan het hele budget wordt wel teruggegeven, maar niet bewaard
+                if size <= self.budget_bytes:
+                    self._lru[url] = (version, record, size)
+                    self._lru_bytes += size
+                while self._lru_bytes > self.budget_bytes:
+                    evicted_url, (_, _, evicted_size) = self._lru.popitem(last=False)
+                    self._lru_bytes -= evicted_size
+                    self.evictions += 1
+                    logger.info("Documentstore: %s verdrongen (%.1f MB)", evicted_url, evicted_size / 1e6)
+        metrics.count('document_store_loads')
+        return record
+
+    def clear(self):
+        with self._lock:
+            self._resident.clear()
+            self._lru.clear()
+            self._lru_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'resident_documents': len(self._resident),
+                'resident_bytes': sum(size for _, _, size in self._resident.values()),
+                'lru_documents': len(self._lru),
+                'lru_bytes': self._lru_bytes,
+                'budget_bytes': self.budget_bytes,
+                'loads': self.loads,
+                'hits': self.hits,
+                'evictions': self.evictions
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def document_store():
+    """
+    Eén documentstore per serverproces, gedeeld door alle sessies.
+    """
+    return DocumentStore(int(DOCUMENT_CACHE_MB * 1e6))
+
+
+def document_store_gauges():
+    """
+    Stand van de documentstore voor de Prometheus-export (zie metrics.py).
+    """
+    stats = document_store().stats()
+    return {
+        'mba_document_store_documents': ("Documenten in de documentstore.", {
+            (('pool', 'resident'),): stats['resident_documents'], (('pool', 'lru'),): stats['lru_documents']
+        }),
+        'mba_document_store_bytes': ("Grootte (JSON na decompressie) van de documenten in de documentstore.", {
+            (('pool', 'resident'),): stats['resident_bytes'], (('pool', 'lru'),): stats['lru_bytes']
+        }),
+        'mba_document_store_budget_bytes': ("Budget voor omgevingsplannen in de documentstore.",
+                                            {(): stats['budget_bytes']}),
+        'mba_document_store_events': ("Inleesacties, hits en verdringingen van de documentstore sinds de start.", {
+            (('event', 'load'),): stats['loads'], (('event', 'hit'),): stats['hits'],
+            (('event', 'eviction'),): stats['evictions']
+        })
+    }
+
+
+metrics.register_gauges(document_store_gauges)
+
+
+def load_document(entry):
+    """
+    Laadt de volledige record (naam, categorie, content) van één manifest-regel: uit het gemapte corpus
+    als dat er is (de page cache van het OS deelt het dan tussen processen), anders via de documentstore.
+    """
+    mapped = load_mapped_corpus()
+    if mapped is not None and entry['url'] in mapped:
+        metrics.count('documents_mapped')
+        return mapped.record(entry['url'])
+    return document_store().get(entry)
+
+
+def load_corpus_for_query(manifest, selected_categories, selected_gemeente=None, heading_index=None):
+    """
+    Bouwt een 'cache'-dict uit het manifest. Elk document krijgt naam en categorie (nodig voor de
+    basis-URLs in de Excel-zoekfunctie); 'content' wordt alleen ingelezen voor documenten die
+    daadwerkelijk doorzocht worden en niet in de koppen-index staan.
+    """
+    cache = {}
+    with metrics.stage('load'):
+        for entry in manifest:
+            record = {'name': entry['name'], 'category': entry['category']}
+            needed = entry['category'] in selected_categories and not (
+                entry['category'] == "Omgevingsplan" and selected_gemeente
+                and entry['name'].lower() != selected_gemeente.lower()
+            )
+            if needed and (heading_index is None or entry['url'] not in heading_index):
+                record['content'] = load_document(entry)['content']
+                metrics.count('documents_loaded')
+            cache[entry['url']] = record
     return cache
 
 
+def normalize_heading_kind(kind):
+    """
+    Normaliseert de soort kop ('§' en 'Paragraaf' zijn hetzelfde) voor de ankeropzoektabel.
+    """
+    kind = kind.lower()
+    return 'paragraaf' if kind == '§' else kind
+
+
+def find_anchor(index_entry, kind, number):
+    """
+    Zoekt het echte anker (id uit de HTML) van een kop op basis van soort en nummer.
+    Een verwijzing als 'paragraaf 3.3' kan in de wetgeving ook een afdeling of hoofdstuk zijn;
+    daarom wordt bij secties ook op de andere sectiesoorten gezocht.
+    """
+    if index_entry is None:
+        return None
+    kind = normalize_heading_kind(kind)
+    anchors = index_entry['anchors']
+    if (kind, number) in anchors:
+        return anchors[(kind, number)]
+    if kind != 'artikel':
+        for other_kind in ('paragraaf', 'afdeling', 'hoofdstuk'):
+            if (other_kind, number) in anchors:
+                return anchors[(other_kind, number)]
+    return None
+
+
+def tokenize(text):
+    """
+    Splitst tekst in woorden (kleine letters, zonder leestekens). Een nummer met punten ('22.3.1')
+    blijft één woord, zodat '3.2' niet als losse woorden '3' en '2' gezocht wordt.
+    """
+    return re.findall(r'\w+(?:\.\w+)*', text.lower())
+
+
+def substring_postings(index_entry, word):
+    """
+    Gesorteerde posities van de koppen met een woord waarin `word` voorkomt ('stof' vindt ook 'stoffen',
+    'tank' ook 'opslagtank'). Er wordt alleen in de (ontdubbelde) woordenlijst gezocht, niet in de koppen.
+    """
+    vocabulary = index_entry['vocabulary']
+    postings = index_entry['postings']
+    if isinstance(vocabulary, mapped_corpus.StringArray):
+        tokens = [vocabulary[i] for i in vocabulary.find(word)]
+    else:
+        tokens = [token for token in vocabulary if word in token]
+    if len(tokens) == 1:
+        return postings[tokens[0]]
+    return sorted({position for token in tokens for position in postings[token]})
+
+
+def intersect_postings(posting_lists):
+    """
+    Doorsnede van gesorteerde postinglijsten, te beginnen bij de kortste zodat het tussenresultaat klein blijft.
+    """
+    posting_lists = sorted(posting_lists, key=len)
+    result = posting_lists[0]
+    for other in posting_lists[1:]:
+        if not result:
+            break
+        merged = []
+        i = j = 0
+        while i < len(result) and j < len(other):
+            if result[i] == other[j]:
+                merged.append(result[i])
+                i += 1
+                j += 1
+            elif result[i] < other[j]:
+                i += 1
+            else:
+                j += 1
+        result = merged
+    return result
+
+
+def search_headings(index_entry, term):
+    """
+    Zoekt de term (case-insensitive) in de vooraf geëxtraheerde koppen van één document.
+    - Eén woord (een nummer met punten telt als één woord): de term moet als deel van de kop voorkomen
+      (substring, zoals voorheen).
+    - Meerdere woorden: elk woord moet als deel van de kop voorkomen, in willekeurige volgorde. De
+      postinglijsten bepalen de kandidaat-koppen; per kandidaat volgt dezelfde substring-controle.
+    Retourneert (titel, anker)-paren; het anker is None als de kop geen id had in de HTML.
+    """
+    words = list(dict.fromkeys(tokenize(term)))
+    titles = index_entry['titles']
+    if len(words) > 1 and 'postings' in index_entry:
+        positions = intersect_postings([substring_postings(index_entry, word) for word in words])
+        return [(titles[position][0], titles[position][2]) for position in positions
+                if all(word in titles[position][1] for word in words)]
+    lower_term = term.lower()
+    if isinstance(index_entry, mapped_corpus.MappedIndexEntry):
+        # Gemapt corpus: direct in de gemapte titeltekst zoeken, zonder alle titels te decoderen
+        return [(titles[position][0], titles[position][2]) for position in index_entry.find_titles(lower_term)]
+    return [(title, anchor) for title, title_lower, anchor in titles if lower_term in title_lower]
+
+
+def normalize_fuzzy(text):
+    """
+    Normalisatie voor fuzzy zoeken: kleine letters zonder spaties en leestekens, zodat
+    'opslag tank' en 'opslagtank' hetzelfde zijn.
+    """
+    return re.sub(r'[\W_]+', '', text.lower())
+
+
+def qgrams(text, q=3):
+    return {text[i:i + q] for i in range(len(text) - q + 1)}
+
+
+def trigrams(text):
+    return qgrams(text, 3)
+
+
+def fuzzy_max_distance(normalized_term):
+    """
+    Toegestaan aantal bewerkingen (invoegen, weglaten, vervangen) afhankelijk van de lengte van de term.
+    """
+    if len(normalized_term) < 4:
+        return 0
+    return 1 if len(normalized_term) < 8 else 2
+
+
+def within_substring_distance(pattern, text, max_distance):
+    """
+    True als `pattern` met hoogstens max_distance bewerkingen ergens als deel van `text` voorkomt
+    (Sellers: edit distance tegen het best passende deel van de tekst). Stopt zodra dat vaststaat.
+    """
+    previous = [0] * (len(text) + 1)  # een match mag overal in de tekst beginnen
+    for i, pattern_char in enumerate(pattern, 1):
+        current = [i]
+        for j, text_char in enumerate(text, 1):
+            current.append(min(previous[j - 1] + (pattern_char != text_char), previous[j] + 1, current[j - 1] + 1))
+        if min(current) > max_distance:
+            return False
+        previous = current
+    return min(previous) <= max_distance
+
+
+def within_edit_distance(a, b, max_distance):
+    """
+    True als de edit distance tussen a en b hoogstens max_distance is (met vroegtijdig stoppen).
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, a_char in enumerate(a, 1):
+        current = [i]
+        for j, b_char in enumerate(b, 1):
+            current.append(min(previous[j - 1] + (a_char != b_char), previous[j] + 1, current[j - 1] + 1))
+        if min(current) > max_distance:
+            return False
+        previous = current
+    return previous[-1] <= max_distance
+
+
+class TrigramIndex:
+    """
+    Trigram-index over genormaliseerde teksten. Kandidaten delen genoeg trigrammen met de zoekterm
+    (bij k bewerkingen verdwijnen er hoogstens 3k); alleen die worden met een begrensde edit distance
+    gecontroleerd. De kosten hangen zo af van het aantal kandidaten, niet van het aantal teksten.
+    Gelijke teksten worden één keer opgeslagen; `keys[i]` bevat alles wat bij tekst i hoort.
+    Voor korte termen garandeert de trigramgrens niets (zie search); daarvoor worden bij het eerste
+    gebruik ook bigram-postings opgebouwd.
+    """
+
+    def __init__(self, items):
+        self.texts = []
+        self.keys = []
+        self.postings = defaultdict(list)
+        self._bigram_postings = None
+        self._lock = threading.Lock()
+        text_ids = {}
+        for key, text in items:
+            text = normalize_fuzzy(text)
+            text_id = text_ids.get(text)
+            if text_id is None:
+                text_id = text_ids[text] = len(self.texts)
+                self.texts.append(text)
+                self.keys.append([])
+                for trigram in trigrams(text):
+                    self.postings[trigram].append(text_id)
+            self.keys[text_id].append(key)
+
+    def bigram_postings(self):
+        with self._lock:
+            if self._bigram_postings is None:
+                postings = defaultdict(list)
+                for text_id, text in enumerate(self.texts):
+                    for bigram in qgrams(text, 2):
+                        postings[bigram].append(text_id)
+                self._bigram_postings = postings
+            return self._bigram_postings
+
+    def search(self, term, substring=True):
+        """
+        Retourneert de sleutels van alle teksten die (als geheel, of bij substring=True als deel van de
+        tekst) binnen fuzzy_max_distance van de term liggen.
+        Eén bewerking raakt hoogstens q van de q-grammen van de term, dus een match deelt er minstens
+        (aantal verschillende q-grammen - q*k). Is die grens voor trigrammen kleiner dan 1 (bijv. 'tank'
+        tegen 'tamk': geen gedeeld trigram), dan wordt met bigrammen gefilterd, en lukt ook dat niet
+        (bijv. 'aaaa') dan worden alle teksten gecontroleerd.
+        """
+        pattern = normalize_fuzzy(term)
+        if len(pattern) < 3:
+            return []
+        max_distance = fuzzy_max_distance(pattern)
+        shared = defaultdict(int)
+        for q in (3, 2):
+            query_qgrams = qgrams(pattern, q)
+            min_shared = len(query_qgrams) - q * max_distance
+            if min_shared >= 1:
+                postings = self.postings if q == 3 else self.bigram_postings()
+                for qgram in query_qgrams:
+                    for text_id in postings.get(qgram, ()):
+                        shared[text_id] += 1
+                break
+        else:
+            min_shared = 0
+            shared = dict.fromkeys(range(len(self.texts)), 0)
+        verify = within_substring_distance if substring else within_edit_distance
+        keys = []
+        for text_id, count in shared.items():
+            if count >= min_shared and verify(pattern, self.texts[text_id], max_distance):
+                keys.extend(self.keys[text_id])
+        metrics.count('fuzzy_candidates', sum(1 for count in shared.values() if count >= min_shared))
+        return keys
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_heading_trigram_index_cached(signature):
+    """
+    Trigram-index over alle koppen uit de koppen-index; sleutel is (url, positie in entry['titles']).
+    Wordt pas gebouwd bij de eerste fuzzy zoekopdracht; signature: zie heading_index_signature.
+    """
+    heading_index = load_heading_index()
+    if heading_index is None:
+        return None
+    start = time.perf_counter()
+    index = TrigramIndex(
+        ((url, position), title_lower)
+        for url, entry in heading_index.items()
+        for position, (title, title_lower, anchor) in enumerate(entry['titles'])
+    )
+    logger.info("Trigram-index koppen: %d unieke titels in %.2fs", len(index.texts), time.perf_counter() - start)
+    return index
+
+
+def heading_index_signature():
+    """
+    Signatuur van de bestanden waar load_heading_index uit leest.
+    """
+    return files_signature(['heading_index.json', MAPPED_CORPUS_PATH, os.path.join(SEGMENTS_DIR, 'CURRENT')]
+                           + mapped_corpus.SOURCE_FILES)
+
+
+def search_headings_fuzzy(heading_index, urls, term):
+    """
+    Zoekt de term met typefouten in de koppen van de gegeven documenten.
+    Retourneert {url: [(titel, anker)]}.
+    """
+    trigram_index = _load_heading_trigram_index_cached(heading_index_signature())
+    if trigram_index is None:
+        return {}
+    urls = set(urls)
+    matches = defaultdict(list)
+    with metrics.stage('fuzzy'):
+        for url, position in trigram_index.search(term):
+            if url in urls and url in heading_index and position < len(heading_index[url]['titles']):
+                title, title_lower, anchor = heading_index[url]['titles'][position]
+                matches[url].append((title, anchor))
+    return matches
+
+
 def search_paragraphs(content, term):
     """
     Zoekt naar paragrafen, afdelingen, hoofdstukken, artikelen in de content.
@@ -65,6 +1029,7 @@ def generate_anchor_link(category, title, article_number=None):
     """
     Genereert enkel het fragment (beginnend met #), op basis van de categorie (Bal, Omgevingsplan, Bbl, Bkl)
     en de meegegeven titels/paragraafnummers.
+    Wordt alleen nog gebruikt als er geen koppen-index (met de echte ankers uit de HTML) beschikbaar is.
     """
     # Besluit activiteiten leefomgeving (Bal)
     if category == "Besluit activiteiten leefomgeving":
@@ -136,243 +1101,6 @@ def generate_anchor_link(category, title, article_number=None):
 
     return ""
 
-    """
-    Genereert enkel het fragment (beginnend met #), op basis van de categorie (Bal, Omgevingsplan, Bbl, Bkl)
-    en de meegegeven titels/paragraafnummers.
-    """
-
-    # ---------------------------------------------
-    # 1. Besluit activiteiten leefomgeving (Bal)
-    # ---------------------------------------------
-    if category == "Besluit activiteiten leefomgeving":
-        match = re.match(r"(paragraaf|Paragraaf|§|Afdeling|Hoofdstuk|Artikel)\s+([\d\.]+)", title, re.IGNORECASE)
-        if match:
-            type_part = match.group(1).lower()  # bv. 'paragraaf' of 'artikel'
-            numbers = match.group(2).split('.') # bv. ['3','4','3']
-
-            # Begin altijd met Hoofdstuk + eerste cijfer
-            anchor = f"#Hoofdstuk{numbers[0]}"
-
-            # Als er meerdere cijfers zijn, ga opbouwen:
-            # - Afdeling of Paragraaf
-            # - eventueel extra niveaus etc.
-            if len(numbers) >= 2:
-                if type_part == "afdeling":
-                    anchor += f"_Afdeling{numbers[0]}.{numbers[1]}"
-                elif type_part in ["paragraaf", "§"]:
-                    anchor += f"_Paragraaf{numbers[0]}.{numbers[1]}"
-
-            # Elke verdere stap is óf paragraaf/§ óf artikel, afhankelijk van wat je wilt
-            for i in range(2, len(numbers)):
-                if type_part in ["artikel", "artikel"]:
-                    # Alleen als echt 'Artikel' is opgegeven
-                    anchor += f"_Artikel{'.'.join(numbers[:i+1])}"
-                else:
-                    anchor += f"_Paragraaf{'.'.join(numbers[:i+1])}"
-
-            return anchor
-
-    # ---------------------------------------------
-    # 2. Omgevingsplan
-    # ---------------------------------------------
-    elif category == "Omgevingsplan":
-        # Als er expliciet 'artikel' werd gevonden, gebruik dan de article_number-anker
-        # Anders: gebruik de (meermaals) geneste paragraaf-anker
-        match = re.match(r"(artikel)\s+([\d\.]+)", title, re.IGNORECASE)
-        if match:
-            # Gebruiker zocht expliciet op 'artikel x.x'
-            article = match.group(2)
-            return f"#art_{article}"
-
-        else:
-            # We gaan uit van 'paragraaf ...' of '§ ...' of 'Hoofdstuk ...' etc.
-            # en bouwen subsections op
-            match_para = re.match(r"(paragraaf|Paragraaf|§|Afdeling|Hoofdstuk)\s+([\d\.]+)", title, re.IGNORECASE)
-            if match_para:
-                numbers = match_para.group(2).split('.')
-                # Voorbeeld: 22.3.4.3 -> ['22','3','4','3']
-
-                # Bouw het anker stap voor stap
-                if not numbers:
-                    return ""
-
-                # Eerste niveau: hoofdstuk
-                anchor = f"#chp_{numbers[0]}"
-
-                # Tweede niveau (als het er is): subchp
-                if len(numbers) >= 2:
-                    anchor += f"__subchp_{numbers[0]}.{numbers[1]}"
-
-                # Derde niveau (als het er is): subsec_22.3.4
-                if len(numbers) >= 3:
-                    anchor += f"__subsec_{numbers[0]}.{numbers[1]}.{numbers[2]}"
-
-                # Vierde en verdere niveaus: telkens opnieuw subsec_...
-                if len(numbers) >= 4:
-                    # Van i=3 tot het eind, dus meerdere nested paragrafen
-                    for i in range(3, len(numbers)):
-                        # Bouwt steeds op als 22.3.4.3 -> '22.3.4.3' etc.
-                        partial = '.'.join(numbers[:i+1])
-                        anchor += f"__subsec_{partial}"
-
-                return anchor
-
-    # ---------------------------------------------
-    # 3. Besluit bouwwerken leefomgeving (Bbl)
-    # ---------------------------------------------
-    elif category == "Besluit bouwwerken leefomgeving":
-        match = re.match(r"(Hoofdstuk|Afdeling|§|Artikel)\s+([\d\.]+)", title, re.IGNORECASE)
-        if match:
-            type_part = match.group(1).lower()
-            numbers = match.group(2).split('.')
-
-            anchor = f"#Hoofdstuk{numbers[0]}"
-            if len(numbers) >= 2:
-                if type_part == "afdeling":
-                    anchor += f"_Afdeling{numbers[0]}.{numbers[1]}"
-                elif type_part in ["paragraaf", "§"]:
-                    anchor += f"_Paragraaf{numbers[0]}.{numbers[1]}"
-
-            for i in range(2, len(numbers)):
-                if type_part == "artikel":
-                    anchor += f"_Artikel{'.'.join(numbers[:i+1])}"
-                else:
-                    anchor += f"_Paragraaf{'.'.join(numbers[:i+1])}"
-
-            return anchor
-
-    # ---------------------------------------------
-    # 4. Besluit kwaliteit leefomgeving (Bkl)
-    # ---------------------------------------------
-    elif category == "Besluit kwaliteit leefomgeving":
-        match = re.match(r"(Hoofdstuk|Afdeling|§|Artikel)\s+([\d\.]+)", title, re.IGNORECASE)
-        if match:
-            type_part = match.group(1).lower()
-            numbers = match.group(2).split('.')
-
-            anchor = f"#Hoofdstuk{numbers[0]}"
-            if len(numbers) >= 2:
-                if type_part == "afdeling":
-                    anchor += f"_Afdeling{numbers[0]}.{numbers[1]}"
-                elif type_part in ["paragraaf", "§"]:
-                    anchor += f"_Paragraaf{numbers[0]}.{numbers[1]}"
-
-            for i in range(2, len(numbers)):
-                if type_part == "artikel":
-                    anchor += f"_Artikel{'.'.join(numbers[:i+1])}"
-                else:
-                    anchor += f"_Paragraaf{'.'.join(numbers[:i+1])}"
-
-            return anchor
-
-    # Geen (herkenbare) match
-    return ""
-
-    """
-    Genereert enkel het fragment (beginnend met #), op basis van de categorie (Bal, Omgevingsplan, Bbl, Bkl)
-    en de meegegeven titels/paragraafnummers.
-    """
-    # Besluit activiteiten leefomgeving (Bal)
-    if category == "Besluit activiteiten leefomgeving":
-        match = re.match(r"(paragraaf|Paragraaf|§|Afdeling|Hoofdstuk|Artikel) (\d+)(?:\.(\d+))?(?:\.(\d+))?", title)
-        if match:
-            type_part = match.group(1).lower()
-            numbers = [match.group(2)]
-            if match.group(3):
-                numbers.append(match.group(3))
-            if match.group(4):
-                numbers.append(match.group(4))
-            
-            anchor = f"#Hoofdstuk{numbers[0]}"
-            if len(numbers) >= 2:
-                if type_part == "afdeling":
-                    anchor += f"_Afdeling{numbers[0]}.{numbers[1]}"
-                else:
-                    anchor += f"_Paragraaf{numbers[0]}.{numbers[1]}"
-            if len(numbers) >= 3:
-                anchor += f"_{type_part.capitalize()}{numbers[0]}.{numbers[1]}.{numbers[2]}"
-            if len(numbers) >= 4:
-                anchor += f"_{type_part.capitalize()}{numbers[0]}.{numbers[1]}.{numbers[2]}.{numbers[3]}"
-            return anchor
-
-    # Omgevingsplan
-    elif category == "Omgevingsplan":
-        if article_number:
-            # bv. "22.263"
-            if article_number.startswith('22.'):
-                return f"#chp_22__subchp_22.3__subsec_22.3.26__art_{article_number}"
-            else:
-                return f"#art_{article_number}"
-        else:
-            # Mogelijk paragraaf x.x.x.x
-            match = re.match(r"(paragraaf|Paragraaf|§|Afdeling|Hoofdstuk)\s+(\d+(?:\.\d+)*)", title)
-            if match:
-                numbers = match.group(2).split('.')
-                if len(numbers) < 2:
-                    return ""  # Onvoldoende niveaus om een anker te genereren
-
-                anchor = f"#chp_{numbers[0]}"
-                if len(numbers) >= 2:
-                    subchp = f"{numbers[0]}.{numbers[1]}"
-                    anchor += f"__subchp_{subchp}"
-                if len(numbers) >= 3:
-                    subsec = f"{numbers[0]}.{numbers[1]}.{numbers[2]}"
-                    anchor += f"__subsec_{subsec}"
-                if len(numbers) >= 4:
-                    # Voor elk extra niveau, voeg een nieuwe subsec toe
-                    for i in range(3, len(numbers)):
-                        subsec = '.'.join(numbers[:i+1])
-                        anchor += f"__subsec_{subsec}"
-                return anchor
-
-    # Besluit bouwwerken leefomgeving (Bbl)
-    elif category == "Besluit bouwwerken leefomgeving":
-        match = re.match(r"(Hoofdstuk|Afdeling|§|Artikel) (\d+)(?:\.(\d+))?(?:\.(\d+))?", title)
-        if match:
-            type_part = match.group(1).lower()
-            numbers = [match.group(2)]
-            if match.group(3):
-                numbers.append(match.group(3))
-            if match.group(4):
-                numbers.append(match.group(4))
-            
-            anchor = f"#Hoofdstuk{numbers[0]}"
-            if len(numbers) >= 2:
-                if type_part == "afdeling":
-                    anchor += f"_Afdeling{numbers[0]}.{numbers[1]}"
-                else:
-                    anchor += f"_Paragraaf{numbers[0]}.{numbers[1]}"
-            if len(numbers) >= 3:
-                anchor += f"_{type_part.capitalize()}{numbers[0]}.{numbers[1]}.{numbers[2]}"
-            if len(numbers) >= 4:
-                anchor += f"_{type_part.capitalize()}{numbers[0]}.{numbers[1]}.{numbers[2]}.{numbers[3]}"
-            return anchor
-
-    # Besluit kwaliteit leefomgeving (Bkl)
-    elif category == "Besluit kwaliteit leefomgeving":
-        match = re.match(r"(Hoofdstuk|Afdeling|§|Artikel) (\d+)(?:\.(\d+))?(?:\.(\d+))?", title)
-        if match:
-            type_part = match.group(1).lower()
-            numbers = [match.group(2)]
-            if match.group(3):
-                numbers.append(match.group(3))
-            if match.group(4):
-                numbers.append(match.group(4))
-            
-            anchor = f"#Hoofdstuk{numbers[0]}"
-            if len(numbers) >= 2:
-                if type_part == "afdeling":
-                    anchor += f"_Afdeling{numbers[0]}.{numbers[1]}"
-                else:
-                    anchor += f"_Paragraaf{numbers[0]}.{numbers[1]}"
-            if len(numbers) >= 3:
-                anchor += f"_{type_part.capitalize()}{numbers[0]}.{numbers[1]}.{numbers[2]}"
-            if len(numbers) >= 4:
-                anchor += f"_{type_part.capitalize()}{numbers[0]}.{numbers[1]}.{numbers[2]}.{numbers[3]}"
-            return anchor
-
-    return ""
-    
 
 def natural_sort_key(title: str) -> List:
     """
@@ -388,25 +1116,76 @@ def natural_sort_key(title: str) -> List:
     return sorteersleutel
 
 
+def character_tokens(normalized_title):
+    """
+    De tekens van een genormaliseerde titel als multiset: elk teken met zijn volgnummer, bijv. ('e', 1), ('e', 2).
+    """
+    counts = defaultdict(int)
+    tokens = []
+    for char in normalized_title:
+        counts[char] += 1
+        tokens.append((char, counts[char]))
+    return tokens
+
+
+def similarity_prefix(tokens, similarity_threshold):
+    """
+    Prefixfilter voor SequenceMatcher.ratio (tokens gesorteerd van zeldzaam naar veelvoorkomend).
+    ratio = 2*M/(la+lb) en M is hooguit het aantal gedeelde tekens, dus een titel met ratio >= drempel
+    deelt minstens ceil(t*l/(2-t)) tekens met deze titel. Twee titels met zoveel gedeelde tekens hebben
+    gegarandeerd een token gemeen in hun prefix van len(tokens) - overlap + 1 tokens.
+    """
+    required = math.ceil(similarity_threshold * len(tokens) / (2 - similarity_threshold) - 1e-9)
+    return tokens[:len(tokens) - max(required, 1) + 1]
+
+
 def filter_similar_results(results, similarity_threshold=1):
     """
     Filtert resultaten die sterk op elkaar lijken (>= similarity_threshold).
+    Identieke titels worden via een hash-set herkend (dat is ook het hele werk bij de standaarddrempel 1).
+    Bij een lagere drempel levert een prefixfilter op de tekens de kandidaten (zie similarity_prefix), die
+    daarna met SequenceMatcher worden gecontroleerd. Het filter mist geen enkel paar boven de drempel,
+    dus het resultaat is gelijk aan dat van elke titel met alle eerder gehouden titels vergelijken.
     """
+    results = [(title, link, name) for title, link, name in results if link and not link.endswith("#")]
+    normalized_titles = [re.sub(r'[^a-zA-Z0-9]', '', title.lower()) for title, link, name in results]
+    prefix_index = None
+    if 0 < similarity_threshold < 1:
+        # Zeldzame tekens eerst, zodat de prefixen zo weinig mogelijk kandidaten delen
+        token_frequency = defaultdict(int)
+        for normalized_title in set(normalized_titles):
+            for token in character_tokens(normalized_title):
+                token_frequency[token] += 1
+        prefix_index = defaultdict(list)
+
     filtered_results = []
     seen_titles = set()
-    for title, link, name in results:
-        if not link or link.endswith("#"):
+    for (title, link, name), normalized_title in zip(results, normalized_titles):
+        # Snelle route: een identieke titel heeft ratio 1.0
+        if normalized_title in seen_titles and similarity_threshold <= 1:
             continue
-        normalized_title = re.sub(r'[^a-zA-Z0-9]', '', title.lower())
-        is_similar = False
-        for seen_title in seen_titles:
-            similarity = SequenceMatcher(None, normalized_title, seen_title).ratio()
-            if similarity >= similarity_threshold:
-                is_similar = True
-                break
-        if not is_similar:
-            filtered_results.append((title, link, name))
-            seen_titles.add(normalized_title)
+        # Bij een drempel van 0 of lager lijkt elke titel op de eerste
+        if similarity_threshold <= 0 and seen_titles:
+            continue
+        if prefix_index is not None:
+            tokens = sorted(character_tokens(normalized_title), key=lambda token: (token_frequency[token], token))
+            prefix = similarity_prefix(tokens, similarity_threshold)
+            candidates = {seen_title for token in prefix for seen_title in prefix_index.get(token, ())}
+            is_similar = False
+            for seen_title in candidates:
+                matcher = SequenceMatcher(None, normalized_title, seen_title)
+                # real_quick_ratio en quick_ratio zijn goedkope bovengrenzen van ratio
+                if matcher.real_quick_ratio() >= similarity_threshold and \
+                        matcher.quick_ratio() >= similarity_threshold and \
+                        matcher.ratio() >= similarity_threshold:
+                    is_similar = True
+                    break
+            if is_similar:
+                continue
+            for token in prefix:
+                prefix_index[token].append(normalized_title)
+        filtered_results.append((title, link, name))
+        seen_titles.add(normalized_title)
 
     # Sorteer op basis van de natuurlijke sorteerfunctie
     filtered_results = sorted(filtered_results, key=lambda x: natural_sort_key(x[0]))
@@ -432,161 +1211,239 @@ def extract_articles(content):
 # 2. Aanvullende functies voor Excel doorzoeken
 ############################################################
 
+EXCEL_PATH = "overzicht-rijksactiviteiten-in-omgevingsloket-met-bron-in-regelgeving_v1-3.xlsx"
+# Snapshot van de werkbladen (zie excel_snapshot.py); wordt gebruikt zolang de hash bij EXCEL_PATH past
+EXCEL_SNAPSHOT_PATH = excel_snapshot.SNAPSHOT_PATH
+
+# Werkbladen die we doorzoeken, met de relevante kolomnamen (na het opschonen van witruimte):
+EXCEL_SHEETS = [
+    {
+        "sheet_name": "Bruidsschat omgevingsplan",
+        "cols_to_search": ["Naam", "Activiteit ID"]
+    },
+    {
+        "sheet_name": "Overzicht activiteiten Rijk",
+        "cols_to_search": ["Naam activiteit", "Activiteit ID"]
+    }
+]
+
+
+def import_pandas():
+    """
+    Importeert pandas (en via pandas openpyxl) pas wanneer de Excel nodig is: dat kost bij het
+    opstarten meer tijd dan de rest van de app, terwijl de Excel alleen de terugval is.
+    """
+    start = time.perf_counter()
+    import pandas as pd
+    metrics.record_startup('import_pandas', time.perf_counter() - start)
+    return pd
+
+
 @st.cache_resource  # Gebruik st.cache_resource voor het cachen van niet-serialiseerbare objecten
 def load_excel_file():
     """
     Laadt het Excel-bestand met rijksactiviteiten en bruidsschat.
     """
-    excel_path = "overzicht-rijksactiviteiten-in-omgevingsloket-met-bron-in-regelgeving_v1-3.xlsx"
+    excel_path = EXCEL_PATH
     if not os.path.exists(excel_path):
         raise FileNotFoundError(f"Excel-bestand '{excel_path}' niet gevonden.")
-    return pd.ExcelFile(excel_path)
+    return import_pandas().ExcelFile(excel_path)
+
 
+def excel_signature():
+    return files_signature([EXCEL_PATH, EXCEL_SNAPSHOT_PATH])
 
-def search_in_excel(search_term, gemeente, cache):
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_excel_sheets_cached(signature):
+    """
+    De werkbladen in kolomvorm ({werkblad: {kolom: [waarden]}}): uit de snapshot als die bij het
+    Excel-bestand hoort, anders (langzaam, via pandas/openpyxl) uit het Excel-bestand zelf.
+    """
+    start = time.perf_counter()
+    sheets = excel_snapshot.load_snapshot(EXCEL_PATH, EXCEL_SNAPSHOT_PATH)
+    source = EXCEL_SNAPSHOT_PATH
+    if sheets is None:
+        source = EXCEL_PATH
+        sheets = excel_snapshot.read_sheets(load_excel_file(), [ws_info["sheet_name"] for ws_info in EXCEL_SHEETS])
+    logger.info("Excel-werkbladen geladen uit %s in %.3fs", source, time.perf_counter() - start)
+    return sheets
+
+
+def load_excel_sheets():
+    """
+    Laadt de werkbladen (opnieuw zodra het Excel-bestand of de snapshot wijzigt).
+    """
+    if not os.path.exists(EXCEL_PATH):
+        raise FileNotFoundError(f"Excel-bestand '{EXCEL_PATH}' niet gevonden.")
+    return _load_excel_sheets_cached(excel_signature())
+
+
+def parse_bron_in_regelgeving(bron_regelgeving_str):
+    """
+    Splits 'Bron in regelgeving' (bijv. "Bal paragraaf 3.3.7, paragraaf 5.2.1 en paragraaf 5.4.3")
+    in aparte verwijzingen. Retourneert per verwijzing (originele tekst, categorie, soort, nummer),
+    waarbij soort 'paragraaf' of 'artikel' is.
+    """
+    # We maken er zelf even een simpele splits van.
+    # In de praktijk kun je een wat robuustere parse gebruiken.
+    raw_parts = re.split(r",| en ", bron_regelgeving_str)  # splits op ',' of ' en '
+
+    references = []
+    for part in raw_parts:
+        part = part.strip()
+        # Voorbeeld: "Bal paragraaf 3.3.7"
+        # Of "Bruidsschat Omgevingsplan paragraaf 22.3.8.9"
+        # Bepaal eerst de categorie
+        if part.lower().startswith("bal"):
+            category_name = "Besluit activiteiten leefomgeving"
+        elif part.lower().startswith("bbl"):
+            category_name = "Besluit bouwwerken leefomgeving"
+        elif part.lower().startswith("bkl"):
+            category_name = "Besluit kwaliteit leefomgeving"
+        elif "omgevingsplan" in part.lower():
+            category_name = "Omgevingsplan"
+        else:
+            # Onbekende categorie, overslaan
+            continue
+
+        # Nu proberen we het paragraafnummer te extraheren
+        # We zoeken naar "paragraaf (\d+(\.\d+)+)" of "artikel (\d+(\.\d+)?)"
+        match_para = re.search(r"(paragraaf|artikel)\s+([\d\.]+)", part, re.IGNORECASE)
+        if match_para:
+            references.append((part, category_name, match_para.group(1).lower(), match_para.group(2)))
+    return references
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_excel_index_cached(signature):
+    """
+    Parseert beide werkbladen één keer tot een dict: genormaliseerde celwaarde (Naam / Naam activiteit /
+    Activiteit ID, genormaliseerd met normalize_search_term) -> lijst van (werkbladnaam, verwijzingen).
+    De 'Bron in regelgeving' is daarbij al opgesplitst met parse_bron_in_regelgeving.
     """
-    Doorzoekt de twee werkbladen in het Excel-bestand op de zoekterm.
-    - In 'Bruidsschat omgevingsplan': zoek in kolommen 'Naam' en 'Activiteit ID'
-    - In 'Overzicht activiteiten Rijk': zoek in kolommen 'Naam activiteit ', 'Activiteit ID'
-    - Bij match -> 'Bron in regelgeving' uitlezen en per paragraaf ankerlinks maken.
+    start = time.perf_counter()
+    sheets = _load_excel_sheets_cached(signature)
+    index = defaultdict(list)
+    missing_sheets = []
+    for ws_info in EXCEL_SHEETS:
+        sheet_name = ws_info["sheet_name"]
+        if sheet_name not in sheets:
+            missing_sheets.append(sheet_name)
+            continue
+
+        # Kolomnamen zijn al opgeschoond (zie excel_snapshot.read_sheets); lege cellen zijn None
+        columns = sheets[sheet_name]
+        bron_column = columns.get("Bron in regelgeving")
+        if bron_column is None:
+            continue
+        search_columns = [columns[col] for col in ws_info["cols_to_search"] if col in columns]
+
+        for row, bron_regelgeving in enumerate(bron_column):
+            if bron_regelgeving is None:
+                continue
+            references = parse_bron_in_regelgeving(str(bron_regelgeving).strip())
+            if not references:
+                continue
+            for key in {normalize_search_term(str(column[row])) for column in search_columns if column[row] is not None}:
+                index[key].append((sheet_name, references))
+    logger.info("Excel-index geladen: %d sleutels in %.2fs", len(index), time.perf_counter() - start)
+    return dict(index), missing_sheets
+
+
+def load_excel_index():
+    """
+    Laadt de genormaliseerde Excel-index (opnieuw zodra het Excel-bestand of de snapshot wijzigt).
+    """
+    if not os.path.exists(EXCEL_PATH):
+        raise FileNotFoundError(f"Excel-bestand '{EXCEL_PATH}' niet gevonden.")
+    return _load_excel_index_cached(excel_signature())
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_excel_trigram_index_cached(signature):
+    """
+    Trigram-index over de sleutels van de Excel-index (activiteitnamen en -ID's), voor fuzzy zoeken.
+    """
+    excel_index, _ = _load_excel_index_cached(signature)
+    return TrigramIndex((key, key) for key in excel_index)
+
+
+def search_in_excel(search_term, gemeente, cache, heading_index=None, corpus_version=None, fuzzy=False):
+    """
+    Zoekt de zoekterm op in de Excel-index van de twee werkbladen.
+    - In 'Bruidsschat omgevingsplan': exacte match op 'Naam' of 'Activiteit ID'
+    - In 'Overzicht activiteiten Rijk': exacte match op 'Naam activiteit' of 'Activiteit ID'
+    - Bij match -> per verwijzing uit 'Bron in regelgeving' een ankerlink maken
+      (via de koppen-index indien aanwezig, anders via generate_anchor_link).
     - Retourneert results_excel, een dict per categorie.
+    Met fuzzy=True tellen ook celwaarden mee die op een paar typefouten na gelijk zijn aan de zoekterm.
+    Met een corpus_version worden de resultaten in EXCEL_RESULT_CACHE bewaard.
     """
+    search_term = normalize_search_term(search_term)
+    if corpus_version is not None:
+        cache_key = (search_term, (gemeente or '').lower(), corpus_version, fuzzy)
+        found, cached_results = EXCEL_RESULT_CACHE.get(cache_key)
+        if found:
+            return copy_grouped_results(cached_results)
+        results_excel = search_in_excel(search_term, gemeente, cache, heading_index, fuzzy=fuzzy)
+        EXCEL_RESULT_CACHE.put(cache_key, copy_grouped_results(results_excel))
+        return results_excel
+
     results_excel = defaultdict(set)
 
     try:
-        xls = load_excel_file()
+        excel_index, missing_sheets = load_excel_index()
     except FileNotFoundError as e:
         st.warning(str(e))
         return results_excel  # leeg dict; we kunnen niks doorzoeken
-
-    term_lower = search_term.lower()
-
-    # Werkbladen die we gaan doorzoeken, met de relevante kolomnamen:
-    work_sheets_info = [
-        {
-            "sheet_name": "Bruidsschat omgevingsplan",
-            "cols_to_search": ["Naam", "Activiteit ID"]
-        },
-        {
-            "sheet_name": "Overzicht activiteiten Rijk",
-            "cols_to_search": ["Naam activiteit ", "Activiteit ID"]
-        }
-    ]
+    for sheet_name in missing_sheets:
+        st.warning(f"Werkblad '{sheet_name}' niet gevonden in de Excel.")
+
+    matches = list(excel_index.get(search_term, []))
+    # Activiteit-ID's (met cijfers) alleen exact; 'RIJK-00012' mag niet 'RIJK-00013' vinden
+    if fuzzy and not re.search(r'\d', search_term):
+        with metrics.stage('fuzzy'):
+            trigram_index = _load_excel_trigram_index_cached(excel_signature())
+            for key in trigram_index.search(search_term, substring=False):
+                if key != search_term:
+                    matches.extend(excel_index[key])
+    if not matches:
+        return results_excel
+    metrics.count('excel_matches', len(matches))
 
     # Haal base-URLs uit de cache, indien aanwezig
-    bal_url = None
-    bbl_url = None
-    bkl_url = None
-    omgevingsplan_url = None
-
+    base_urls = {}
     for url, data in cache.items():
         cat = data.get("category")
-        if cat == "Besluit activiteiten leefomgeving":
-            bal_url = url
-        elif cat == "Besluit bouwwerken leefomgeving":
-            bbl_url = url
-        elif cat == "Besluit kwaliteit leefomgeving":
-            bkl_url = url
-        elif cat == "Omgevingsplan" and data.get("name").lower() == gemeente.lower():
-            omgevingsplan_url = url
-
-    def parse_and_generate_links(bron_regelgeving_str):
-        """
-        Splits 'Bron in regelgeving' (bijv. "Bal paragraaf 3.3.7, paragraaf 5.2.1 en paragraaf 5.4.3")
-        in aparte paragrafen. Maak ankerlinks per paragraaf.
-        """
-        # We maken er zelf even een simpele splits van.
-        # In de praktijk kun je een wat robuustere parse gebruiken.
-        raw_parts = re.split(r",| en ", bron_regelgeving_str)  # splits op ',' of ' en '
-
-        links_info = []
-
-        for part in raw_parts:
-            part = part.strip()
-            # Voorbeeld: "Bal paragraaf 3.3.7"
-            # Of "Bruidsschat Omgevingsplan paragraaf 22.3.8.9"
-            # Bepaal eerst de categorie
-            if part.lower().startswith("bal"):
-                # -> Besluit activiteiten leefomgeving
-                category_name = "Besluit activiteiten leefomgeving"
-                base_url = bal_url
-            elif part.lower().startswith("bbl"):
-                category_name = "Besluit bouwwerken leefomgeving"
-                base_url = bbl_url
-            elif part.lower().startswith("bkl"):
-                category_name = "Besluit kwaliteit leefomgeving"
-                base_url = bkl_url
-            elif "omgevingsplan" in part.lower():
-                category_name = "Omgevingsplan"
-                base_url = omgevingsplan_url
-            else:
-                # Onbekende categorie, overslaan of vangnet?
+        if cat == "Omgevingsplan":
+            if gemeente and data.get("name").lower() == gemeente.lower():
+                base_urls[cat] = url
+        else:
+            base_urls[cat] = url
+
+    for sheet_name, references in matches:
+        # 'name' zetten we op "Excel (werkbladnaam)"
+        excel_name = f"Excel ({sheet_name})"
+        for link_title, category_name, kind, para_num in references:
+            base_url = base_urls.get(category_name)
+            if not base_url:
                 continue
+            # Eerst het echte anker uit de koppen-index proberen
+            anchor = None
+            if heading_index is not None and base_url in heading_index:
+                anchor = find_anchor(heading_index[base_url], kind, para_num.rstrip('.'))
+            # Genereer anders het anchor fragment
+            if anchor:
+                anchor_fragment = f"#{anchor}"
+            elif kind == "paragraaf":
+                anchor_fragment = generate_anchor_link(category_name, f"paragraaf {para_num}")
+            else:
+                anchor_fragment = generate_anchor_link(category_name, f"artikel {para_num}", article_number=para_num)
 
-            # Nu proberen we het paragraafnummer te extraheren
-            # Voorbeeld: "Bal paragraaf 3.3.7"
-            # We zoeken naar "paragraaf (\d+(\.\d+)+)" of "artikel (\d+(\.\d+)?)"
-            match_para = re.search(r"(paragraaf|artikel)\s+([\d\.]+)", part, re.IGNORECASE)
-            if match_para:
-                para_num = match_para.group(2)  # b.v. "3.3.7" of "22.269"
-                # Genereer anchor fragment
-                # Hier is het belangrijk dat de generate_anchor_link functie correct is
-                # Voor paragrafen: "paragraaf x.x.x"
-                # Voor artikelen: "artikel x.x"
-                if match_para.group(1).lower() == "paragraaf":
-                    anchor_fragment = generate_anchor_link(category_name, f"paragraaf {para_num}")
-                elif match_para.group(1).lower() == "artikel":
-                    anchor_fragment = generate_anchor_link(category_name, f"artikel {para_num}", article_number=para_num)
-                else:
-                    anchor_fragment = ""
-
-                if base_url and anchor_fragment:
-                    full_link = base_url + anchor_fragment
-                    link_title = part  # We nemen de originele string als link-naam
-                    # Sluit 'Artikel' resultaten uit
-                    if not re.match(r'^(Artikel|artikel)\b', link_title, re.IGNORECASE):
-                        links_info.append((link_title, full_link, category_name))
-
-        return links_info
-
-    # Doorzoek de aangegeven werkbladen
-    for ws_info in work_sheets_info:
-        sheet_name = ws_info["sheet_name"]
-        cols_to_search = ws_info["cols_to_search"]
-
-        try:
-            df = pd.read_excel(xls, sheet_name=sheet_name)
-        except ValueError:
-            st.warning(f"Werkblad '{sheet_name}' niet gevonden in de Excel.")
-            continue
-
-        # Voor de zekerheid kolomnamen opschonen
-        df.columns = [str(c).strip() for c in df.columns]
-
-        for idx, row in df.iterrows():
-            row_match = False
-            for col in cols_to_search:
-                if col not in df.columns:
-                    continue
-                cell_value = str(row[col]).strip().lower()
-                if cell_value == term_lower:
-                    row_match = True
-                    break
-
-            if row_match:
-                # Pak de 'Bron in regelgeving'
-                # Daar kunnen meerdere paragrafen in staan
-                bron_regelgeving = str(row.get("Bron in regelgeving", "")).strip()
-                if not bron_regelgeving:
-                    # Geen bron, ga door
-                    continue
-                # Parse en maak links
-                link_items = parse_and_generate_links(bron_regelgeving)
-                for link_title, link_url, cat_name in link_items:
-                    # Toevoegen aan results_excel[cat_name]
-                    # 'name' zetten we op "Excel (werkbladnaam)"
-                    excel_name = f"Excel ({sheet_name})"
-                    results_excel[cat_name].add((link_title, link_url, excel_name))
+            # Sluit 'Artikel' resultaten uit; de link-naam is de originele verwijzing
+            if anchor_fragment and not re.match(r'^(Artikel|artikel)\b', link_title, re.IGNORECASE):
+                results_excel[category_name].add((link_title, base_url + anchor_fragment, excel_name))
 
     return results_excel
 
@@ -595,62 +1452,277 @@ def search_in_excel(search_term, gemeente, cache):
 # 3. Aangepaste process_cache-functie (met Excel-logica)
 ############################################################
 
-def process_cache(cache, search_term, selected_categories, selected_gemeente=None):
+# Gedeelde, alleen-lezen toestand voor de zoekworkers. Wordt gezet vlak voordat de workers geforkt
+# worden, zodat ze de content erven (copy-on-write) in plaats van dat die per worker gekopieerd wordt.
+# Er wordt alleen geforkt als de aanroeper de enige thread is, dus er is geen lock nodig.
+_search_state = {}
+_search_workers_warned = False
+
+
+def _search_document_worker(url):
     """
-    1) Zoekt in JSON
-    2) Als er geen resultaten zijn -> Zoek in Excel
+    Regex-scan van één document in een geforkte worker; leest de content uit _search_state.
     """
-    grouped_results = defaultdict(set)
-    all_categories = set()
+    return search_paragraphs(_search_state['cache'][url]['content'], _search_state['search_term'])
+
+
+def search_documents_parallel(urls, cache, search_term, workers):
+    """
+    Voert de regex-scan (search_paragraphs) uit over meerdere documenten, verdeeld over een procespool.
+    Retourneert {url: paragrafen}, met dezelfde uitkomst als de seriële aanroep. Zonder 'fork'
+    (bijv. op Windows), met één worker of één document wordt serieel gezocht.
+    Alleen voor een proces met één thread (een script of benchmark): forken terwijl een andere thread
+    een lock vasthoudt kan de worker laten vastlopen. Streamlit en api.py draaien altijd meerdere
+    threads; daar wordt dus serieel gezocht en zoekt elke thread zelfstandig.
+    """
+    metrics.count('documents_scanned', len(urls))
+    workers = min(workers, len(urls))
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return {url: search_paragraphs(cache[url]['content'], search_term) for url in urls}
+    if threading.active_count() > 1:
+        global _search_workers_warned
+        if not _search_workers_warned:
+            _search_workers_warned = True
+            logger.warning("MBA_SEARCH_WORKERS=%d wordt genegeerd: het proces heeft meerdere threads, "
+                           "de regex-scan loopt serieel.", workers)
+        return {url: search_paragraphs(cache[url]['content'], search_term) for url in urls}
+
+    _search_state.update(cache=cache, search_term=search_term)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            results = list(executor.map(_search_document_worker, urls))
+    finally:
+        _search_state.clear()
+    return dict(zip(urls, results))
+
+
+def is_article_title(title):
+    """
+    Resultaten die beginnen met 'Artikel' worden niet getoond.
+    """
+    return re.match(r'^(Artikel|artikel)\b', title, re.IGNORECASE) is not None
+
+
+def search_category(cache, urls, search_term, heading_index=None, workers=1, mode=MATCH_MODE_EXACT):
+    """
+    Zoekt in de JSON-documenten van één categorie (via de koppen-index indien aanwezig, anders via de
+    regex-scan over de content; die scan wordt bij workers > 1 over meerdere processen verdeeld).
+    Bij mode=MATCH_MODE_FUZZY komen daar de koppen bij die de term op een paar typefouten na bevatten
+    (alleen voor documenten in de koppen-index).
+    Retourneert een set met (titel, link, naam).
+    """
+    results = set()
+    # Documenten zonder koppen-index moeten met de (dure) regex-scan doorzocht worden
+    scan_urls = [url for url in urls if heading_index is None or url not in heading_index]
+    with metrics.stage('regex_scan'):
+        scanned = search_documents_parallel(scan_urls, cache, search_term, workers)
+    fuzzy_matches = {}
+    if mode == MATCH_MODE_FUZZY and heading_index is not None:
+        fuzzy_matches = search_headings_fuzzy(heading_index, [url for url in urls if url not in scanned], search_term)
+
+    for url in urls:
+        if url in scanned:
+            paragraphs = [(para, None) for para in scanned[url]]
+        else:
+            # Koppen-index: het anker komt rechtstreeks uit de HTML
+            with metrics.stage('heading_search'):
+                paragraphs = search_headings(heading_index[url], search_term)
+            if url in fuzzy_matches:
+                paragraphs = list(dict.fromkeys(paragraphs + fuzzy_matches[url]))
+            metrics.count('documents_indexed')
+        metrics.count('raw_matches', len(paragraphs))
+        with metrics.stage('anchors'):
+            results.update(document_results(cache, url, paragraphs))
+    return results
+
+
+def document_results(cache, url, paragraphs):
+    """
+    Zet gevonden (titel, anker)-paren van één document om in (titel, link, naam)-resultaten.
+    Zonder anker wordt de link met generate_anchor_link afgeleid; 'Artikel'-titels vallen af.
+    """
+    name = cache[url]['name']
+    category = cache[url]['category']
+    results = set()
+    for para, anchor in paragraphs:
+        link = f"#{anchor}" if anchor else generate_anchor_link(category, para)
+        if link and not is_article_title(para):
+            results.add((para, url + link, name))
+    return results
+
+
+def iter_category_results(cache, search_term, selected_categories, selected_gemeente=None, heading_index=None,
+                          workers=None, corpus_version=None, mode=MATCH_MODE_EXACT):
+    """
+    Generator die per categorie (categorie, resultaten) oplevert zodra die categorie doorzocht is,
+    zodat de interface niet op de traagste categorie hoeft te wachten. Goedkope categorieën
+    (weinig documenten zonder koppen-index) komen eerst. Levert alle categorieën geen JSON-resultaat
+    op, dan volgen daarna de categorieën met resultaten uit de Excel-terugval.
+    Met een corpus_version (zie corpus_version()) worden de resultaten in RESULT_CACHE bewaard,
+    met als sleutel de zoekterm, de gekozen categorieën, de gemeente, de zoekmodus en die versie.
+    mode: MATCH_MODE_EXACT of MATCH_MODE_FUZZY (typefouten toegestaan, zie TrigramIndex).
+    De zoekterm wordt eerst genormaliseerd (zie normalize_search_term).
+    """
+    search_term = normalize_search_term(search_term)
+    if corpus_version is not None:
+        cache_key = (search_term, frozenset(selected_categories), (selected_gemeente or '').lower(),
+                     mode, corpus_version)
+        found, cached_results = RESULT_CACHE.get(cache_key)
+        metrics.count('result_cache_hits' if found else 'result_cache_misses')
+        if found:
+            for category, items in cached_results.items():
+                yield category, set(items)
+            return
+    if workers is None:
+        workers = SEARCH_WORKERS
 
     # --- (1) EERST ZOEKEN IN JSON ---
+    urls_per_category = {category: [] for category in selected_categories}
     for url, data in cache.items():
-        name = data['name']
         category = data['category']
-        content = data['content']
-        all_categories.add(category)
-
         # Filter op gemeente
-        if category == "Omgevingsplan" and selected_gemeente and name.lower() != selected_gemeente.lower():
+        if category == "Omgevingsplan" and selected_gemeente and data['name'].lower() != selected_gemeente.lower():
             continue
+        if category in urls_per_category:
+            urls_per_category[category].append(url)
 
-        if category in selected_categories:
-            paragraphs = search_paragraphs(content, search_term)
-            for para in paragraphs:
-                link = generate_anchor_link(category, para)
-                if link:
-                    full_link = url + link
-                    # Sluit resultaten die beginnen met 'Artikel' uit
-                    if not re.match(r'^(Artikel|artikel)\b', para, re.IGNORECASE):
-                        grouped_results[category].add((para, full_link, name))
+    def search_cost(category):
+        urls = urls_per_category[category]
+        return sum(1 for url in urls if heading_index is None or url not in heading_index), len(urls)
 
-    # Check of er iets gevonden is
-    found_any_json = any(len(v) > 0 for v in grouped_results.values())
+    grouped_results = defaultdict(set)
+    for category in sorted(urls_per_category, key=search_cost):
+        results = search_category(cache, urls_per_category[category], search_term, heading_index, workers, mode)
+        # Eventueel kun je hier nog deduplicatie of fuzzy-check doen
+        with metrics.stage('dedup'):
+            grouped_results[category] = set(filter_similar_results(results))
+        metrics.count('results', len(grouped_results[category]))
+        yield category, set(grouped_results[category])
 
     # --- (2) ZOEKEN IN EXCEL ALS JSON LEEG IS ---
-    if not found_any_json:
-        excel_results = search_in_excel(search_term, selected_gemeente, cache)
-        if excel_results:
-            # Sluit resultaten die beginnen met 'Artikel' uit
-            for category, items in excel_results.items():
-                for item in items:
-                    title, link, source = item
-                    if not re.match(r'^(Artikel|artikel)\b', title, re.IGNORECASE):
-                        grouped_results[category].add(item)
+    if not any(grouped_results.values()):
+        with metrics.stage('excel'):
+            excel_results = search_in_excel(search_term, selected_gemeente, cache, heading_index, corpus_version,
+                                            fuzzy=mode == MATCH_MODE_FUZZY)
+        for category, items in excel_results.items():
+            # Een Excel-regel kan naar besluiten buiten de gekozen categorieën verwijzen
+            if category not in urls_per_category:
+                continue
+            items = {item for item in items if not is_article_title(item[0])}
+            if items:
+                with metrics.stage('dedup'):
+                    grouped_results[category] = set(filter_similar_results(items))
+                metrics.count('results', len(grouped_results[category]))
+                yield category, set(grouped_results[category])
         # anders blijft grouped_results leeg (geen results in JSON en Excel)
 
-    # Eventueel kun je hier nog deduplicatie of fuzzy-check doen
-    for category in grouped_results:
-        grouped_results[category] = set(filter_similar_results(grouped_results[category]))
+    if corpus_version is not None:
+        RESULT_CACHE.put(cache_key, copy_grouped_results(grouped_results))
+
 
+def process_cache(cache, search_term, selected_categories, selected_gemeente=None, heading_index=None,
+                  workers=None, corpus_version=None, mode=MATCH_MODE_EXACT):
+    """
+    1) Zoekt in JSON (via de koppen-index indien aanwezig, anders via de regex-scan over de content;
+       die scan wordt bij workers > 1 over meerdere processen verdeeld)
+    2) Als er geen resultaten zijn -> Zoek in Excel
+    Verzamelt de uitkomst van iter_category_results in één keer; retourneert (grouped_results, all_categories).
+    """
+    grouped_results = defaultdict(set)
+    for category, items in iter_category_results(cache, search_term, selected_categories, selected_gemeente,
+                                                 heading_index, workers, corpus_version, mode):
+        grouped_results[category] = items
+    all_categories = {data['category'] for data in cache.values()}
     return grouped_results, all_categories
 
 
 ############################################################
-# 4. Hoofdfunctie voor de Streamlit-applicatie
+# 4. Voorladen (warm-up) bij het opstarten
 ############################################################
 
+def warm_up():
+    """
+    Laadt manifest, koppen-index, de documenten van de landelijke besluiten die niet in de koppen-index
+    staan en de Excel-index vooraf (zonder manifest het volledige corpus), zodat de eerste zoekopdracht
+    daar niet op wacht. De duur per stap wordt via metrics.record_startup vastgelegd.
+    """
+    start = time.perf_counter()
+    step_start = start
+
+    def step_done(name):
+        nonlocal step_start
+        now = time.perf_counter()
+        metrics.record_startup(f'warm_up_{name}', now - step_start)
+        step_start = now
+
+    manifest = load_manifest()
+    heading_index = load_heading_index()
+    step_done('indexes')
+    if manifest is None:
+        load_multiple_files()
+    else:
+        # Omgevingsplannen worden pas geladen als hun gemeente gekozen wordt
+        load_corpus_for_query(manifest, [c for c in available_categories(manifest) if c != "Omgevingsplan"],
+                              None, heading_index)
+    step_done('corpus')
+    try:
+        load_excel_index()
+    except FileNotFoundError as e:
+        logger.warning("%s", e)
+    step_done('excel')
+    metrics.record_startup('warm_up', time.perf_counter() - start)
+
+
+@st.cache_resource(show_spinner=False)
+def start_background_warm_up():
+    """
+    Start warm_up één keer per proces in een achtergrondthread (st.cache_resource onthoudt de thread
+    over alle sessies en herhalingen van het script). Retourneert de thread.
+    """
+    thread = threading.Thread(target=_run_warm_up, name="mba-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _run_warm_up():
+    try:
+        warm_up()
+    except Exception:
+        # Een mislukte warm-up is geen reden om te stoppen; de eerste zoekopdracht laadt dan alsnog
+        logger.exception("Warm-up mislukt")
+
+
+############################################################
+# 5. Hoofdfunctie voor de Streamlit-applicatie
+############################################################
+
+SEARCH_MODE_HEADINGS = "Koppen"
+SEARCH_MODE_FUZZY = "Koppen (typefouten toegestaan)"
+SEARCH_MODE_FULLTEXT = "Volledige tekst (gerangschikt)"
+
+
+def render_fulltext_results(fulltext_results, ordered_categories):
+    """
+    Toont de full-text-resultaten per categorie in volgorde van relevantie, met een tekstfragment eronder.
+    """
+    if not any(fulltext_results.values()):
+        st.write("Geen resultaten gevonden in de volledige tekst.")
+        return
+    for category in ordered_categories:
+        if category in fulltext_results:
+            st.write(f"### {category}")
+            if fulltext_results[category]:
+                for heading_path, link, name, snippet in fulltext_results[category]:
+                    st.markdown(f"[**{heading_path}**]({link}) — {name}")
+                    if snippet:
+                        st.caption(snippet)
+            else:
+                st.write("Geen zoekresultaten gevonden.")
+            st.write("---")
+
+
 def main():
+    start_background_warm_up()
     st.title("MBA Zoekmachine")
 
     # Gebruiksaanwijzing als dropdownmenu
@@ -665,20 +1737,25 @@ def main():
         search_term = st.text_input("Voer de zoekterm in:")
         submit_button = st.form_submit_button(label="Zoeken")
 
-    # Categorieën in gewenste volgorde
-    ordered_categories = [
-        "Besluit activiteiten leefomgeving",
-        "Omgevingsplan",
-        "Besluit bouwwerken leefomgeving",
-        "Besluit kwaliteit leefomgeving"
-    ]
+    # Categorieën in gewenste volgorde; met een manifest hoeven we voor de keuzelijsten geen document-content te laden
+    manifest = load_manifest()
+    ordered_categories = available_categories(manifest)
 
     selected_categories = st.multiselect("Kies de categorieën:", options=ordered_categories, default=ordered_categories)
 
+    # Gerangschikt zoeken in de volledige tekst kan alleen als jsonmaker.py de full-text-index heeft gebouwd
+    search_modes = [SEARCH_MODE_HEADINGS, SEARCH_MODE_FUZZY]
+    if os.path.exists(SECTIONS_DB_PATH):
+        search_modes.append(SEARCH_MODE_FULLTEXT)
+    search_mode = st.radio("Zoekmodus:", search_modes)
+
     gemeente = None
     if "Omgevingsplan" in selected_categories:
-        cache = load_multiple_files()
-        gemeenten = sorted({data['name'] for url, data in cache.items() if data['category'] == "Omgevingsplan"})
+        if manifest is not None:
+            gemeenten = sorted({entry['name'] for entry in manifest if entry['category'] == "Omgevingsplan"})
+        else:
+            cache = load_multiple_files()
+            gemeenten = sorted({data['name'] for url, data in cache.items() if data['category'] == "Omgevingsplan"})
         gemeente = st.selectbox("Kies de gemeente voor Omgevingsplan:", gemeenten)
 
     if submit_button:
@@ -686,35 +1763,70 @@ def main():
             st.error("Voer een geldige zoekterm in.")
             return
 
-        with st.spinner('Zoeken...'):
-            cache = load_multiple_files()
+        with metrics.query_trace(search_term, 'streamlit', categories=sorted(selected_categories), gemeente=gemeente) \
+                as trace, st.spinner('Zoeken...'):
+            trace.labels['mode'] = search_mode
+            if search_mode == SEARCH_MODE_FULLTEXT:
+                try:
+                    fulltext_results = search_fulltext(search_term, selected_categories, gemeente)
+                except FileNotFoundError as e:
+                    st.error(str(e))
+                    return
+                with metrics.stage('render'):
+                    render_fulltext_results(fulltext_results, ordered_categories)
+                return
+
+            heading_index = load_heading_index()
+            if manifest is not None:
+                # Alleen de content laden van documenten die deze zoekopdracht echt nodig heeft
+                cache = load_corpus_for_query(manifest, selected_categories, gemeente, heading_index)
+            else:
+                cache = load_multiple_files()
             if not cache:
                 st.error("Geen data beschikbaar om te doorzoeken.")
                 return
 
+            # Per categorie een placeholder, in de vaste volgorde; die wordt gevuld zodra de categorie klaar is
+            placeholders = {}
+            for category in ordered_categories:
+                if category in selected_categories:
+                    st.write(f"### {category}")
+                    placeholders[category] = st.empty()
+                    placeholders[category].write("Zoeken...")
+                    st.write("---")
+
             # Hier doen we eerst de JSON-search, en indien leeg -> Excel
-            grouped_results, all_categories = process_cache(
+            found_any = False
+            first_result_time = None
+            start = time.perf_counter()
+            for category, items in iter_category_results(
                 cache,
                 search_term,
                 selected_categories,
-                selected_gemeente=gemeente
-            )
-
-            # Controleer of er resultaten zijn; als niet, zoek in Excel en toon melding
-            if not any(len(v) > 0 for v in grouped_results.values()):
+                selected_gemeente=gemeente,
+                heading_index=heading_index,
+                corpus_version=corpus_version(),
+                mode=MATCH_MODE_FUZZY if search_mode == SEARCH_MODE_FUZZY else MATCH_MODE_EXACT
+            ):
+                if category not in placeholders:
+                    continue
+                with metrics.stage('render'), placeholders[category].container():
+                    if items:
+                        found_any = True
+                        if first_result_time is None:
+                            first_result_time = time.perf_counter() - start
+                        for para, link, name in items:
+                            st.markdown(f"[**{para}**]({link}) — {name}")
+                    else:
+                        st.write("Geen zoekresultaten gevonden.")
+            trace.labels['first_result_s'] = round(first_result_time, 6) if first_result_time is not None else None
+            logger.info("Resultaatcache: %s; Excel-cache: %s; documentstore: %s; segmenten: %s",
+                        RESULT_CACHE.stats(), EXCEL_RESULT_CACHE.stats(), document_store().stats(),
+                        segment_loader().stats())
+
+            # Controleer of er resultaten zijn; zo niet, dan is ook in Excel niets gevonden
+            if not found_any:
                 st.write("Geen resultaten gevonden in zowel JSON als Excel.")
-            else:
-                # Toon resultaten per categorie
-                for category in ordered_categories:
-                    if category in selected_categories:
-                        st.write(f"### {category}")
-                        if category in grouped_results and grouped_results[category]:
-                            time.sleep(1)
-                            for para, link, name in grouped_results[category]:
-                                st.markdown(f"[**{para}**]({link}) — {name}")
-                        else:
-                            st.write("Geen zoekresultaten gevonden.")
-                        st.write("---")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+import argparse
+import csv
+import json
+import logging
+import time
+from collections import defaultdict, deque
+
+import app
+
+logger = logging.getLogger("mba_zoekmachine.batch")
+
+# Werkblad en kolom met de rijksactiviteiten voor --from-excel
+EXCEL_TERMS_SHEET = "Overzicht activiteiten Rijk"
+EXCEL_TERMS_COLUMN = "Naam activiteit"
+
+
+############################################################
+# 1. Aho–Corasick: alle zoektermen in één keer door een tekst
+############################################################
+
+class AhoCorasick:
+    """
+    Automaat die voor een vaste lijst patronen in één doorloop van een tekst bepaalt welke patronen
+    erin voorkomen, ongeacht het aantal patronen. Patronen en tekst moeten al in kleine letters zijn.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]   # toestand -> {teken: volgende toestand}
+        self.fail = [0]    # toestand -> langste echte suffix die ook een toestand is
+        self.output = [()]  # toestand -> indexen van patronen die hier eindigen
+        for pattern_index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            self.output[state] += (pattern_index,)
+
+        # Faallinks in breedte-eerst-volgorde (kinderen van de wortel falen naar de wortel);
+        # de uitvoer van de faaltoestand wordt overgenomen
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def find_all(self, text):
+        """
+        Retourneert de set met indexen van alle patronen die in de tekst voorkomen.
+        """
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+############################################################
+# 2. Batchzoekopdracht
+############################################################
+
+def normalize_terms(terms):
+    """
+    Ontdubbelt de zoektermen met behoud van volgorde. Twee termen zijn gelijk als ze na
+    app.normalize_search_term gelijk zijn (zoals in de resultaatcache van de app).
+    """
+    seen = set()
+    normalized = []
+    for term in terms:
+        term = str(term).strip()
+        key = app.normalize_search_term(term)
+        if key and key not in seen:
+            seen.add(key)
+            normalized.append(term)
+    return normalized
+
+
+def batch_search(terms, categories=None, gemeente=None):
+    """
+    Zoekt alle termen tegelijk in het corpus: per document (of per kop uit de koppen-index) één
+    doorloop met een Aho–Corasick-automaat in plaats van één doorloop per term. Per term gelden
+    dezelfde regels als in process_cache (gemeentefilter, geen 'Artikel'-titels, deduplicatie en
+    de Excel-terugval als een term in geen enkele categorie iets oplevert).
+    Retourneert ({term: {categorie: set((titel, link, bron))}}, statistieken).
+    """
+    start = time.perf_counter()
+    terms = normalize_terms(terms)
+    manifest = app.load_manifest()
+    if not categories:
+        categories = app.available_categories(manifest)
+    heading_index = app.load_heading_index()
+    if manifest is not None:
+        cache = app.load_corpus_for_query(manifest, categories, gemeente, heading_index)
+    else:
+        cache = app.load_multiple_files()
+    corpus_version = app.corpus_version()
+    load_seconds = time.perf_counter() - start
+
+    # Gezocht wordt op de genormaliseerde term, net als in process_cache.
+    # Termen van één woord via de automaat (substring-match, zoals search_headings); termen van meerdere
+    # woorden via de postinglijsten van de koppen-index (alle woorden, in willekeurige volgorde)
+    queries = [app.normalize_search_term(term) for term in terms]
+    automaton = AhoCorasick(queries)
+    multi_word = [term_index for term_index, query in enumerate(queries) if len(set(app.tokenize(query))) > 1]
+    multi_word_set = set(multi_word)
+    # term-index -> url -> [(titel, anker)]
+    matches = defaultdict(lambda: defaultdict(list))
+    for url, data in cache.items():
+        category = data['category']
+        if category not in categories:
+            continue
+        if category == "Omgevingsplan" and gemeente and data['name'].lower() != gemeente.lower():
+            continue
+        if heading_index is not None and url in heading_index:
+            for title, title_lower, anchor in heading_index[url]['titles']:
+                for term_index in automaton.find_all(title_lower):
+                    if term_index not in multi_word_set:
+                        matches[term_index][url].append((title, anchor))
+            for term_index in multi_word:
+                paragraphs = app.search_headings(heading_index[url], queries[term_index])
+                if paragraphs:
+                    matches[term_index][url].extend(paragraphs)
+        else:
+            # Zonder koppen-index: de automaat bepaalt welke termen in het document voorkomen,
+            # alleen voor die termen volgt de regex-scan die de titels en hun context oplevert
+            for term_index in automaton.find_all(data['content'].lower()):
+                paragraphs = app.search_paragraphs(data['content'], queries[term_index])
+                matches[term_index][url].extend((para, None) for para in paragraphs)
+
+    results = {}
+    for term_index, term in enumerate(terms):
+        grouped_results = defaultdict(set)
+        for url, paragraphs in matches.get(term_index, {}).items():
+            grouped_results[cache[url]['category']].update(app.document_results(cache, url, paragraphs))
+        if not any(grouped_results.values()):
+            excel_results = app.search_in_excel(queries[term_index], gemeente, cache, heading_index, corpus_version)
+            for category, items in excel_results.items():
+                if category not in categories:
+                    continue
+                grouped_results[category].update(item for item in items if not app.is_article_title(item[0]))
+        results[term] = {
+            category: set(app.filter_similar_results(items)) for category, items in grouped_results.items() if items
+        }
+
+    elapsed = time.perf_counter() - start
+    search_seconds = elapsed - load_seconds
+    stats = {
+        'terms': len(terms),
+        'terms_found': sum(1 for grouped in results.values() if grouped),
+        'documents': len(cache),
+        'load_seconds': round(load_seconds, 3),
+        'search_seconds': round(search_seconds, 3),
+        'terms_per_second': round(len(terms) / search_seconds, 1) if search_seconds > 0 else None
+    }
+    logger.info("Batch: %d termen in %.2fs (%.1f termen/s), corpus geladen in %.2fs",
+                len(terms), search_seconds, stats['terms_per_second'] or 0, load_seconds)
+    return results, stats
+
+
+def sorted_results(grouped_results):
+    """
+    Resultaten van één term per categorie, in natuurlijke volgorde van de titels.
+    """
+    return {
+        category: sorted(items, key=lambda item: app.natural_sort_key(item[0]))
+        for category, items in grouped_results.items()
+    }
+
+
+def write_results(results, output_path, output_format=None):
+    """
+    Schrijft de batchresultaten naar CSV (één regel per resultaat; een term zonder resultaat krijgt
+    een regel met lege velden) of JSON Lines (één regel per term). Het formaat volgt de extensie,
+    tenzij output_format ('csv' of 'jsonl') is opgegeven.
+    """
+    if output_format is None:
+        output_format = 'csv' if output_path.lower().endswith('.csv') else 'jsonl'
+    with open(output_path, 'w', encoding='utf-8', newline='') as output_file:
+        if output_format == 'csv':
+            writer = csv.writer(output_file)
+            writer.writerow(['term', 'category', 'title', 'link', 'source'])
+            for term, grouped_results in results.items():
+                if not grouped_results:
+                    writer.writerow([term, '', '', '', ''])
+                for category, items in sorted_results(grouped_results).items():
+                    for title, link, source in items:
+                        writer.writerow([term, category, title, link, source])
+        else:
+            for term, grouped_results in results.items():
+                record = {
+                    'term': term,
+                    'found': bool(grouped_results),
+                    'results': {
+                        category: [{'title': title, 'link': link, 'source': source} for title, link, source in items]
+                        for category, items in sorted_results(grouped_results).items()
+                    }
+                }
+                output_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def terms_from_excel():
+    """
+    Alle activiteiten uit de kolom 'Naam activiteit' van het werkblad 'Overzicht activiteiten Rijk'.
+    """
+    columns = app.load_excel_sheets().get(EXCEL_TERMS_SHEET, {})
+    return [value for value in columns.get(EXCEL_TERMS_COLUMN, []) if value is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zoek veel MBA-termen in één doorloop door het corpus.")
+    parser.add_argument('terms', nargs='*', help="Zoektermen.")
+    parser.add_argument('--terms-file', help="Bestand met één zoekterm per regel.")
+    parser.add_argument('--from-excel', action='store_true',
+                        help=f"Gebruik alle activiteiten uit het werkblad '{EXCEL_TERMS_SHEET}'.")
+    parser.add_argument('--category', action='append',
+                        help="Categorie om in te zoeken (herhaalbaar; standaard alle categorieën).")
+    parser.add_argument('--gemeente', help="Gemeente voor de categorie Omgevingsplan.")
+    parser.add_argument('--output', default='batch_results.jsonl',
+                        help="Uitvoerbestand, .csv of .jsonl (standaard batch_results.jsonl).")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="Uitvoerformaat (standaard op basis van de extensie).")
+    args = parser.parse_args()
+
+    terms = list(args.terms)
+    if args.terms_file:
+        with open(args.terms_file, 'r', encoding='utf-8') as terms_file:
+            terms.extend(line.strip() for line in terms_file)
+    if args.from_excel:
+        terms.extend(terms_from_excel())
+    if not normalize_terms(terms):
+        parser.error("Geef zoektermen op, of gebruik --terms-file of --from-excel.")
+
+    results, stats = batch_search(terms, args.category, args.gemeente)
+    write_results(results, args.output, args.format)
+    print(f"{stats['terms']} termen ({stats['terms_found']} met resultaat) in {stats['search_seconds']:.2f}s: "
+          f"{stats['terms_per_second']} termen/s. Resultaten in {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
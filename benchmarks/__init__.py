@@ -0,0 +1,7 @@
+"""
+Benchmarks voor de MBA Zoekmachine.
+
+    python -m benchmarks generate --output bench_corpus     # synthetisch corpus maken
+    python -m benchmarks run --corpus bench_corpus --output resultaten.json
+    python -m benchmarks compare baseline.json resultaten.json
+"""
@@ -0,0 +1,60 @@
+import argparse
+import json
+import sys
+
+from benchmarks import corpus, suite
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks voor de MBA Zoekmachine.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="Synthetisch corpus maken.")
+    generate.add_argument('--output', default='bench_corpus', help="Map voor het corpus (standaard bench_corpus).")
+    generate.add_argument('--gemeenten', type=int, default=20, help="Aantal omgevingsplannen (standaard 20).")
+    generate.add_argument('--headings', type=int, default=60, help="Paragrafen per document (standaard 60).")
+    generate.add_argument('--articles-per-heading', type=int, default=3, help="Artikelen per paragraaf (standaard 3).")
+    generate.add_argument('--article-words', type=int, default=80, help="Woorden per artikel (standaard 80).")
+    generate.add_argument('--shards', type=int, default=2, help="Aantal omgevingsplan-shards (standaard 2).")
+    generate.add_argument('--activities', type=int, default=400, help="Regels per Excel-werkblad (standaard 400).")
+    generate.add_argument('--seed', type=int, default=42)
+
+    run = commands.add_parser('run', help="Benchmarks uitvoeren.")
+    run.add_argument('--corpus', default='bench_corpus', help="Map met het corpus (standaard bench_corpus).")
+    run.add_argument('--repeat', type=int, default=5, help="Aantal metingen per benchmark (standaard 5).")
+    run.add_argument('--output', default='benchmark_results.json', help="Uitvoer (standaard benchmark_results.json).")
+
+    compare = commands.add_parser('compare', help="Resultaten vergelijken met een baseline.")
+    compare.add_argument('baseline', help="Eerder opgeslagen resultaten (JSON).")
+    compare.add_argument('current', help="Nieuwe resultaten (JSON).")
+    compare.add_argument('--threshold', type=float, default=0.10,
+                         help="Toegestane vertraging als fractie voordat iets een regressie is (standaard 0.10).")
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        info = corpus.generate_corpus(args.output, args.gemeenten, args.headings, args.articles_per_heading,
+                                      args.article_words, args.shards, args.activities, args.seed)
+        corpus.save_corpus_info(args.output, info)
+        print(f"Corpus met {info['documents']} documenten opgeslagen in {args.output}")
+    elif args.command == 'run':
+        results = suite.run_benchmarks(args.corpus, args.repeat)
+        report = suite.benchmark_report(args.corpus, corpus.load_corpus_info(args.corpus), results)
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+        for name, measurement in results.items():
+            print(f"{name:<26} {suite.format_seconds(measurement['median_s']):>12}")
+        print(f"Resultaten opgeslagen in {args.output}")
+    else:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        with open(args.current, 'r', encoding='utf-8') as current_file:
+            current = json.load(current_file)
+        rows = suite.compare_reports(baseline, current, args.threshold)
+        print(suite.format_comparison(rows))
+        # Niet-nul afsluiten bij een regressie, zodat dit in een script of CI als controle te gebruiken is
+        if any(status == 'regressie' for *_, status in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
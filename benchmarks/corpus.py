@@ -0,0 +1,172 @@
+import json
+import os
+import random
+
+import app
+import excel_snapshot
+import jsonmaker
+
+# Woorden waaruit koptitels, activiteitnamen en vultekst worden samengesteld
+VOCABULARY = [
+    "milieubelastende", "activiteit", "opslaan", "gevaarlijke", "stoffen", "tank", "bodem", "lozen",
+    "grondwater", "oppervlaktewater", "afvalwater", "geluid", "geur", "trillingen", "bouwwerk", "kappen",
+    "houtopstand", "bedrijf", "installatie", "verbranden", "afval", "zuiveren", "stookinstallatie",
+    "windturbine", "mestbassin", "landbouw", "dieren", "houden", "parkeren", "evenement", "reclame",
+    "monument", "slopen", "asbest", "energie", "warmte", "koude", "opslagtank", "brandstof", "spuiten"
+]
+NATIONAL_DOCUMENTS = [
+    # (categorie, naam, bestand)
+    ("Besluit activiteiten leefomgeving", "Besluit activiteiten leefomgeving", "bal.jsonl.gz"),
+    ("Besluit bouwwerken leefomgeving", "Besluit bouwwerken leefomgeving", "bbl.jsonl.gz"),
+    ("Besluit kwaliteit leefomgeving", "Besluit kwaliteit leefomgeving", "bkl.jsonl.gz"),
+]
+PREFIX = {
+    "Besluit activiteiten leefomgeving": "Bal",
+    "Besluit bouwwerken leefomgeving": "Bbl",
+    "Besluit kwaliteit leefomgeving": "Bkl",
+}
+
+
+def random_title(rng, words=3):
+    return ' '.join(rng.sample(VOCABULARY, words))
+
+
+def article_text(rng, number, words):
+    return f'<h4 id="art_{number}">Artikel {number}</h4><p>{" ".join(rng.choices(VOCABULARY, k=words))}</p>'
+
+
+def national_content(rng, chapters, headings_per_chapter, articles_per_heading, article_words):
+    """
+    HTML zoals in Bal/Bbl/Bkl: Hoofdstuk > Afdeling > § met ids als 'Hoofdstuk3_Afdeling3.2_Paragraaf3.2.1'.
+    Retourneert (content, lijst van (titel, soort, nummer)).
+    """
+    parts = []
+    headings = []
+    for h in range(1, chapters + 1):
+        parts.append(f'<h1 id="Hoofdstuk{h}">Hoofdstuk {h} {random_title(rng)}</h1>')
+        for a in range(1, max(1, headings_per_chapter // 3) + 1):
+            afdeling = f"{h}.{a}"
+            parts.append(f'<h2 id="Hoofdstuk{h}_Afdeling{afdeling}">Afdeling {afdeling} {random_title(rng)}</h2>')
+            for p in range(1, 4):
+                number = f"{afdeling}.{p}"
+                title = f"§ {number} {random_title(rng)}"
+                headings.append((title, 'paragraaf', number))
+                parts.append(f'<h3 id="Hoofdstuk{h}_Afdeling{afdeling}_Paragraaf{number}">{title}</h3>')
+                for art in range(1, articles_per_heading + 1):
+                    parts.append(article_text(rng, f"{number}.{art}", article_words))
+    return '\n'.join(parts), headings
+
+
+def omgevingsplan_content(rng, headings, articles_per_heading, article_words):
+    """
+    HTML zoals in de bruidsschat van een omgevingsplan: 'Paragraaf 22.3.x' met ids als
+    'chp_22__subchp_22.3__subsec_22.3.4'.
+    """
+    parts = ['<h1 id="chp_22">Hoofdstuk 22 Bruidsschat</h1>', '<h2 id="chp_22__subchp_22.3">Afdeling 22.3 Activiteiten</h2>']
+    titles = []
+    for s in range(1, headings + 1):
+        number = f"22.3.{s}"
+        title = f"Paragraaf {number} {random_title(rng)}"
+        titles.append((title, 'paragraaf', number))
+        parts.append(f'<h3 id="chp_22__subchp_22.3__subsec_{number}">{title}</h3>')
+        for art in range(1, articles_per_heading + 1):
+            parts.append(article_text(rng, f"22.{s * 10 + art}", article_words))
+    return '\n'.join(parts), titles
+
+
+def generate_corpus(output_dir, gemeenten=20, headings=60, articles_per_heading=3, article_words=80,
+                    shards=jsonmaker.OMGEVINGSPLAN_SHARDS, activities=400, seed=42):
+    """
+    Schrijft een synthetisch corpus in het formaat van jsonmaker.py naar output_dir: de cachebestanden
+    (.jsonl.gz), manifest.json, heading_index.json, sections.db, een Excel-bestand met de twee
+    activiteitenwerkbladen en de snapshot daarvan.
+    - gemeenten: aantal omgevingsplannen
+    - headings: aantal paragrafen per omgevingsplan (de besluiten krijgen er evenveel)
+    - articles_per_heading / article_words: bepalen de documentgrootte
+    """
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    entries = []
+    heading_index = {}
+    references = []  # (categorie, titel, soort, nummer) voor de Excel-werkbladen
+    section_store = jsonmaker.open_section_store(os.path.join(output_dir, jsonmaker.SECTIONS_DB))
+
+    def write_document(writer, filename, url, record):
+        offset, size = writer.write(url, record)
+        entries.append(jsonmaker.manifest_entry(url, record, filename, offset, size))
+        heading_index[url] = jsonmaker.heading_index_entry(record)
+        if section_store is not None:
+            section_store.write(url, record)
+
+    for category, name, filename in NATIONAL_DOCUMENTS:
+        content, titles = national_content(rng, max(1, headings // 6), 6, articles_per_heading, article_words)
+        writer = jsonmaker.CacheFileWriter(os.path.join(output_dir, filename))
+        write_document(writer, filename, f"https://wetten.example/{PREFIX[category].lower()}",
+                       {'name': name, 'category': category, 'content': content})
+        writer.close()
+        references.extend((category,) + title for title in titles)
+
+    shard_files = [f"omgevingsplannen_{i + 1}{jsonmaker.CACHE_FILE_EXTENSION}" for i in range(shards)]
+    writers = [jsonmaker.CacheFileWriter(os.path.join(output_dir, filename)) for filename in shard_files]
+    for g in range(gemeenten):
+        content, titles = omgevingsplan_content(rng, headings, articles_per_heading, article_words)
+        shard = g % shards
+        write_document(writers[shard], shard_files[shard], f"https://lokaleregelgeving.example/CVDR{100000 + g}",
+                       {'name': f"Gemeente {g + 1:03d}", 'category': "Omgevingsplan", 'content': content})
+        if g == 0:
+            references.extend(("Omgevingsplan",) + title for title in titles)
+    for writer in writers:
+        writer.close()
+
+    # Manifestpaden zijn relatief ten opzichte van output_dir, net als bij een echte crawl
+    jsonmaker.save_manifest(entries, os.path.join(output_dir, 'manifest.json'))
+    jsonmaker.save_json_file(heading_index, os.path.join(output_dir, 'heading_index.json'))
+    if section_store is not None:
+        section_store.close()
+
+    # Zelfde bestandsnaam als in app.py, zodat search_in_excel het synthetische bestand vindt
+    write_activity_sheets(rng, os.path.join(output_dir, app.EXCEL_PATH), references, activities)
+    excel_snapshot.build_snapshot(os.path.join(output_dir, app.EXCEL_PATH),
+                                  os.path.join(output_dir, app.EXCEL_SNAPSHOT_PATH))
+    return {
+        'gemeenten': gemeenten, 'headings': headings, 'articles_per_heading': articles_per_heading,
+        'article_words': article_words, 'shards': shards, 'activities': activities, 'seed': seed,
+        'documents': len(entries)
+    }
+
+
+def write_activity_sheets(rng, path, references, activities):
+    """
+    Excel met 'Bruidsschat omgevingsplan' en 'Overzicht activiteiten Rijk', elk met een naam,
+    een activiteit-ID en een 'Bron in regelgeving' die naar bestaande paragrafen verwijst.
+    """
+    national = [ref for ref in references if ref[0] != "Omgevingsplan"]
+    bruidsschat = [ref for ref in references if ref[0] == "Omgevingsplan"]
+    rijk_rows = []
+    for i in range(activities):
+        refs = rng.sample(national, min(len(national), rng.randint(1, 3)))
+        bron = ', '.join(f"{PREFIX[category]} paragraaf {number}" for category, title, kind, number in refs)
+        rijk_rows.append({'Naam activiteit': random_title(rng, 4), 'Activiteit ID': f"RIJK-{i:05d}",
+                          'Bron in regelgeving': bron})
+    bruidsschat_rows = []
+    for i in range(activities if bruidsschat else 0):
+        category, title, kind, number = rng.choice(bruidsschat)
+        bruidsschat_rows.append({'Naam': random_title(rng, 4), 'Activiteit ID': f"BS-{i:05d}",
+                                 'Bron in regelgeving': f"Bruidsschat Omgevingsplan paragraaf {number}"})
+    pd = app.import_pandas()
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(bruidsschat_rows).to_excel(writer, sheet_name="Bruidsschat omgevingsplan", index=False)
+        pd.DataFrame(rijk_rows).to_excel(writer, sheet_name="Overzicht activiteiten Rijk", index=False)
+
+
+def save_corpus_info(output_dir, info):
+    with open(os.path.join(output_dir, 'corpus_info.json'), 'w', encoding='utf-8') as info_file:
+        json.dump(info, info_file, indent=2)
+
+
+def load_corpus_info(corpus_dir):
+    path = os.path.join(corpus_dir, 'corpus_info.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as info_file:
+        return json.load(info_file)
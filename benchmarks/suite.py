@@ -0,0 +1,215 @@
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import app
+
+# Zoektermen voor de benchmarks: veelvoorkomend, zeldzaam en zonder treffer
+SEARCH_TERMS = ["opslaan", "gevaarlijke stoffen", "windturbine", "bestaat-niet"]
+
+
+def measure(function, repeat=5, number=1, setup=None):
+    """
+    Voert function `number` keer uit per meting en herhaalt dat `repeat` keer; setup (optioneel) draait
+    vóór elke meting en telt niet mee. Retourneert de tijden per aanroep in seconden.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        'median_s': statistics.median(timings),
+        'min_s': min(timings),
+        'mean_s': statistics.mean(timings),
+        'repeat': repeat,
+        'number': number
+    }
+
+
+def clear_load_caches():
+    """
+    Leegt de st.cache_resource-caches van de laadfuncties, zodat het inlezen koud gemeten wordt.
+    """
+    for cached_function in (app._load_files_cached, app._load_heading_index_cached, app._load_manifest_cached,
+                            app._load_heading_trigram_index_cached, app._load_excel_index_cached,
+                            app._load_excel_sheets_cached, app.load_excel_file, app._load_mapped_corpus_cached):
+        cached_function.clear()
+    app.document_store().clear()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(app.__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(corpus_dir, repeat=5):
+    """
+    Meet de hete paden van app.py op het corpus in corpus_dir. De app leest zijn bestanden relatief
+    ten opzichte van de werkmap, dus er wordt tijdelijk naar corpus_dir gewisseld.
+    Retourneert {naam: meting}.
+    """
+    cwd = os.getcwd()
+    os.chdir(corpus_dir)
+    try:
+        return _run_benchmarks(repeat)
+    finally:
+        os.chdir(cwd)
+
+
+def _run_benchmarks(repeat):
+    results = {}
+    # Koude start: een nieuw proces dat app.py importeert, en de warm-up met lege caches
+    results['import_app'] = measure(
+        lambda: subprocess.run([sys.executable, '-c', 'import app'], check=True, capture_output=True,
+                               cwd=os.path.dirname(os.path.abspath(app.__file__))),
+        repeat
+    )
+    results['warm_up'] = measure(app.warm_up, repeat, setup=clear_load_caches)
+    results['load_multiple_files'] = measure(app.load_multiple_files, repeat, setup=clear_load_caches)
+    if os.path.exists(app.MAPPED_CORPUS_PATH):
+        # Openen van het gemapte corpus (python mapped_corpus.py in de corpusmap) tegenover load_multiple_files
+        results['open_mapped_corpus'] = measure(app.load_mapped_corpus, repeat, setup=clear_load_caches)
+    cache = app.load_multiple_files()
+    heading_index = app.load_heading_index()
+    manifest = app.load_manifest()
+    categories = app.available_categories(manifest)
+    gemeente = next(data['name'] for data in cache.values() if data['category'] == "Omgevingsplan")
+
+    # Documenten van één gemeente plus de besluiten uit een lege documentstore (zonder koppen-index, dus met content)
+    results['load_corpus_for_query'] = measure(
+        lambda: app.load_corpus_for_query(manifest, categories, gemeente, None), repeat, setup=app.document_store().clear
+    )
+
+    omgevingsplannen = [data['content'] for data in cache.values() if data['category'] == "Omgevingsplan"]
+    results['search_paragraphs'] = measure(
+        lambda: [app.search_paragraphs(content, term) for content in omgevingsplannen for term in SEARCH_TERMS],
+        repeat
+    )
+
+    titles = [(cache[url]['category'], title) for url, entry in heading_index.items() for title, _, _ in entry['titles']]
+    results['generate_anchor_link'] = measure(
+        lambda: [app.generate_anchor_link(category, title) for category, title in titles], repeat
+    )
+
+    # Resultaten van alle omgevingsplannen voor één term: veel (bijna) gelijke titels, zoals bij zoeken zonder gemeente
+    similar = set()
+    for url, data in cache.items():
+        if data['category'] == "Omgevingsplan":
+            paragraphs = [(title, anchor) for title, title_lower, anchor in heading_index[url]['titles']
+                          if SEARCH_TERMS[0] in title_lower]
+            similar.update(app.document_results(cache, url, paragraphs))
+    results['filter_similar_results'] = measure(lambda: app.filter_similar_results(similar), repeat)
+
+    all_titles = [title for category, title in titles]
+    results['natural_sort_key'] = measure(lambda: sorted(all_titles, key=app.natural_sort_key), repeat)
+
+    if os.path.exists(app.EXCEL_PATH):
+        # Koud laden van de Excel-index uit de snapshot, en via openpyxl als er geen geldige snapshot is
+        results['load_excel_index'] = measure(app.load_excel_index, repeat, setup=clear_load_caches)
+        snapshot_path = app.EXCEL_SNAPSHOT_PATH
+        app.EXCEL_SNAPSHOT_PATH = snapshot_path + '.ontbreekt'
+        try:
+            results['load_excel_index_xlsx'] = measure(app.load_excel_index, repeat, setup=clear_load_caches)
+        finally:
+            app.EXCEL_SNAPSHOT_PATH = snapshot_path
+        excel_index, _ = app.load_excel_index()
+        excel_terms = list(excel_index)[:200]
+        results['search_in_excel'] = measure(
+            lambda: [app.search_in_excel(term, gemeente, cache, heading_index) for term in excel_terms], repeat
+        )
+
+    results['process_cache'] = measure(
+        lambda: [app.process_cache(cache, term, categories, gemeente, heading_index) for term in SEARCH_TERMS],
+        repeat
+    )
+    # Met typefouten (trigram-index); de index wordt eerst één keer gebouwd
+    fuzzy_terms = ["opslagtnak", "windturbien", "gevaarlike stofen"]
+    app.process_cache(cache, fuzzy_terms[0], categories, gemeente, heading_index, mode=app.MATCH_MODE_FUZZY)
+    results['process_cache_fuzzy'] = measure(
+        lambda: [app.process_cache(cache, term, categories, gemeente, heading_index, mode=app.MATCH_MODE_FUZZY)
+                 for term in fuzzy_terms],
+        repeat
+    )
+    if os.path.exists(app.SECTIONS_DB_PATH):
+        results['search_fulltext'] = measure(
+            lambda: [app.search_fulltext(term, categories, gemeente) for term in SEARCH_TERMS], repeat
+        )
+    # Zonder koppen-index: de regex-scan over alle documenten (terugvalpad)
+    results['process_cache_scan'] = measure(
+        lambda: [app.process_cache(cache, term, categories, gemeente, None) for term in SEARCH_TERMS], repeat
+    )
+    return results
+
+
+def benchmark_report(corpus_dir, corpus_info, results):
+    """
+    Machineleesbaar rapport: metagegevens (revisie, Python, platform, corpus) plus de metingen.
+    """
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'corpus_dir': corpus_dir,
+            'corpus': corpus_info
+        },
+        'benchmarks': results
+    }
+
+
+def compare_reports(baseline, current, threshold=0.10):
+    """
+    Vergelijkt de mediane tijden per benchmark. Een benchmark is een regressie als die meer dan
+    `threshold` (fractie) trager is dan de baseline. Retourneert een lijst van
+    (naam, baseline_s, huidig_s, verhouding, status) met status 'regressie', 'sneller', 'gelijk',
+    'nieuw' of 'ontbreekt'.
+    """
+    rows = []
+    names = list(baseline['benchmarks']) + [name for name in current['benchmarks'] if name not in baseline['benchmarks']]
+    for name in names:
+        old = baseline['benchmarks'].get(name)
+        new = current['benchmarks'].get(name)
+        if old is None or new is None:
+            rows.append((name, old and old['median_s'], new and new['median_s'], None,
+                         'nieuw' if old is None else 'ontbreekt'))
+            continue
+        ratio = new['median_s'] / old['median_s'] if old['median_s'] else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regressie'
+        elif ratio < 1 - threshold:
+            status = 'sneller'
+        else:
+            status = 'gelijk'
+        rows.append((name, old['median_s'], new['median_s'], ratio, status))
+    return rows
+
+
+def format_comparison(rows):
+    counts = defaultdict(int)
+    lines = [f"{'benchmark':<26} {'baseline':>12} {'huidig':>12} {'verhouding':>11}  status"]
+    for name, old, new, ratio, status in rows:
+        counts[status] += 1
+        lines.append(
+            f"{name:<26} {format_seconds(old):>12} {format_seconds(new):>12} "
+            f"{(f'{ratio:.2f}x' if ratio is not None else '-'):>11}  {status}"
+        )
+    lines.append(', '.join(f"{count} {status}" for status, count in sorted(counts.items())))
+    return '\n'.join(lines)
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    return f"{seconds * 1000:.2f} ms"
@@ -0,0 +1,75 @@
+import gzip
+import json
+import os
+
+# Cachebestanden zijn JSON Lines met gzip-framing: elk document is een los gzip-member met één JSON-regel
+# ({"url", "name", "category", "content"}). Achter elkaar vormen de members een geldig .gz-bestand dat
+# gestreamd gelezen kan worden, en via (offset, grootte) uit het manifest is één document los te decomprimeren.
+# jsonmaker.py schrijft dit formaat; jsonmaker.py en app.py lezen het via deze module.
+CACHE_FILE_EXTENSION = '.jsonl.gz'
+
+
+class CacheFileWriter:
+    """
+    Schrijft documenten direct na binnenkomst naar een (tijdelijk) cachebestand.
+    Bij close() wordt het tijdelijke bestand atomair op de plaats van het echte bestand gezet.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.temp_filename = filename + '.tmp'
+        self.file = open(self.temp_filename, 'wb')
+        self.bytes_written = 0
+        self.urls = set()
+
+    def write(self, url, record):
+        """
+        Schrijft één document; retourneert (offset, grootte) van het gzip-member.
+        """
+        line = json.dumps({'url': url, **record}, ensure_ascii=False) + '\n'
+        return self.write_member(url, gzip.compress(line.encode('utf-8')))
+
+    def write_member(self, url, member):
+        """
+        Schrijft een al gecomprimeerd member (bijv. ongewijzigd overgenomen uit het vorige bestand).
+        """
+        offset = self.bytes_written
+        self.file.write(member)
+        self.bytes_written += len(member)
+        self.urls.add(url)
+        return offset, len(member)
+
+    def close(self):
+        self.file.close()
+        os.replace(self.temp_filename, self.filename)
+
+
+def read_cached_member(entry):
+    """
+    Leest het gecomprimeerde member van één document uit een cachebestand (via de manifest-entry).
+    """
+    with open(entry['file'], 'rb') as cache_file:
+        cache_file.seek(entry['offset'])
+        return cache_file.read(entry['size'])
+
+
+def read_cached_record(entry):
+    """
+    Leest één document-record uit een cachebestand (via de manifest-entry).
+    """
+    return json.loads(gzip.decompress(read_cached_member(entry)))
+
+
+def iter_cache_file(file_path):
+    """
+    Leest de documenten (url, record) één voor één uit een cachebestand, zonder eerst het hele
+    bestand als één JSON-document te parsen. Oude JSON-bestanden (één groot object) worden ook ondersteund.
+    """
+    if file_path.endswith('.gz'):
+        with gzip.open(file_path, 'rt', encoding='utf-8') as cache_file:
+            for line in cache_file:
+                record = json.loads(line)
+                yield record.pop('url'), record
+    else:
+        with open(file_path, 'r', encoding='utf-8') as cache_file:
+            yield from json.load(cache_file).items()
@@ -0,0 +1,109 @@
+import argparse
+import hashlib
+import os
+import pickle
+import time
+
+# Zelfde bestandsnaam als EXCEL_PATH in app.py
+EXCEL_PATH = "overzicht-rijksactiviteiten-in-omgevingsloket-met-bron-in-regelgeving_v1-3.xlsx"
+SNAPSHOT_PATH = "excel_snapshot.pickle"
+# Werkbladen die de app en batch_search.py gebruiken
+SHEET_NAMES = ["Bruidsschat omgevingsplan", "Overzicht activiteiten Rijk"]
+# Ophogen als het formaat van de snapshot verandert; oudere snapshots worden dan genegeerd
+SNAPSHOT_VERSION = 1
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_sheets(excel_source, sheet_names=SHEET_NAMES):
+    """
+    Leest de werkbladen met pandas/openpyxl in kolomvorm: {werkblad: {kolom: [waarden]}}.
+    Kolomnamen zonder omringende witruimte; lege cellen worden None en waarden die geen str, int,
+    float of bool zijn (bijv. datums) worden tekst, zodat de snapshot zonder pandas te laden is.
+    Ontbrekende werkbladen komen niet in het resultaat voor.
+    """
+    import pandas as pd
+    xls = excel_source if isinstance(excel_source, pd.ExcelFile) else pd.ExcelFile(excel_source)
+    sheets = {}
+    for sheet_name in sheet_names:
+        try:
+            df = pd.read_excel(xls, sheet_name=sheet_name)
+        except ValueError:
+            continue
+        sheets[sheet_name] = {
+            str(column).strip(): [
+                None if pd.isna(value) else value if isinstance(value, (str, int, float, bool)) else str(value)
+                for value in df[column].tolist()
+            ]
+            for column in df.columns
+        }
+    return sheets
+
+
+def build_snapshot(excel_path=EXCEL_PATH, snapshot_path=SNAPSHOT_PATH, sheet_names=SHEET_NAMES):
+    """
+    Zet de werkbladen om naar een pickle met de SHA-256 van het Excel-bestand erbij.
+    Wordt via een tijdelijk bestand geschreven, zodat een lezer nooit een half bestand ziet.
+    """
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'source': os.path.basename(excel_path),
+        'source_sha256': file_sha256(excel_path),
+        'sheets': read_sheets(excel_path, sheet_names)
+    }
+    temp_path = snapshot_path + '.tmp'
+    with open(temp_path, 'wb') as snapshot_file:
+        pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, snapshot_path)
+    return snapshot
+
+
+def load_snapshot(excel_path=EXCEL_PATH, snapshot_path=SNAPSHOT_PATH):
+    """
+    Retourneert de werkbladen uit de snapshot ({werkblad: {kolom: [waarden]}}), of None als de snapshot
+    ontbreekt, een ander formaat heeft of niet bij het huidige Excel-bestand hoort (andere hash).
+    """
+    if not os.path.exists(snapshot_path) or not os.path.exists(excel_path):
+        return None
+    try:
+        with open(snapshot_path, 'rb') as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('source_sha256') != file_sha256(excel_path):
+        return None
+    return snapshot['sheets']
+
+
+def ensure_snapshot(excel_path=EXCEL_PATH, snapshot_path=SNAPSHOT_PATH):
+    """
+    Bouwt de snapshot opnieuw als die ontbreekt of verouderd is. Retourneert True als er een nieuwe
+    snapshot is geschreven; zonder Excel-bestand gebeurt er niets.
+    """
+    if not os.path.exists(excel_path) or load_snapshot(excel_path, snapshot_path) is not None:
+        return False
+    build_snapshot(excel_path, snapshot_path)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zet de activiteitenwerkbladen uit de Excel om naar een snapshot.")
+    parser.add_argument('--excel', default=EXCEL_PATH, help="Excel-bestand (standaard het bestand van de app).")
+    parser.add_argument('--output', default=SNAPSHOT_PATH, help=f"Snapshot (standaard {SNAPSHOT_PATH}).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = build_snapshot(args.excel, args.output)
+    rows = sum(len(next(iter(columns.values()), [])) for columns in snapshot['sheets'].values())
+    print(f"Snapshot met {len(snapshot['sheets'])} werkbladen ({rows} regels) opgeslagen in {args.output} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
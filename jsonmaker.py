@@ -4,6 +4,20 @@ import json
 import re
 import nest_asyncio
 import os
+import argparse
+import hashlib
+import glob
+import random
+import shutil
+import sqlite3
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+from html.parser import HTMLParser
+
+import excel_snapshot
+# Formaat van de cachebestanden (JSON Lines met gzip-framing), gedeeld met app.py
+from cache_files import CACHE_FILE_EXTENSION, CacheFileWriter, read_cached_member, read_cached_record, iter_cache_file
 
 # Zorg ervoor dat er een event loop is voordat je nest_asyncio toepast
 loop = asyncio.new_event_loop()
@@ -21,78 +35,716 @@ def read_urls(file_path='urls.txt'):
                 urls.append((name, url, category))
     return urls
 
-# Asynchrone functie om de inhoud van een URL op te halen
-async def fetch_content(session, url, semaphore):
-    async with semaphore:
-        async with session.get(url) as response:
-            return await response.text()
+# Standaardinstellingen voor het ophalen; aan te passen via de opdrachtregel
+MAX_CONCURRENT_REQUESTS = 4
+MAX_REQUESTS_PER_HOST = 2
+MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0
+REQUEST_TIMEOUT_SECONDS = 120
+# Aantal cachebestanden (shards) waarover de omgevingsplannen verdeeld worden
+OMGEVINGSPLAN_SHARDS = 2
+
+# Asynchrone functie om de inhoud van een URL op te halen.
+# Met een eerdere crawl-status wordt een conditioneel verzoek gedaan (If-None-Match / If-Modified-Since);
+# bij '304 Not Modified' is de content None. Retourneert (content, response-headers).
+async def fetch_content(session, url, state=None):
+    headers = {}
+    if state:
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+    async with session.get(url, headers=headers) as response:
+        if response.status == 304:
+            return None, response.headers
+        response.raise_for_status()
+        return await response.text(), response.headers
+
+# Functie die bepaalt of een mislukte poging opnieuw geprobeerd moet worden:
+# netwerkfouten, time-outs, 429 en 5xx wel; overige HTTP-fouten (bijv. 404) niet
+def is_retryable(error):
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+# Asynchrone functie om een URL op te halen met herhaalpogingen (exponentiële backoff met jitter).
+# De globale semaphore en de semaphore per host beperken samen het aantal gelijktijdige verzoeken.
+# De latentie is de duur van het (laatste) verzoek zelf; de tijd dat het verzoek op een vrije plek
+# wachtte staat apart in queue_seconds, zodat de latentie niet meegroeit met de wachtrij.
+# Geeft nooit een exceptie door: het resultaat bevat de content of de foutmelding.
+async def fetch_with_retries(session, name, url, category, semaphore, host_semaphore, state=None,
+                             max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF_SECONDS):
+    result = {'name': name, 'url': url, 'category': category, 'content': None, 'headers': {}, 'error': None, 'bytes': 0,
+              'latency': 0.0, 'queue_seconds': 0.0}
+    for attempt in range(max_retries + 1):
+        try:
+            queued = time.perf_counter()
+            async with host_semaphore, semaphore:
+                start = time.perf_counter()
+                result['queue_seconds'] += start - queued
+                try:
+                    result['content'], result['headers'] = await fetch_content(session, url, state)
+                finally:
+                    result['latency'] = time.perf_counter() - start
+            result['error'] = None
+            result['bytes'] = len(result['content'].encode('utf-8')) if result['content'] is not None else 0
+            break
+        except Exception as error:
+            result['error'] = f"{type(error).__name__}: {error}"
+            if attempt == max_retries or not is_retryable(error):
+                break
+            await asyncio.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+    result['attempts'] = attempt + 1
+    return result
 
-# Functie om de inhoud van de wetgeving op te slaan in een JSON-bestand
-def save_cache_to_file(data, filename):
+# Functie om een samenvatting (doorvoer en latentie per URL) en de mislukte URLs op te slaan en te tonen
+def save_crawl_report(results, elapsed, filename='crawl_report.json'):
+    succeeded = [result for result in results if result['error'] is None]
+    failed = [result for result in results if result['error'] is not None]
+    downloaded_bytes = sum(result['bytes'] for result in succeeded)
+    latencies = sorted(result['latency'] for result in results)
+    queue_seconds = sorted(result['queue_seconds'] for result in results)
+    summary = {
+        'documents': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(failed),
+        'elapsed_seconds': round(elapsed, 3),
+        'megabytes': round(downloaded_bytes / 1e6, 3),
+        'documents_per_second': round(len(succeeded) / elapsed, 3) if elapsed else None,
+        'megabytes_per_second': round(downloaded_bytes / 1e6 / elapsed, 3) if elapsed else None,
+        'latency_p50_seconds': round(latencies[len(latencies) // 2], 3) if latencies else None,
+        'latency_p95_seconds': round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None,
+        'latency_max_seconds': round(latencies[-1], 3) if latencies else None,
+        'queue_p50_seconds': round(queue_seconds[len(queue_seconds) // 2], 3) if queue_seconds else None,
+        'queue_max_seconds': round(queue_seconds[-1], 3) if queue_seconds else None
+    }
+    report = {
+        'summary': summary,
+        'failed': [
+            {'name': result['name'], 'url': result['url'], 'error': result['error'], 'attempts': result['attempts']}
+            for result in failed
+        ],
+        'latency_per_url': {result['url']: round(result['latency'], 3) for result in results}
+    }
     with open(filename, 'w', encoding='utf-8') as file:
-        json.dump(data, file, ensure_ascii=False, indent=4)
+        json.dump(report, file, ensure_ascii=False, indent=1)
+    print(f"{summary['succeeded']}/{summary['documents']} documenten opgehaald in {summary['elapsed_seconds']}s "
+          f"({summary['documents_per_second']} docs/s, {summary['megabytes_per_second']} MB/s, "
+          f"p50 {summary['latency_p50_seconds']}s, p95 {summary['latency_p95_seconds']}s, "
+          f"wachtrij p50 {summary['queue_p50_seconds']}s)")
+    for result in failed:
+        print(f"Mislukt na {result['attempts']} poging(en): {result['url']} ({result['error']})")
+    print(f"Crawlrapport opgeslagen in {filename}")
+
+# Functie om een JSON-bestand te lezen, met een standaardwaarde als het bestand (nog) niet bestaat
+def load_json_file(filename, default):
+    try:
+        with open(filename, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return default
+
+# Functie om een JSON-bestand (koppen-index, manifest, status) compact op te slaan
+def save_json_file(data, filename):
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, separators=(',', ':'))
+
+# Functie om de manifest-regel (metadata zonder content) van een opgeslagen document te maken
+def manifest_entry(url, record, filename, offset, size):
+    return {
+        'url': url,
+        'name': record['name'],
+        'category': record['category'],
+        'file': filename,
+        'offset': offset,
+        'size': size
+    }
+
+# Functie om het manifest op te slaan: per document url, naam, categorie, bestand, offset en grootte,
+# en per cachebestand (shard) het aantal documenten en bytes, zodat de app weet welke bestanden er zijn
+def save_manifest(entries, filename='manifest.json'):
+    shards = {}
+    for entry in entries:
+        shard = shards.setdefault(entry['file'], {'file': entry['file'], 'documents': 0, 'bytes': 0})
+        shard['documents'] += 1
+        shard['bytes'] += entry['size']
+    save_json_file({'documents': entries, 'shards': list(shards.values())}, filename)
+
+# Kop moet beginnen met Hoofdstuk/Afdeling/Paragraaf/§/Artikel gevolgd door een nummer
+HEADING_TITLE_REGEX = re.compile(r"^(Hoofdstuk|Afdeling|Paragraaf|§|Artikel)\s*(\d+(?:\.\d+)*[a-z]?)\.?(?:\s|$)", re.IGNORECASE)
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+# Elementen zonder eindtag; die komen niet op de stack van open elementen
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+# Functie om overtollige witruimte uit een kop te verwijderen
+def clean_heading_text(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+# HTML-parser die in één doorloop alle koppen met hun echte anker (id-attribuut) verzamelt.
+# Het anker is het id van de kop zelf, anders het meest recente van: het id van het dichtstbijzijnde
+# omsluitende element of een los <a id/name>-anker dat daarna (vóór de kop) staat.
+# Met collect_text=True wordt ook de lopende tekst na elke kop (tot de volgende kop) verzameld in 'bodies'.
+class OutlineParser(HTMLParser):
+    def __init__(self, collect_text=False):
+        super().__init__(convert_charrefs=True)
+        self.open_elements = []  # (tag, id, volgnummer) van alle open elementen
+        self.tag_counter = 0
+        self.last_anchor = (None, -1)  # (id, volgnummer) van het laatst geziene <a>-anker
+        self.heading_parts = None
+        self.heading_anchor = None
+        self.headings = []
+        self.collect_text = collect_text
+        self.bodies = []  # per kop de tekstfragmenten die erna komen
+
+    def handle_starttag(self, tag, attrs):
+        self.tag_counter += 1
+        attrs = dict(attrs)
+        element_id = attrs.get('id') or (attrs.get('name') if tag == 'a' else None)
+        if tag == 'a' and element_id:
+            self.last_anchor = (element_id, self.tag_counter)
+        if tag in VOID_TAGS:
+            return
+        self.open_elements.append((tag, element_id, self.tag_counter))
+        if tag in HEADING_TAGS and self.heading_parts is None:
+            self.heading_parts = []
+            self.heading_anchor = element_id or self._nearest_anchor()
+
+    def _nearest_anchor(self):
+        for _, open_id, order in reversed(self.open_elements):
+            if open_id:
+                return self.last_anchor[0] if self.last_anchor[1] > order else open_id
+        return self.last_anchor[0]
+
+    def handle_endtag(self, tag):
+        # Tolerant voor niet-gesloten elementen: sluit alles tot en met de bijbehorende starttag
+        for i in range(len(self.open_elements) - 1, -1, -1):
+            if self.open_elements[i][0] == tag:
+                del self.open_elements[i:]
+                break
+        if tag in HEADING_TAGS and self.heading_parts is not None:
+            title = clean_heading_text(''.join(self.heading_parts))
+            title_match = HEADING_TITLE_REGEX.match(title)
+            if title_match:
+                self.headings.append({
+                    'kind': title_match.group(1),
+                    'number': title_match.group(2),
+                    'title': title,
+                    'anchor': self.heading_anchor
+                })
+                if self.collect_text:
+                    self.bodies.append([])
+            elif self.collect_text and self.bodies:
+                # Een kop zonder nummer (bijv. 'Toelichting') hoort bij de tekst van de lopende sectie
+                self.bodies[-1].append(' ' + title + ' ')
+            self.heading_parts = None
+
+    def handle_data(self, data):
+        if self.heading_parts is not None:
+            self.heading_parts.append(data)
+        elif self.collect_text and self.bodies:
+            self.bodies[-1].append(data)
+
+# Functie om de HTML één keer te parsen tot een koppenboom. De boom wordt plat opgeslagen in
+# documentvolgorde; 'parent' is de positie van de omsluitende kop (of None).
+def parse_outline(content):
+    parser = OutlineParser()
+    parser.feed(content)
+    parser.close()
+    return assign_parents(parser.headings)
+
+# Functie om in een platte koppenlijst per kop de positie van de omsluitende kop ('parent') te zetten
+def assign_parents(outline):
+    open_sections = []  # posities van de huidige keten Hoofdstuk > Afdeling > Paragraaf
+    for position, node in enumerate(outline):
+        if node['kind'].lower() == 'artikel':
+            # Een artikel hoort bij de binnenste open sectie
+            node['parent'] = open_sections[-1] if open_sections else None
+            continue
+        # Sluit secties waarvan het nummer geen prefix is van het nummer van deze kop
+        while open_sections and not node['number'].startswith(outline[open_sections[-1]]['number'] + '.'):
+            open_sections.pop()
+        node['parent'] = open_sections[-1] if open_sections else None
+        open_sections.append(position)
+    return outline
+
+# Functie om een document op te delen in secties voor de full-text-index: per kop (ook artikelen) het
+# koppenpad (bijv. "Hoofdstuk 3 ... › § 3.2 ... › Artikel 3.5"), het anker en de platte tekst tot de volgende kop.
+# Een kop zonder eigen anker krijgt het anker van de dichtstbijzijnde omsluitende kop.
+def parse_sections(content):
+    parser = OutlineParser(collect_text=True)
+    parser.feed(content)
+    parser.close()
+    outline = assign_parents(parser.headings)
+    sections = []
+    for node, body_parts in zip(outline, parser.bodies):
+        path = [node['title']]
+        anchor = node['anchor']
+        parent = node['parent']
+        while parent is not None:
+            path.append(outline[parent]['title'])
+            anchor = anchor or outline[parent]['anchor']
+            parent = outline[parent]['parent']
+        sections.append({
+            'heading_path': ' › '.join(reversed(path)),
+            'anchor': anchor,
+            'body': clean_heading_text(''.join(body_parts))
+        })
+    return sections
+
+# Bouw de koppen-index-regel van één document: naam, categorie en de koppenboom
+def heading_index_entry(record):
+    return {
+        'name': record['name'],
+        'category': record['category'],
+        'headings': parse_outline(record['content'])
+    }
+
+SECTIONS_DB = 'sections.db'
+
+# SQLite FTS5-database met één rij per sectie (document, categorie, gemeente, koppenpad, anker, tekst),
+# zodat de app gerangschikt (BM25) in de volledige tekst kan zoeken zonder de HTML in het geheugen te hebben.
+# Er wordt in een tijdelijk bestand geschreven dat bij close() atomair op zijn plaats wordt gezet;
+# incrementeel wordt het vorige bestand als startpunt gebruikt.
+# De url is een UNINDEXED kolom: 'DELETE ... WHERE url = ?' zou de hele tabel doorlopen. Daarom krijgen de
+# secties van een document zelf opeenvolgende rowids, en houdt de gewone tabel section_documents per url
+# het rowid-bereik bij; een document vervangen of verwijderen is dan een opzoeking op rowid.
+class SectionStore:
+    def __init__(self, filename=SECTIONS_DB, incremental=False):
+        self.filename = filename
+        self.temp_filename = filename + '.tmp'
+        if os.path.exists(self.temp_filename):
+            os.remove(self.temp_filename)
+        if incremental and os.path.exists(filename):
+            shutil.copyfile(filename, self.temp_filename)
+        self.connection = sqlite3.connect(self.temp_filename)
+        self.connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS sections USING fts5("
+            "heading_path, body, url UNINDEXED, name UNINDEXED, category UNINDEXED, gemeente UNINDEXED, "
+            "anchor UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS section_documents (url TEXT PRIMARY KEY, first_rowid INTEGER, last_rowid INTEGER)")
+        self.urls = {row[0] for row in self.connection.execute("SELECT url FROM section_documents")}
+        self.next_rowid = (self.connection.execute("SELECT MAX(rowid) FROM sections").fetchone()[0] or 0) + 1
+
+    # Vervangt alle secties van één document
+    def write(self, url, record):
+        gemeente = record['name'] if "omgevingsplan" in record['category'].lower() else ''
+        if url in self.urls:
+            self.delete(url)
+        rows = [(section['heading_path'], section['body'], url, record['name'], record['category'], gemeente,
+                 section['anchor']) for section in parse_sections(record['content'])]
+        first_rowid = self.next_rowid
+        self.connection.executemany(
+            "INSERT INTO sections (rowid, heading_path, body, url, name, category, gemeente, anchor) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(first_rowid + i,) + row for i, row in enumerate(rows)]
+        )
+        self.next_rowid += len(rows)
+        self.connection.execute("INSERT INTO section_documents VALUES (?, ?, ?)", (url, first_rowid, self.next_rowid - 1))
+        self.urls.add(url)
+
+    # Verwijdert de secties van één document via zijn rowid-bereik
+    def delete(self, url):
+        row = self.connection.execute(
+            "SELECT first_rowid, last_rowid FROM section_documents WHERE url = ?", (url,)).fetchone()
+        if row is not None:
+            self.connection.execute("DELETE FROM sections WHERE rowid BETWEEN ? AND ?", row)
+            self.connection.execute("DELETE FROM section_documents WHERE url = ?", (url,))
+        self.urls.discard(url)
+
+    # Verwijdert documenten die niet meer in de crawl voorkomen
+    def retain(self, urls):
+        for url in self.urls - set(urls):
+            self.delete(url)
+
+    def close(self):
+        self.connection.execute("INSERT INTO sections (sections) VALUES ('optimize')")
+        self.connection.commit()
+        self.connection.close()
+        os.replace(self.temp_filename, self.filename)
+
+# Functie om de sectie-database te openen; zonder FTS5-ondersteuning in SQLite wordt die overgeslagen
+def open_section_store(filename=SECTIONS_DB, incremental=False):
+    try:
+        return SectionStore(filename, incremental)
+    except sqlite3.OperationalError as e:
+        print(f"Full-text-index '{filename}' wordt overgeslagen: {e}")
+        return None
+
+SEGMENTS_DIR = 'segments'
+# Aantal generaties (met hun segmenten) dat bewaard blijft, zodat een app die nog een oudere generatie
+# gebruikt de content daarvan kan blijven lezen
+KEEP_GENERATIONS = 3
+
+# Geversioneerde indexsegmenten per document, zodat een draaiende app een update kan oppakken zonder
+# alles opnieuw te parsen. Per document en contentversie zijn er twee onveranderlijke bestanden in
+# SEGMENTS_DIR: '<url-sleutel>-<content-hash>.jsonl.gz' (de record als één gzip-member, zoals in de
+# cachebestanden) en '<url-sleutel>-<content-hash>.index.json' (de koppen-index-entry). Een generatie
+# ('generation-<n>.json') is een manifest dat per document naar zijn segment verwijst; het bestand
+# CURRENT bevat het nummer van de actuele generatie en wordt als laatste atomair vervangen.
+# Een ververst document krijgt dus alleen een nieuw segment; ongewijzigde segmenten worden hergebruikt.
+class IndexSegments:
+    def __init__(self, directory=SEGMENTS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.previous_number, self.previous = read_generation(directory)
+        self.documents = {}  # url -> generatie-entry
+        self.written = 0
+
+    # Neemt het segment van een ongewijzigd document over uit de vorige generatie; False als dat niet kan
+    def reuse(self, url, content_hash):
+        entry = self.previous.get(url)
+        if entry is None or entry['sha256'] != content_hash or not os.path.exists(entry['file']) \
+                or not os.path.exists(entry['index']):
+            return False
+        self.documents[url] = entry
+        return True
+
+    # Schrijft het segment van één document (als het voor deze contentversie nog niet bestaat)
+    def write(self, url, record, index_entry, content_hash=None):
+        if content_hash is None:
+            content_hash = hashlib.sha256(record['content'].encode('utf-8')).hexdigest()
+        base_name = os.path.join(self.directory, f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}-{content_hash[:16]}")
+        record_file, index_file = base_name + CACHE_FILE_EXTENSION, base_name + '.index.json'
+        if not (os.path.exists(record_file) and os.path.exists(index_file)):
+            writer = CacheFileWriter(record_file)
+            writer.write(url, record)
+            writer.close()
+            save_json_file(index_entry, index_file + '.tmp')
+            os.replace(index_file + '.tmp', index_file)
+            self.written += 1
+        entry = manifest_entry(url, record, record_file, 0, os.path.getsize(record_file))
+        entry.update(index=index_file, sha256=content_hash)
+        self.documents[url] = entry
 
-# Hoofdfunctie om URLs te verwerken en de inhoud in een cache op te slaan
-async def create_legislation_cache(urls, max_concurrent_requests=4):
-    # Initialiseer de caches
-    cache_omgevingsplannen_1 = {}
-    cache_omgevingsplannen_2 = {}
-    cache_other = {}
-    
-    omgevingsplan_counter = 0
+    # Legt de nieuwe generatie vast (alleen als er iets veranderd is) en ruimt oude generaties op.
+    # Retourneert het nummer van de actuele generatie.
+    def commit(self, url_order):
+        documents = [self.documents[url] for url in url_order if url in self.documents]
+        if self.previous_number is not None and documents == list(self.previous.values()):
+            # CURRENT toch vervangen: de app negeert een generatie die ouder is dan het zojuist geschreven manifest
+            self.write_current(self.previous_number)
+            return self.previous_number
+        number = (self.previous_number or 0) + 1
+        generation_file = os.path.join(self.directory, f"generation-{number:06d}.json")
+        save_json_file({'generation': number, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'documents': documents},
+                       generation_file + '.tmp')
+        os.replace(generation_file + '.tmp', generation_file)
+        self.write_current(number)
+        remove_old_segments(self.directory)
+        return number
+
+    # Vervangt CURRENT in één stap
+    def write_current(self, number):
+        current_file = os.path.join(self.directory, 'CURRENT')
+        with open(current_file + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(str(number))
+        os.replace(current_file + '.tmp', current_file)
+
+# Functie om de actuele generatie te lezen: (nummer, {url: entry}), of (None, {}) als er nog geen is
+def read_generation(directory=SEGMENTS_DIR):
+    try:
+        with open(os.path.join(directory, 'CURRENT'), 'r', encoding='utf-8') as file:
+            number = int(file.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None, {}
+    generation = load_json_file(os.path.join(directory, f"generation-{number:06d}.json"), {'documents': []})
+    return number, {entry['url']: entry for entry in generation['documents']}
+
+# Functie om de segmenten buiten gebruik te stellen na een run zonder --segments: zonder CURRENT valt de app
+# terug op manifest.json en heading_index.json (de generaties zelf blijven staan tot een volgende --segments-run)
+def invalidate_segments(directory=SEGMENTS_DIR):
+    current_file = os.path.join(directory, 'CURRENT')
+    if os.path.exists(current_file):
+        os.remove(current_file)
+        print(f"Indexsegmenten in {directory} buiten gebruik gesteld (run zonder --segments)")
+
+# Functie om generaties ouder dan KEEP_GENERATIONS te verwijderen, met de segmenten die alleen daarin voorkwamen
+def remove_old_segments(directory=SEGMENTS_DIR):
+    generation_files = sorted(glob.glob(os.path.join(directory, 'generation-*.json')))
+    kept = set()
+    for generation_file in generation_files[-KEEP_GENERATIONS:]:
+        for entry in load_json_file(generation_file, {'documents': []})['documents']:
+            kept.update((entry['file'], entry['index']))
+    for generation_file in generation_files[:-KEEP_GENERATIONS]:
+        os.remove(generation_file)
+    for segment_file in glob.glob(os.path.join(directory, '*' + CACHE_FILE_EXTENSION)) + \
+            glob.glob(os.path.join(directory, '*.index.json')):
+        if segment_file not in kept:
+            os.remove(segment_file)
+
+# Bouw de koppen-index en het manifest opnieuw op basis van bestaande cachebestanden (zonder opnieuw
+# te downloaden). Oude JSON-bestanden worden daarbij omgezet naar het JSON Lines/gzip-formaat.
+def rebuild_indexes_from_files(cache_files, index_file='heading_index.json', manifest_file='manifest.json',
+                               sections_file=SECTIONS_DB, segments_dir=None):
+    heading_index = {}
+    entries = []
+    section_store = open_section_store(sections_file)
+    segments = IndexSegments(segments_dir) if segments_dir else None
+    for file_path in cache_files:
+        if not os.path.exists(file_path):
+            print(f"Bestand '{file_path}' niet gevonden, wordt overgeslagen.")
+            continue
+        filename = re.sub(r'\.json$', '', file_path)
+        if not filename.endswith(CACHE_FILE_EXTENSION):
+            filename += CACHE_FILE_EXTENSION
+        writer = CacheFileWriter(filename)
+        for url, record in iter_cache_file(file_path):
+            offset, size = writer.write(url, record)
+            entries.append(manifest_entry(url, record, filename, offset, size))
+            heading_index[url] = heading_index_entry(record)
+            if section_store is not None:
+                section_store.write(url, record)
+            if segments is not None:
+                segments.write(url, record, heading_index[url])
+        writer.close()
+        print(f"Opgeslagen in {filename}")
+    save_json_file(heading_index, index_file)
+    print(f"Koppen-index opgeslagen in {index_file}")
+    save_manifest(entries, manifest_file)
+    print(f"Manifest opgeslagen in {manifest_file}")
+    if section_store is not None:
+        section_store.close()
+        print(f"Full-text-index opgeslagen in {sections_file}")
+    if segments is not None:
+        print_segments_summary(segments, segments.commit([entry['url'] for entry in entries]))
+    else:
+        invalidate_segments()
+
+# Functie om te melden welke generatie indexsegmenten actueel is en hoeveel segmenten er nieuw zijn
+def print_segments_summary(segments, number):
+    print(f"Indexsegmenten: generatie {number} in {segments.directory} ({segments.written} nieuwe segmenten)")
+
+# Hoofdfunctie om URLs te verwerken en de inhoud in een cache op te slaan.
+# Elk document wordt direct na binnenkomst gecomprimeerd weggeschreven en daarna losgelaten, zodat het
+# geheugengebruik niet meegroeit met het aantal documenten (alleen de koppen-index blijft in het geheugen).
+# In incrementele modus worden ongewijzigde documenten (304, of dezelfde content-hash) overgeslagen
+# en worden alleen de cachebestanden herschreven waarin iets veranderd is.
+# Resultaten worden verwerkt in de volgorde waarin ze binnenkomen; mislukte URLs komen in het crawlrapport
+# (en behouden bij een incrementele run hun vorige versie) in plaats van de hele run af te breken.
+async def create_legislation_cache(urls, max_concurrent_requests=MAX_CONCURRENT_REQUESTS, incremental=False,
+                                   state_file='crawl_state.json', manifest_file='manifest.json',
+                                   index_file='heading_index.json', max_per_host=MAX_REQUESTS_PER_HOST,
+                                   max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT_SECONDS,
+                                   report_file='crawl_report.json', shards=OMGEVINGSPLAN_SHARDS,
+                                   sections_file=SECTIONS_DB, segments_dir=None):
+    if incremental:
+        # Alleen manifesten in het huidige bestandsformaat kunnen incrementeel bijgewerkt worden
+        previous_manifest = {
+            entry['url']: entry for entry in load_json_file(manifest_file, {'documents': []})['documents']
+            if entry['file'].endswith(CACHE_FILE_EXTENSION)
+        }
+        previous_index = load_json_file(index_file, {})
+        crawl_state = load_json_file(state_file, {})
+    else:
+        previous_manifest, previous_index, crawl_state = {}, {}, {}
+
+    omgevingsplan_files = [f"omgevingsplannen_{i}{CACHE_FILE_EXTENSION}" for i in range(1, shards + 1)]
+    # Gecomprimeerde bytes per omgevingsplan-shard; nieuwe documenten gaan naar de kleinste shard.
+    # Documenten die in hun vorige shard blijven tellen vanaf het begin mee.
+    current_urls = {url for name, url, category in urls}
+    shard_bytes = dict.fromkeys(omgevingsplan_files, 0)
+    for url, entry in previous_manifest.items():
+        if url in current_urls and entry['file'] in shard_bytes:
+            shard_bytes[entry['file']] += entry['size']
+    writers = {}  # alleen voor cachebestanden die (opnieuw) geschreven worden
+    file_urls = defaultdict(set)  # bestandsnaam -> URLs die in deze run in dat bestand horen
+    entries = {}
+    heading_index = {}
+    changed_urls = set()
+    section_store = open_section_store(sections_file, incremental)
+    segments = IndexSegments(segments_dir) if segments_dir else None
+
+    def writer_for(filename):
+        if filename not in writers:
+            writers[filename] = CacheFileWriter(filename)
+        return writers[filename]
 
     semaphore = asyncio.Semaphore(max_concurrent_requests)
-    async with aiohttp.ClientSession() as session:
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(max_per_host))
+    results = []
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
         tasks = []
 
         for name, url, category in urls:
+            # Alleen conditioneel ophalen als we een vorige versie van het document hebben
+            state = crawl_state.get(url) if url in previous_manifest else None
             # Asynchrone taak maken voor elke URL
-            task = asyncio.create_task(fetch_content(session, url, semaphore))
-            tasks.append((task, name, url, category))
-
-        # Wacht tot alle taken zijn voltooid en verwerk de resultaten
-        for task, name, url, category in tasks:
-            content = await task
-            # Verdeel de omgevingsplannen over twee cache-bestanden
-            if "omgevingsplan" in category.lower():
-                if omgevingsplan_counter % 2 == 0:
-                    cache_omgevingsplannen_1[url] = {
-                        'name': name,
-                        'category': category,
-                        'content': content
-                    }
-                else:
-                    cache_omgevingsplannen_2[url] = {
+            tasks.append(asyncio.create_task(fetch_with_retries(
+                session, name, url, category, semaphore, host_semaphores[urlparse(url).netloc], state, max_retries
+            )))
+
+        # Verwerk de resultaten zodra ze binnenkomen, zodat één trage URL de rest niet ophoudt
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            results.append(result)
+            name, url, category = result['name'], result['url'], result['category']
+            content, headers = result['content'], result['headers']
+            result['content'] = None  # de content hoeft na het wegschrijven niet bewaard te blijven
+            if result['error'] is not None and url not in previous_manifest:
+                # Mislukt en geen vorige versie: document overslaan (staat in het crawlrapport)
+                continue
+            state = crawl_state.get(url, {})
+            record = None
+            content_hash = state.get('sha256')
+            if content is not None:
+                content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+                if url not in previous_manifest or content_hash != state.get('sha256'):
+                    record = {
                         'name': name,
                         'category': category,
                         'content': content
                     }
-                omgevingsplan_counter += 1
+                    changed_urls.add(url)
+            crawl_state[url] = {
+                'etag': headers.get('ETag', state.get('etag')),
+                'last_modified': headers.get('Last-Modified', state.get('last_modified')),
+                'sha256': content_hash
+            }
+
+            is_omgevingsplan = "omgevingsplan" in category.lower()
+            if url in previous_manifest and (not is_omgevingsplan or previous_manifest[url]['file'] in shard_bytes):
+                # Een bekend document blijft in hetzelfde bestand staan
+                filename = previous_manifest[url]['file']
+                if record is not None and is_omgevingsplan:
+                    shard_bytes[filename] -= previous_manifest[url]['size']
+            elif is_omgevingsplan:
+                # Verdeel de omgevingsplannen over de shards, steeds naar de shard met de minste bytes
+                filename = min(omgevingsplan_files, key=shard_bytes.get)
+                if record is None:
+                    shard_bytes[filename] += previous_manifest[url]['size']
+            else:
+                # Overige wetgeving in aparte bestanden, bestandsnaam op basis van naam
+                filename = re.sub(r'\W+', '_', name.lower()) + CACHE_FILE_EXTENSION
+            file_urls[filename].add(url)
+
+            if record is not None:
+                # Nieuw of gewijzigd: meteen wegschrijven en parsen voor de koppen-index
+                offset, size = writer_for(filename).write(url, record)
+                entries[url] = manifest_entry(url, record, filename, offset, size)
+                if filename in shard_bytes:
+                    shard_bytes[filename] += size
+                heading_index[url] = heading_index_entry(record)
+                if section_store is not None:
+                    section_store.write(url, record)
+                if segments is not None:
+                    segments.write(url, record, heading_index[url], content_hash)
             else:
-                # Overige wetgeving in aparte bestanden
-                cache_other[url] = {
-                    'name': name,
-                    'category': category,
-                    'content': content
-                }
-
-    # Sla de caches op in aparte JSON-bestanden
-    save_cache_to_file(cache_omgevingsplannen_1, 'omgevingsplannen_1.json')
-    save_cache_to_file(cache_omgevingsplannen_2, 'omgevingsplannen_2.json')
-    print("Omgevingsplannen verdeeld en opgeslagen in omgevingsplannen_1.json en omgevingsplannen_2.json")
-
-    # Sla overige wetgeving op in aparte JSON-bestanden
-    for url, data in cache_other.items():
-        filename = re.sub(r'\W+', '_', data['name'].lower()) + '.json'  # Bestandnaam op basis van naam
-        save_cache_to_file({url: data}, filename)
-        print(f"Overige wetgeving opgeslagen in {filename}")
+                # Ongewijzigde documenten hoeven niet opnieuw geparsed te worden, tenzij ze nog in een index ontbreken
+                previous_record = None
+                if url in previous_index:
+                    heading_index[url] = previous_index[url]
+                else:
+                    previous_record = read_cached_record(previous_manifest[url])
+                    heading_index[url] = heading_index_entry(previous_record)
+                if section_store is not None and url not in section_store.urls:
+                    previous_record = previous_record or read_cached_record(previous_manifest[url])
+                    section_store.write(url, previous_record)
+                if segments is not None and not segments.reuse(url, content_hash):
+                    segments.write(url, previous_record or read_cached_record(previous_manifest[url]),
+                                   heading_index[url], content_hash)
+
+    save_crawl_report(results, time.perf_counter() - start, report_file)
+
+    # Rond de cachebestanden af; bestanden zonder wijzigingen (en met dezelfde documenten) blijven staan
+    for filename in sorted(set(file_urls) | set(omgevingsplan_files)):
+        previous_urls = {url for url, entry in previous_manifest.items() if entry['file'] == filename}
+        if filename not in writers and file_urls[filename] == previous_urls and os.path.exists(filename):
+            entries.update((url, previous_manifest[url]) for url in file_urls[filename])
+            if file_urls[filename]:
+                print(f"Ongewijzigd, niet herschreven: {filename}")
+            continue
+        writer = writer_for(filename)
+        # Ongewijzigde documenten worden als gecomprimeerd member uit het vorige bestand overgenomen
+        for url in sorted(file_urls[filename] - writer.urls):
+            offset, size = writer.write_member(url, read_cached_member(previous_manifest[url]))
+            entries[url] = dict(previous_manifest[url], file=filename, offset=offset, size=size)
+        writer.close()
+        print(f"Opgeslagen in {filename}")
+
+    # Manifest met alleen metadata, zodat de app de gemeentelijst kan tonen zonder content te laden
+    url_order = [url for name, url, category in urls]
+    save_manifest([entries[url] for url in url_order if url in entries], manifest_file)
+    print(f"Manifest opgeslagen in {manifest_file}")
+
+    # Koppen-index zodat de app niet per zoekopdracht de HTML hoeft te scannen
+    save_json_file({url: heading_index[url] for url in url_order if url in heading_index}, index_file)
+    print(f"Koppen-index opgeslagen in {index_file}")
+
+    # Full-text-index met alleen de documenten van deze crawl
+    if section_store is not None:
+        section_store.retain(entries)
+        section_store.close()
+        print(f"Full-text-index opgeslagen in {sections_file}")
+
+    # Nieuwe generatie indexsegmenten: een draaiende app wisselt daar zelf naar over
+    if segments is not None:
+        print_segments_summary(segments, segments.commit([url for url in url_order if url in entries]))
+    else:
+        invalidate_segments()
+
+    # Crawl-status (ETag, Last-Modified, content-hash) voor de volgende incrementele run
+    save_json_file(crawl_state, state_file)
+    print(f"{len(changed_urls)} van de {len(urls)} documenten nieuw of gewijzigd")
+
+# Functie om de snapshot van de Excel-werkbladen bij te werken als het Excel-bestand gewijzigd is
+def update_excel_snapshot():
+    if excel_snapshot.ensure_snapshot():
+        print(f"Excel-snapshot opgeslagen in {excel_snapshot.SNAPSHOT_PATH}")
 
 # Uitvoeren van de cache-creatie met URLs uit urls.txt
 def main():
+    parser = argparse.ArgumentParser(description="Download wetgeving en bouw de caches voor de MBA Zoekmachine.")
+    parser.add_argument('--index-only', action='store_true',
+                        help="Bouw alleen de koppen-index, het manifest, de full-text-index en de Excel-snapshot opnieuw uit de bestaande bestanden "
+                             "(oude JSON-bestanden worden daarbij omgezet naar JSON Lines met gzip).")
+    parser.add_argument('--max-concurrent', type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="Maximaal aantal gelijktijdige verzoeken in totaal.")
+    parser.add_argument('--max-per-host', type=int, default=MAX_REQUESTS_PER_HOST,
+                        help="Maximaal aantal gelijktijdige verzoeken per host.")
+    parser.add_argument('--retries', type=int, default=MAX_RETRIES,
+                        help="Aantal herhaalpogingen bij netwerkfouten, time-outs, 429 en 5xx.")
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT_SECONDS,
+                        help="Time-out per verzoek in seconden.")
+    parser.add_argument('--shards', type=int, default=OMGEVINGSPLAN_SHARDS,
+                        help="Aantal cachebestanden waarover de omgevingsplannen (op grootte gebalanceerd) verdeeld worden.")
+    parser.add_argument('--segments', action='store_true',
+                        help=f"Schrijf ook geversioneerde indexsegmenten per document naar '{SEGMENTS_DIR}/', die een "
+                             "draaiende app zonder herstart overneemt (alleen gewijzigde documenten krijgen een nieuw segment).")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Download alleen gewijzigde documenten (ETag/Last-Modified/content-hash uit crawl_state.json) "
+                             "en herschrijf alleen de cachebestanden waarin iets veranderd is.")
+    args = parser.parse_args()
+
+    if args.index_only:
+        # Per cachebestand het huidige formaat gebruiken, of anders het oude JSON-bestand
+        cache_files = []
+        shard_names = {re.sub(r'\.json(l\.gz)?$', '', path) for path in glob.glob('omgevingsplannen_*.json*')}
+        for base_name in sorted(shard_names) + ['bal', 'bbl', 'bkl']:
+            if os.path.exists(base_name + CACHE_FILE_EXTENSION):
+                cache_files.append(base_name + CACHE_FILE_EXTENSION)
+            else:
+                cache_files.append(base_name + '.json')
+        rebuild_indexes_from_files(cache_files, segments_dir=SEGMENTS_DIR if args.segments else None)
+        update_excel_snapshot()
+        return
+
     urls = read_urls('urls.txt')  # Lees de URLs uit het bestand
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(create_legislation_cache(urls))
+    loop.run_until_complete(create_legislation_cache(
+        urls,
+        max_concurrent_requests=args.max_concurrent,
+        incremental=args.incremental,
+        max_per_host=args.max_per_host,
+        max_retries=args.retries,
+        timeout=args.timeout,
+        shards=args.shards,
+        segments_dir=SEGMENTS_DIR if args.segments else None
+    ))
+    update_excel_snapshot()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,384 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping, Sequence
+
+# Alleen-lezen binair bestand met het doorzoekbare corpus (documenten plus koppen-index). Elk proces
+# memory-mapt hetzelfde bestand, zodat de page cache van het OS één kopie per host bewaart in plaats van
+# één geparste kopie (Python-strings en -dicts) per replica.
+#
+# Indeling (little-endian, arrays op 4 bytes uitgelijnd):
+#   header      MAGIC, versie, aantal documenten, offset en lengte van de metadata (JSON), offset documenttabel
+#   metadata    o.a. de signatuur van de bronbestanden, om een verouderd bestand te herkennen
+#   per document: ruwe UTF-8 content en een aantal string- en uint32-arrays (zie RECORD)
+#   documenttabel één RECORD per document
+# Een string-array is: uint32 aantal, uint32 offsets[aantal + 1] en daarna de UTF-8 teksten, elk gevolgd
+# door '\n'. Zo kan in alle titels van een document tegelijk gezocht worden zonder over een grens te matchen.
+MAPPED_CORPUS_PATH = 'corpus.mmap'
+MAGIC = b'MBACORP1'
+FORMAT_VERSION = 2  # 2: nummers met punten zijn één woord in de woordenlijst
+HEADER = struct.Struct('<8sIIQQQ')
+# Per document de offsets van: velden (url, naam, categorie), content (offset, lengte), titels, titels in
+# kleine letters, ankers per titel, woordenlijst, begin van de postings per woord, postings, ankersleutels
+# ('soort nummer', gesorteerd) en ankers. 0 betekent: niet aanwezig (document zonder koppen-index).
+RECORD = struct.Struct('<11Q')
+# Bronbestanden waarvan de signatuur in de metadata staat
+SOURCE_FILES = ['heading_index.json', 'manifest.json']
+
+
+############################################################
+# 1. Lezen
+############################################################
+
+class StringArray(Sequence):
+    """
+    Alleen-lezen weergave van een string-array in de mapping; een tekst wordt pas bij opvragen gedecodeerd.
+    """
+
+    def __init__(self, buffer, offset):
+        count, = struct.unpack_from('<I', buffer, offset)
+        self.buffer = buffer
+        self.offsets = memoryview(buffer)[offset + 4:offset + 8 + 4 * count].cast('I')
+        self.start = offset + 8 + 4 * count
+        self.end = self.start + self.offsets[count]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(memoryview(self.buffer)[self.start + self.offsets[i]:self.start + self.offsets[i + 1] - 1], 'utf-8')
+
+    def find(self, text):
+        """
+        Posities van de teksten die `text` bevatten. Zoekt met mmap.find in de gemapte bytes zelf
+        (UTF-8 is zelfsynchroniserend, dus een match op bytes is een match op tekens).
+        """
+        if '\n' in text:
+            return []
+        needle = text.encode('utf-8')
+        positions = []
+        position = self.start
+        while True:
+            position = self.buffer.find(needle, position, self.end)
+            if position < 0:
+                return positions
+            i = bisect_right(self.offsets, position - self.start) - 1
+            positions.append(i)
+            position = self.start + self.offsets[i + 1]  # verder bij de volgende tekst
+
+
+def uint32_array(buffer, offset):
+    count, = struct.unpack_from('<I', buffer, offset)
+    return memoryview(buffer)[offset + 4:offset + 4 + 4 * count].cast('I')
+
+
+class Titles(Sequence):
+    """
+    Koppen van één document als (titel, titel in kleine letters, anker), zoals entry['titles'] in app.py.
+    """
+
+    def __init__(self, titles, titles_lower, anchors):
+        self.titles = titles
+        self.titles_lower = titles_lower
+        self.anchors = anchors
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __getitem__(self, i):
+        return self.titles[i], self.titles_lower[i], self.anchors[i] or None
+
+
+class Postings(Mapping):
+    """
+    Woord -> gesorteerde posities in de titels (uint32-weergave op de mapping), zoals entry['postings'].
+    """
+
+    def __init__(self, vocabulary, starts, postings):
+        self.vocabulary = vocabulary
+        self.starts = starts
+        self.postings = postings
+
+    def __getitem__(self, token):
+        i = bisect_left(self.vocabulary, token)
+        if i == len(self.vocabulary) or self.vocabulary[i] != token:
+            raise KeyError(token)
+        return self.postings[self.starts[i]:self.starts[i + 1]]
+
+    def __iter__(self):
+        return iter(self.vocabulary)
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+
+class Anchors(Mapping):
+    """
+    (soort, nummer) -> anker, zoals entry['anchors']; opgezocht met bisect in de gesorteerde sleutels.
+    """
+
+    def __init__(self, keys, values):
+        self.keys_ = keys
+        self.values_ = values
+
+    def __getitem__(self, key):
+        kind, number = key
+        text = f"{kind} {number}"
+        i = bisect_left(self.keys_, text)
+        if i == len(self.keys_) or self.keys_[i] != text:
+            raise KeyError(key)
+        return self.values_[i]
+
+    def __iter__(self):
+        return (tuple(key.split(' ', 1)) for key in self.keys_)
+
+    def __len__(self):
+        return len(self.keys_)
+
+
+class MappedIndexEntry(Mapping):
+    """
+    Koppen-index van één document met dezelfde sleutels als in app.py ('titles', 'postings', 'vocabulary',
+    'anchors'), als weergaven op de mapping.
+    """
+
+    def __init__(self, buffer, record):
+        _, _, _, titles, titles_lower, anchors, vocabulary, starts, postings, anchor_keys, anchor_values = record
+        self.lower = StringArray(buffer, titles_lower)
+        vocabulary = StringArray(buffer, vocabulary)
+        self._items = {
+            'titles': Titles(StringArray(buffer, titles), self.lower, StringArray(buffer, anchors)),
+            'vocabulary': vocabulary,
+            'postings': Postings(vocabulary, uint32_array(buffer, starts), uint32_array(buffer, postings)),
+            'anchors': Anchors(StringArray(buffer, anchor_keys), StringArray(buffer, anchor_values))
+        }
+
+    def find_titles(self, lower_term):
+        """
+        Posities van de titels die lower_term bevatten, direct in de gemapte titeltekst gezocht.
+        """
+        return self.lower.find(lower_term)
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class MappedHeadingIndex(Mapping):
+    """
+    url -> MappedIndexEntry voor de documenten met een koppen-index.
+    """
+
+    def __init__(self, corpus, urls):
+        self.corpus = corpus
+        self.urls = urls
+        self._entries = {}
+
+    def __getitem__(self, url):
+        entry = self._entries.get(url)
+        if entry is None:
+            if url not in self.urls:
+                raise KeyError(url)
+            entry = self._entries[url] = MappedIndexEntry(self.corpus.buffer, self.corpus.records[self.urls[url]])
+        return entry
+
+    def __contains__(self, url):
+        return url in self.urls
+
+    def __iter__(self):
+        return iter(self.urls)
+
+    def __len__(self):
+        return len(self.urls)
+
+
+class MappedCorpus:
+    """
+    Opent een bestand van build_mapped_corpus alleen-lezen met mmap. Alleen de documenttabel en de velden
+    (url, naam, categorie) worden als Python-objecten ingelezen; content en koppen blijven in de mapping.
+    Raises ValueError bij een onbekend of beschadigd bestand.
+    """
+
+    def __init__(self, path=MAPPED_CORPUS_PATH):
+        if sys.byteorder != 'little':
+            raise ValueError("Het gemapte corpus wordt alleen op little-endian systemen ondersteund.")
+        with open(path, 'rb') as corpus_file:
+            self.buffer = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < HEADER.size:
+            raise ValueError(f"'{path}' is geen gemapt corpus.")
+        magic, version, count, meta_offset, meta_length, table_offset = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"'{path}' is geen gemapt corpus van versie {FORMAT_VERSION}.")
+        if table_offset + count * RECORD.size > len(self.buffer):
+            raise ValueError(f"'{path}' is onvolledig.")
+        self.path = path
+        self.meta = json.loads(self.buffer[meta_offset:meta_offset + meta_length])
+        self.records = [RECORD.unpack_from(self.buffer, table_offset + i * RECORD.size) for i in range(count)]
+        self.documents = {}  # url -> (positie, naam, categorie)
+        indexed = {}
+        for i, record in enumerate(self.records):
+            url, name, category = StringArray(self.buffer, record[0])
+            self.documents[url] = (i, name, category)
+            if record[3]:
+                indexed[url] = i
+        self.heading_index = MappedHeadingIndex(self, indexed) if indexed else None
+
+    @property
+    def sources(self):
+        """
+        Signatuur (pad, mtime_ns, grootte) van de bronbestanden bij het bouwen.
+        """
+        return [tuple(source) for source in self.meta['sources']]
+
+    def __contains__(self, url):
+        return url in self.documents
+
+    def __len__(self):
+        return len(self.documents)
+
+    def record(self, url):
+        """
+        De record (naam, categorie, content) van een document; de content wordt hierbij gedecodeerd.
+        """
+        i, name, category = self.documents[url]
+        content_offset, content_length = self.records[i][1:3]
+        content = str(memoryview(self.buffer)[content_offset:content_offset + content_length], 'utf-8')
+        return {'name': name, 'category': category, 'content': content}
+
+
+############################################################
+# 2. Schrijven
+############################################################
+
+class CorpusWriter:
+    """
+    Schrijft de onderdelen van het bestand achter elkaar weg en onthoudt per document een RECORD.
+    """
+
+    def __init__(self, output_file):
+        self.file = output_file
+        self.file.write(b'\0' * HEADER.size)
+        self.records = []
+
+    def align(self):
+        padding = -self.file.tell() % 4
+        self.file.write(b'\0' * padding)
+
+    def string_array(self, items):
+        self.align()
+        offset = self.file.tell()
+        encoded = [item.encode('utf-8') + b'\n' for item in items]
+        positions = [0]
+        for data in encoded:
+            positions.append(positions[-1] + len(data))
+        self.file.write(struct.pack(f'<I{len(positions)}I', len(encoded), *positions))
+        self.file.write(b''.join(encoded))
+        return offset
+
+    def uint32_array(self, values):
+        self.align()
+        offset = self.file.tell()
+        self.file.write(struct.pack(f'<I{len(values)}I', len(values), *values))
+        return offset
+
+    def document(self, url, record, index_entry=None):
+        """
+        index_entry: de koppen-index van het document zoals _load_heading_index_cached in app.py die
+        opbouwt (met 'titles', 'vocabulary', 'postings' en 'anchors'), of None.
+        """
+        fields = self.string_array([url, record['name'], record['category']])
+        content = record.get('content', '').encode('utf-8')
+        content_offset = self.file.tell()
+        self.file.write(content)
+        index_offsets = [0] * 8
+        if index_entry is not None:
+            titles = index_entry['titles']
+            vocabulary = index_entry['vocabulary']
+            starts = [0]
+            postings = []
+            for token in vocabulary:
+                postings.extend(index_entry['postings'][token])
+                starts.append(len(postings))
+            # Sleutels zonder nummer kunnen nooit opgezocht worden; de rest gesorteerd voor bisect
+            anchors = sorted((f"{kind} {number}", anchor) for (kind, number), anchor in index_entry['anchors'].items()
+                             if number)
+            index_offsets = [
+                self.string_array([title for title, _, _ in titles]),
+                self.string_array([title_lower for _, title_lower, _ in titles]),
+                self.string_array([anchor or '' for _, _, anchor in titles]),
+                self.string_array(vocabulary),
+                self.uint32_array(starts),
+                self.uint32_array(postings),
+                self.string_array([key for key, _ in anchors]),
+                self.string_array([anchor for _, anchor in anchors])
+            ]
+        self.records.append((fields, content_offset, len(content), *index_offsets))
+
+    def close(self, meta):
+        meta_data = json.dumps(meta).encode('utf-8')
+        meta_offset = self.file.tell()
+        self.file.write(meta_data)
+        self.align()
+        table_offset = self.file.tell()
+        for record in self.records:
+            self.file.write(RECORD.pack(*record))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(self.records), meta_offset, len(meta_data), table_offset))
+
+
+def build_mapped_corpus(output_path=MAPPED_CORPUS_PATH):
+    """
+    Bouwt het gemapte corpus uit de bestanden van jsonmaker.py (manifest, cachebestanden en koppen-index),
+    met dezelfde afgeleide koppen-index als app.py. Wordt via een tijdelijk bestand geschreven en atomair
+    op zijn plaats gezet; processen die het oude bestand nog gemapt hebben, lezen gewoon verder.
+    Retourneert het aantal documenten.
+    """
+    import app  # hier pas importeren: app.py importeert deze module zelf ook
+
+    sources = [list(source) for source in app.files_signature(SOURCE_FILES)]
+    heading_index = app._load_heading_index_cached(app.files_signature(['heading_index.json'])) or {}
+    manifest = app.load_manifest()
+    if manifest is not None:
+        documents = ((entry['url'], app.read_document(entry['file'], entry['offset'], entry['size'])[0])
+                     for entry in manifest)
+    else:
+        documents = app.load_multiple_files().items()
+
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as output_file:
+        writer = CorpusWriter(output_file)
+        for url, record in documents:
+            writer.document(url, record, heading_index.get(url))
+        writer.close({'sources': sources, 'created': time.strftime('%Y-%m-%dT%H:%M:%S')})
+        count = len(writer.records)
+    os.replace(temp_path, output_path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bouw het gemapte corpus (documenten en koppen-index) voor de app.")
+    parser.add_argument('--output', default=MAPPED_CORPUS_PATH, help=f"Uitvoerbestand (standaard {MAPPED_CORPUS_PATH}).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = build_mapped_corpus(args.output)
+    print(f"Gemapt corpus met {count} documenten ({os.path.getsize(args.output) / 1e6:.1f} MB) opgeslagen in "
+          f"{args.output} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger("mba_zoekmachine.metrics")
+
+# Prometheus-tekstbestand dat na elke zoekopdracht ververst wordt (bijv. voor de textfile-collector)
+METRICS_FILE = os.environ.get("MBA_METRICS_FILE")
+# Zoekopdrachten die langer duren dan dit aantal seconden krijgen een cProfile-dump (uit als niet gezet)
+PROFILE_SLOW_SECONDS = float(os.environ["MBA_PROFILE_SLOW_SECONDS"]) if os.environ.get("MBA_PROFILE_SLOW_SECONDS") else None
+PROFILE_DIR = os.environ.get("MBA_PROFILE_DIR", "profiles")
+# Grenzen (seconden) van de histogram-buckets voor de totale zoektijd
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class QueryTrace:
+    """
+    Tijden per fase en tellers van één zoekopdracht. Fasen kunnen vaker voorkomen; de tijden tellen op.
+    """
+
+    def __init__(self, search_term, source, **labels):
+        self.search_term = search_term
+        self.source = source
+        self.labels = labels
+        self.stages = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.start = time.perf_counter()
+        self.total = None
+        self.profile_path = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        self.counts[name] += amount
+
+    def as_dict(self):
+        return {
+            'event': 'query',
+            'source': self.source,
+            'term': self.search_term,
+            **self.labels,
+            'total_s': round(self.total, 6) if self.total is not None else None,
+            'stages_s': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'counts': dict(self.counts),
+            'profile': self.profile_path
+        }
+
+
+class MetricsRegistry:
+    """
+    Tellers over alle zoekopdrachten van dit proces, als Prometheus-tekst op te vragen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = defaultdict(int)  # bron -> aantal
+        self.duration_buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.stage_sum = defaultdict(float)
+        self.stage_count = defaultdict(int)
+        self.items = defaultdict(int)
+        self.slow_queries_profiled = 0
+
+    def record(self, trace):
+        with self._lock:
+            self.queries[trace.source] += 1
+            self.duration_sum += trace.total
+            self.duration_count += 1
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if trace.total <= bound:
+                    self.duration_buckets[i] += 1
+            for name, seconds in trace.stages.items():
+                self.stage_sum[name] += seconds
+                self.stage_count[name] += 1
+            for name, amount in trace.counts.items():
+                self.items[name] += amount
+            if trace.profile_path:
+                self.slow_queries_profiled += 1
+
+    def render_prometheus(self, extra_gauges=None):
+        """
+        Prometheus text exposition format. extra_gauges: {metriek: (help, {labels-tuple: waarde})}.
+        """
+        with self._lock:
+            lines = [
+                "# HELP mba_queries_total Aantal zoekopdrachten per bron.",
+                "# TYPE mba_queries_total counter"
+            ]
+            lines += [f'mba_queries_total{{source="{source}"}} {count}' for source, count in sorted(self.queries.items())]
+            lines += [
+                "# HELP mba_query_duration_seconds Totale duur van een zoekopdracht.",
+                "# TYPE mba_query_duration_seconds histogram"
+            ]
+            lines += [f'mba_query_duration_seconds_bucket{{le="{bound}"}} {count}'
+                      for bound, count in zip(DURATION_BUCKETS, self.duration_buckets)]
+            lines += [
+                f'mba_query_duration_seconds_bucket{{le="+Inf"}} {self.duration_count}',
+                f"mba_query_duration_seconds_sum {self.duration_sum:.6f}",
+                f"mba_query_duration_seconds_count {self.duration_count}",
+                "# HELP mba_stage_duration_seconds Duur per fase van de zoekpijplijn.",
+                "# TYPE mba_stage_duration_seconds summary"
+            ]
+            for name in sorted(self.stage_sum):
+                lines.append(f'mba_stage_duration_seconds_sum{{stage="{name}"}} {self.stage_sum[name]:.6f}')
+                lines.append(f'mba_stage_duration_seconds_count{{stage="{name}"}} {self.stage_count[name]}')
+            lines += [
+                "# HELP mba_query_items_total Aantallen per soort (doorzochte documenten, ruwe treffers, resultaten).",
+                "# TYPE mba_query_items_total counter"
+            ]
+            lines += [f'mba_query_items_total{{kind="{name}"}} {amount}' for name, amount in sorted(self.items.items())]
+            lines += [
+                "# HELP mba_slow_queries_profiled_total Trage zoekopdrachten waarvan een profiel is opgeslagen.",
+                "# TYPE mba_slow_queries_profiled_total counter",
+                f"mba_slow_queries_profiled_total {self.slow_queries_profiled}"
+            ]
+        for metric, (help_text, values) in (extra_gauges or {}).items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            for labels, value in values.items():
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+_current = threading.local()
+# cProfile kan maar één profiel tegelijk per proces meten; gelijktijdige zoekopdrachten lopen dan zonder profiel
+_profile_lock = threading.Lock()
+# Extra gauges (bijv. de resultaatcache) die bij het renderen worden opgevraagd; zie register_gauges
+_gauge_providers = {}
+# Opstarttijden per fase (import, warm-up); zie record_startup
+_startup = {}
+_startup_lock = threading.Lock()
+
+
+def current_trace():
+    return getattr(_current, 'trace', None)
+
+
+def stage(name):
+    """
+    Meet een fase van de huidige zoekopdracht; zonder actieve zoekopdracht doet dit niets.
+    """
+    trace = current_trace()
+    return trace.stage(name) if trace is not None else contextlib.nullcontext()
+
+
+def count(name, amount=1):
+    trace = current_trace()
+    if trace is not None:
+        trace.count(name, amount)
+
+
+def register_gauges(provider):
+    """
+    provider() retourneert {metriek: (help, {labels-tuple: waarde})} en wordt bij elke export aangeroepen.
+    Per functie (module en naam) telt de laatste registratie: Streamlit voert app.py bij elke interactie
+    opnieuw uit, en een oude provider zou anders dubbele series geven en de caches van die run vasthouden.
+    """
+    _gauge_providers[(provider.__module__, provider.__qualname__)] = provider
+
+
+def record_startup(phase, seconds):
+    """
+    Legt de duur van een opstartfase vast. Alleen de eerste meting per proces telt: dat is de koude start
+    (Streamlit voert app.py bij elke interactie opnieuw uit, maar dan zijn de modules al geladen).
+    """
+    with _startup_lock:
+        if phase in _startup:
+            return
+        _startup[phase] = seconds
+    logger.info(json.dumps({'event': 'startup', 'phase': phase, 'seconds': round(seconds, 6)}))
+
+
+def startup_timings():
+    with _startup_lock:
+        return dict(_startup)
+
+
+def render_prometheus():
+    extra = {
+        'mba_startup_seconds': ("Duur van de opstartfasen (imports, warm-up) van dit proces.",
+                                {(('phase', phase),): round(seconds, 6) for phase, seconds in startup_timings().items()})
+    }
+    for provider in list(_gauge_providers.values()):
+        extra.update(provider())
+    return REGISTRY.render_prometheus(extra)
+
+
+def write_metrics_file(path):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as metrics_file:
+        metrics_file.write(render_prometheus())
+    os.replace(temp_path, path)
+
+
+@contextlib.contextmanager
+def query_trace(search_term, source, **labels):
+    """
+    Omhult één zoekopdracht: verzamelt de fasen en tellers, logt ze als één JSON-regel, werkt de
+    Prometheus-tellers (en eventueel MBA_METRICS_FILE) bij en schrijft bij MBA_PROFILE_SLOW_SECONDS
+    een cProfile-dump naar MBA_PROFILE_DIR als de zoekopdracht trager was dan die drempel.
+    """
+    trace = QueryTrace(search_term, source, **labels)
+    previous = current_trace()
+    _current.trace = trace
+    profiler = None
+    if PROFILE_SLOW_SECONDS is not None and _profile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield trace
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+        _current.trace = previous
+        trace.total = time.perf_counter() - trace.start
+        if profiler is not None and trace.total > PROFILE_SLOW_SECONDS:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            trace.profile_path = os.path.join(
+                PROFILE_DIR, f"query-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10 ** 9:09d}.prof"
+            )
+            profiler.dump_stats(trace.profile_path)
+        REGISTRY.record(trace)
+        logger.info(json.dumps(trace.as_dict(), ensure_ascii=False))
+        if METRICS_FILE:
+            try:
+                write_metrics_file(METRICS_FILE)
+            except OSError as e:
+                logger.warning("Metrics-bestand '%s' niet geschreven: %s", METRICS_FILE, e)
@@ -0,0 +1,34 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# De modules (app.py, jsonmaker.py, ...) staan in de hoofdmap van de repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@pytest.fixture(scope='session')
+def synthetic_corpus(tmp_path_factory):
+    """
+    Klein synthetisch corpus in het formaat van jsonmaker.py (zie benchmarks/corpus.py), één keer per testrun.
+    """
+    from benchmarks import corpus
+    corpus_dir = str(tmp_path_factory.mktemp('corpus'))
+    corpus.generate_corpus(corpus_dir, gemeenten=4, headings=8, articles_per_heading=1, article_words=10,
+                           activities=10)
+    return corpus_dir
+
+
+@pytest.fixture
+def corpus_dir(synthetic_corpus, tmp_path, monkeypatch):
+    """
+    Eigen kopie van het synthetische corpus als werkmap, zodat een test de bestanden mag wijzigen.
+    """
+    corpus_dir = os.path.join(tmp_path, 'corpus')
+    # Zonder de oorspronkelijke mtimes, zodat de bestandssignaturen van app.py per kopie verschillen
+    shutil.copytree(synthetic_corpus, corpus_dir, copy_function=shutil.copy)
+    monkeypatch.chdir(corpus_dir)
+    return corpus_dir
@@ -0,0 +1,45 @@
+import app
+import batch_search
+
+
+def excel_only_term(categories):
+    # Een activiteit van het Rijk die via de Excel-terugval in meer dan één categorie resultaten geeft
+    excel_index, _ = app.load_excel_index()
+    manifest = app.load_manifest()
+    heading_index = app.load_heading_index()
+    cache = app.load_corpus_for_query(manifest, categories, None, heading_index)
+    for term in excel_index:
+        excel_results = {category for category, items in app.search_in_excel(term, None, cache, heading_index).items()
+                         if items}
+        if len(excel_results) > 1:
+            return term, sorted(excel_results)
+    raise AssertionError("geen Excel-term met resultaten in meerdere categorieën")
+
+
+def test_excel_fallback_respects_categories(corpus_dir):
+    categories = app.available_categories(app.load_manifest())
+    term, excel_categories = excel_only_term(categories)
+    selected = [excel_categories[0]]
+
+    results, stats = batch_search.batch_search([term], categories=selected)
+    assert results[term] and set(results[term]) <= set(selected)
+
+    cache = app.load_corpus_for_query(app.load_manifest(), selected, None, app.load_heading_index())
+    grouped_results, _ = app.process_cache(cache, term, selected, None, app.load_heading_index())
+    assert {category for category, items in grouped_results.items() if items} <= set(selected)
+
+
+def test_terms_are_normalized_like_process_cache(corpus_dir):
+    assert batch_search.normalize_terms(["Opslaan", " opslaan ", "OPSLAAN\t", "gevaarlijke  stoffen",
+                                         "Gevaarlijke stoffen", ""]) == ["Opslaan", "gevaarlijke  stoffen"]
+    manifest = app.load_manifest()
+    categories = app.available_categories(manifest)
+    heading_index = app.load_heading_index()
+    cache = app.load_corpus_for_query(manifest, categories, None, heading_index)
+    # '§  1.2' is één woord en gaat dus via de automaat, niet via de postinglijsten
+    terms = ["  Bedrijf   stoffen ", "BODEM", "§  1.2", "energie\ttank"]
+    results, stats = batch_search.batch_search(terms)
+    for term in terms:
+        grouped_results, _ = app.process_cache(cache, term, categories, None, heading_index)
+        expected = {category: items for category, items in grouped_results.items() if items}
+        assert expected and results[term.strip()] == expected
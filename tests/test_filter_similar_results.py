@@ -0,0 +1,64 @@
+import json
+import os
+import re
+from difflib import SequenceMatcher
+
+import pytest
+
+import app
+from conftest import DATA_DIR
+
+
+def reference_filter_similar_results(results, similarity_threshold=1):
+    """
+    De oorspronkelijke filter_similar_results: elke titel wordt met alle eerder gehouden titels vergeleken.
+    """
+    filtered_results = []
+    seen_titles = set()
+    for title, link, name in results:
+        if not link or link.endswith("#"):
+            continue
+        normalized_title = re.sub(r'[^a-zA-Z0-9]', '', title.lower())
+        is_similar = False
+        for seen_title in seen_titles:
+            similarity = SequenceMatcher(None, normalized_title, seen_title).ratio()
+            if similarity >= similarity_threshold:
+                is_similar = True
+                break
+        if not is_similar:
+            filtered_results.append((title, link, name))
+            seen_titles.add(normalized_title)
+    return sorted(filtered_results, key=lambda x: app.natural_sort_key(x[0]))
+
+
+def load_result_sets():
+    # Opgenomen resultaatsets (titel, link, bron) van zoekopdrachten op een synthetisch corpus,
+    # plus sets met varianten van dezelfde titels (§/Paragraaf, hoofdletters, leestekens, typefouten)
+    with open(os.path.join(DATA_DIR, 'similar_results.json'), 'r', encoding='utf-8') as data_file:
+        return [(result_set['term'], [tuple(result) for result in result_set['results']])
+                for result_set in json.load(data_file)]
+
+
+RESULT_SETS = load_result_sets()
+
+
+@pytest.mark.parametrize('similarity_threshold', [1, 0.95, 0.9, 0.8, 0.6])
+@pytest.mark.parametrize('term, results', RESULT_SETS, ids=[term for term, results in RESULT_SETS])
+def test_matches_pairwise_sequence_matcher(term, results, similarity_threshold):
+    assert app.filter_similar_results(results, similarity_threshold) == \
+        reference_filter_similar_results(results, similarity_threshold)
+
+
+def test_lower_threshold_removes_variants():
+    term, results = next(result_set for result_set in RESULT_SETS if result_set[0] == 'varianten')
+    exact = app.filter_similar_results(results)
+    fuzzy = app.filter_similar_results(results, 0.8)
+    assert len(fuzzy) < len(exact) < len(results)
+
+
+@pytest.mark.parametrize('similarity_threshold', [1, 0.8, 0, 1.5])
+def test_edge_cases(similarity_threshold):
+    results = [("", "a#1", "x"), ("", "a#2", "x"), ("ab", "a#3", "x"), ("AB", "a#4", "x"), ("zz", "a#5", "x"),
+               ("geen anker", "a#", "x"), ("geen link", "", "x")]
+    assert app.filter_similar_results(results, similarity_threshold) == \
+        reference_filter_similar_results(results, similarity_threshold)
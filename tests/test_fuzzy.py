@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+import app
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, a_char in enumerate(a, 1):
+        current = [i]
+        for j, b_char in enumerate(b, 1):
+            current.append(min(previous[j - 1] + (a_char != b_char), previous[j] + 1, current[j - 1] + 1))
+        previous = current
+    return previous[-1]
+
+
+def substring_distance(pattern, text):
+    # Naïeve referentie: edit distance tegen het best passende deel van de tekst
+    return min(levenshtein(pattern, text[i:j]) for i in range(len(text) + 1) for j in range(i, len(text) + 1))
+
+
+@pytest.mark.parametrize('term, expected', [
+    ("tak", 0), ("tank", 1), ("opslaan", 1), ("opslagt", 1), ("opslagta", 2), ("gevaarlijke", 2),
+    ("t-a-n", 0), ("Ta Nk", 1)
+])
+def test_edit_budget_boundaries(term, expected):
+    assert app.fuzzy_max_distance(app.normalize_fuzzy(term)) == expected
+
+
+def index_of(*texts):
+    return app.TrigramIndex((text, text) for text in texts)
+
+
+@pytest.mark.parametrize('term, found, not_found', [
+    # Lengte 3: geen typefouten
+    ("tak", ["tak"], ["tank", "tas"]),
+    # Lengte 4: één bewerking; 'tamk' deelt geen enkel trigram met 'tank'
+    ("tank", ["tamk", "tnk", "tanks", "ta nk"], ["tmmk", "tk"]),
+    # Lengte 7: één bewerking
+    ("opslaan", ["opslxan", "opsaan"], ["opxlxan", "opsn"]),
+    # Lengte 8: twee bewerkingen, ook als daarmee alle trigrammen van de term geraakt zijn
+    ("windturb", ["wixdtxrb", "windtrb", "wndturbb"], ["xixdtxrb", "wdtb"]),
+])
+def test_search_at_budget_boundaries(term, found, not_found):
+    index = index_of(*(found + not_found))
+    assert sorted(index.search(term, substring=False)) == sorted(found)
+
+
+def test_spaces_do_not_count():
+    index = index_of("Paragraaf 3.1 Opslagtank voor brandstof", "Paragraaf 3.2 Opslag tank", "Paragraaf 3.3 Opslag")
+    assert sorted(index.search("opslag tank")) == ["Paragraaf 3.1 Opslagtank voor brandstof", "Paragraaf 3.2 Opslag tank"]
+    assert sorted(index.search("opslagtank")) == ["Paragraaf 3.1 Opslagtank voor brandstof", "Paragraaf 3.2 Opslag tank"]
+
+
+def test_only_match_is_a_substring_with_one_edit():
+    index = index_of("Paragraaf 22.3.4 Opslaan van gevaarlijke stoffen in tanks", "Paragraaf 22.3.5 Lozen van afvalwater")
+    # 'gevaarlyke' wijkt één letter af van een deel van de eerste titel, en is verder nergens te vinden
+    assert index.search("gevaarlyke") == ["Paragraaf 22.3.4 Opslaan van gevaarlijke stoffen in tanks"]
+    assert index.search("gevaarlyke", substring=False) == []
+    assert not app.within_edit_distance("gevaarlyke", app.normalize_fuzzy(index.texts[0]), 2)
+
+
+@pytest.mark.parametrize('pattern, text, max_distance, expected', [
+    ("tank", "opslagtank", 0, True),
+    ("tank", "opslagtamk", 0, False),
+    ("tank", "opslagtamk", 1, True),
+    ("tank", "opslagtmmk", 1, False),
+    ("tank", "tnk", 1, True),
+    ("tank", "", 1, False),
+    ("tank", "", 4, True),
+    ("opslaan", "xxopsaanxx", 1, True),
+])
+def test_within_substring_distance(pattern, text, max_distance, expected):
+    assert app.within_substring_distance(pattern, text, max_distance) is expected
+
+
+def test_distances_match_naive_reference():
+    rng = random.Random(3)
+    for _ in range(400):
+        pattern = ''.join(rng.choices('abc', k=rng.randint(1, 5)))
+        text = ''.join(rng.choices('abc', k=rng.randint(0, 7)))
+        for max_distance in range(3):
+            assert app.within_substring_distance(pattern, text, max_distance) == \
+                (substring_distance(pattern, text) <= max_distance)
+            assert app.within_edit_distance(pattern, text, max_distance) == (levenshtein(pattern, text) <= max_distance)
+
+
+def test_search_matches_brute_force():
+    # Het kandidaatfilter (trigrammen, bigrammen of alles) mag geen enkele tekst binnen het budget missen
+    rng = random.Random(5)
+    texts = [''.join(rng.choices('abcd', k=rng.randint(3, 12))) for _ in range(300)]
+    index = index_of(*texts)
+    for _ in range(200):
+        term = ''.join(rng.choices('abcd', k=rng.randint(3, 9)))
+        max_distance = app.fuzzy_max_distance(term)
+        for substring in (True, False):
+            verify = app.within_substring_distance if substring else app.within_edit_distance
+            expected = sorted(set(text for text in texts if verify(term, text, max_distance)))
+            assert sorted(set(index.search(term, substring))) == expected
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+import pytest
+
+import jsonmaker
+
+
+class LegislationServer(ThreadingHTTPServer):
+    """
+    Lokale vervanger van de wetgevingssites: per pad een (etag, content). Paden zonder etag negeren
+    conditionele verzoeken en sturen altijd de content (dan beslist de content-hash).
+    """
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), LegislationHandler)
+        self.documents = {}
+        self.delay = 0
+        self.requests = []  # (pad, If-None-Match, status)
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class LegislationHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        etag, content = self.server.documents[self.path]
+        time.sleep(self.server.delay)
+        if_none_match = self.headers.get('If-None-Match')
+        if etag is not None and if_none_match == etag:
+            self.server.requests.append((self.path, if_none_match, 304))
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = content.encode('utf-8')
+        self.server.requests.append((self.path, if_none_match, 200))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = LegislationServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def document(title):
+    return f'<h1 id="chp_1">Hoofdstuk 1 {title}</h1><h2 id="chp_1__subchp_1.1">Afdeling 1.1 {title}</h2><p>tekst</p>'
+
+
+def crawl(urls):
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(jsonmaker.create_legislation_cache(urls, incremental=True, max_retries=0, timeout=10))
+    finally:
+        loop.close()
+
+
+def file_identity(path):
+    # Cachebestanden worden via een tijdelijk bestand en os.replace geschreven: herschrijven geeft een nieuw inode
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def test_incremental_crawl_rewrites_only_changed_files(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server.documents = {
+        '/plan-a': ('"a1"', document("Gemeente A")),
+        '/plan-b': ('"b1"', document("Gemeente B")),
+        '/bal': ('"bal1"', document("Bal")),
+        '/bbl': (None, document("Bbl")),
+    }
+    urls = [
+        ("Gemeente A", server.url('/plan-a'), "Omgevingsplan"),
+        ("Gemeente B", server.url('/plan-b'), "Omgevingsplan"),
+        ("Besluit activiteiten leefomgeving", server.url('/bal'), "Besluit activiteiten leefomgeving"),
+        ("Besluit bouwwerken leefomgeving", server.url('/bbl'), "Besluit bouwwerken leefomgeving"),
+    ]
+    crawl(urls)
+    manifest = {entry['url']: entry for entry in jsonmaker.load_json_file('manifest.json', {})['documents']}
+    assert set(manifest) == {url for name, url, category in urls}
+    files = {url: entry['file'] for url, entry in manifest.items()}
+    # Elk omgevingsplan komt in een eigen shard, de besluiten in een eigen bestand
+    assert len(set(files.values())) == 4
+    before = {filename: file_identity(filename) for filename in files.values()}
+
+    # Tweede run: plan A gewijzigd (nieuwe ETag), plan B en Bal ongewijzigd (304), Bbl zonder ETag maar gelijk
+    server.documents['/plan-a'] = ('"a2"', document("Gemeente A gewijzigd"))
+    server.requests.clear()
+    crawl(urls)
+
+    statuses = {path: (if_none_match, status) for path, if_none_match, status in server.requests}
+    assert statuses['/plan-a'] == ('"a1"', 200)
+    assert statuses['/plan-b'] == ('"b1"', 304)
+    assert statuses['/bal'] == ('"bal1"', 304)
+    assert statuses['/bbl'] == (None, 200)
+
+    rewritten = {filename for filename in before if file_identity(filename) != before[filename]}
+    assert rewritten == {files[server.url('/plan-a')]}
+
+    manifest = {entry['url']: entry for entry in jsonmaker.load_json_file('manifest.json', {})['documents']}
+    assert "Gemeente A gewijzigd" in jsonmaker.read_cached_record(manifest[server.url('/plan-a')])['content']
+    assert jsonmaker.read_cached_record(manifest[server.url('/plan-b')])['content'] == document("Gemeente B")
+    heading_index = jsonmaker.load_json_file('heading_index.json', {})
+    assert heading_index[server.url('/plan-a')]['headings'][0]['title'] == "Hoofdstuk 1 Gemeente A gewijzigd"
+    state = jsonmaker.load_json_file('crawl_state.json', {})
+    assert state[server.url('/plan-a')]['etag'] == '"a2"'
+    assert state[server.url('/bal')]['etag'] == '"bal1"'
+
+
+def test_incremental_crawl_without_changes_rewrites_nothing(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server.documents = {'/plan': ('"p1"', document("Gemeente")), '/bal': (None, document("Bal"))}
+    urls = [("Gemeente", server.url('/plan'), "Omgevingsplan"),
+            ("Besluit activiteiten leefomgeving", server.url('/bal'), "Besluit activiteiten leefomgeving")]
+    crawl(urls)
+    files = {entry['file'] for entry in jsonmaker.load_json_file('manifest.json', {})['documents']}
+    before = {filename: file_identity(filename) for filename in files}
+
+    crawl(urls)
+    assert {filename: file_identity(filename) for filename in files} == before
+
+
+def test_latency_excludes_queue_wait(server):
+    # Eén verzoek tegelijk: het laatste verzoek wacht op de drie eerdere, maar is zelf niet trager
+    server.delay = 0.2
+    server.documents = {f'/besluit-{i}': (None, document(f"Besluit {i}")) for i in range(4)}
+
+    async def fetch_all():
+        semaphore = asyncio.Semaphore(1)
+        async with aiohttp.ClientSession() as session:
+            return await asyncio.gather(*(
+                jsonmaker.fetch_with_retries(session, path, server.url(path), "Besluit", semaphore, asyncio.Semaphore(2))
+                for path in server.documents
+            ))
+
+    results = asyncio.run(fetch_all())
+    assert all(result['error'] is None for result in results)
+    assert all(0.2 <= result['latency'] < 0.5 for result in results)
+    assert max(result['queue_seconds'] for result in results) >= 0.55
@@ -0,0 +1,144 @@
+import json
+import os
+
+import pytest
+
+import app
+import jsonmaker
+import mapped_corpus
+
+PLAN_TITLES = [
+    "Hoofdstuk 22 Bruidsschat",
+    "Paragraaf 22.3.1 Opslaan van gevaarlijke stoffen",
+    "Paragraaf 22.3.2 Geluid bij café — terras",
+    "Paragraaf 22.3.3 IJzer, € en ĳzerhandel in İstanbul",
+    "Paragraaf 22.3.4 Opslagtank voor brandstof",
+    "Paragraaf 22.3.9 Zuiveren van afvalwater",
+]
+BAL_TITLES = [
+    "Hoofdstuk 3 Milieubelastende activiteiten",
+    "§ 3.2.1 Opslaan in ondergrondse opslagtanks",
+    "§ 3.2.2 Tankstation",
+]
+SEARCH_TERMS = [
+    "opslaan", "OPSLAAN", "café", "— terras", "€", "ĳzer", "istanbul", "stanbul", "afvalwater", "zuiveren van afvalwater",
+    "tank", "opslag tank", "stoffen paragraaf", "z", "bestaat-niet", "22.3.9", "hoofdstuk",
+]
+
+
+def content(titles):
+    parts = []
+    for i, title in enumerate(titles):
+        tag = 'h1' if title.startswith("Hoofdstuk") else 'h3'
+        parts.append(f'<{tag} id="kop{i}">{title}</{tag}><h4 id="art{i}">Artikel {i}.1</h4><p>tekst {i}</p>')
+    return '\n'.join(parts)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """
+    Klein corpus in het formaat van jsonmaker.py plus het gemapte corpus daarvan. Het laatste document
+    staat niet in de koppen-index.
+    """
+    monkeypatch.chdir(tmp_path)
+    documents = [
+        ("https://lokaleregelgeving.example/plan",
+         {'name': "Gemeente Één", 'category': "Omgevingsplan", 'content': content(PLAN_TITLES)}),
+        ("https://wetten.example/bal",
+         {'name': "Besluit activiteiten leefomgeving", 'category': "Besluit activiteiten leefomgeving",
+          'content': content(BAL_TITLES)}),
+        ("https://wetten.example/zonder-index",
+         {'name': "Besluit kwaliteit leefomgeving", 'category': "Besluit kwaliteit leefomgeving",
+          'content': content(["Hoofdstuk 1 Zonder koppen-index"])}),
+    ]
+    writer = jsonmaker.CacheFileWriter('omgevingsplannen_1.jsonl.gz')
+    entries = []
+    heading_index = {}
+    for url, record in documents:
+        offset, size = writer.write(url, record)
+        entries.append(jsonmaker.manifest_entry(url, record, 'omgevingsplannen_1.jsonl.gz', offset, size))
+        if url != documents[-1][0]:
+            heading_index[url] = jsonmaker.heading_index_entry(record)
+    writer.close()
+    jsonmaker.save_manifest(entries, 'manifest.json')
+    jsonmaker.save_json_file(heading_index, 'heading_index.json')
+    assert mapped_corpus.build_mapped_corpus() == len(documents)
+    return dict(documents)
+
+
+def json_index():
+    # De koppen-index zoals de app die zonder gemapt corpus opbouwt
+    with open('heading_index.json', 'r', encoding='utf-8') as index_file:
+        return {url: app.prepare_index_entry(entry) for url, entry in json.load(index_file).items()}
+
+
+def test_round_trip(corpus):
+    mapped = mapped_corpus.MappedCorpus()
+    expected = json_index()
+    assert len(mapped) == len(corpus)
+    for url, record in corpus.items():
+        assert mapped.record(url) == record
+    assert mapped.heading_index is not None
+    assert set(mapped.heading_index) == set(expected)
+    for url, entry in expected.items():
+        mapped_entry = mapped.heading_index[url]
+        assert list(mapped_entry['titles']) == entry['titles']
+        assert list(mapped_entry['vocabulary']) == entry['vocabulary']
+        assert {token: list(positions) for token, positions in mapped_entry['postings'].items()} == entry['postings']
+        # Ankers zonder nummer zijn niet op te zoeken en worden niet opgeslagen
+        assert dict(mapped_entry['anchors']) == {key: anchor for key, anchor in entry['anchors'].items() if key[1]}
+        for key, anchor in entry['anchors'].items():
+            if key[1]:
+                assert mapped_entry['anchors'][key] == anchor
+    assert "https://wetten.example/zonder-index" not in mapped.heading_index
+
+
+def test_string_array_find_at_blob_edges(corpus):
+    mapped = mapped_corpus.MappedCorpus()
+    entry = mapped.heading_index["https://lokaleregelgeving.example/plan"]
+    lower = [title.lower() for title in PLAN_TITLES]
+    assert entry.find_titles(lower[0][:5]) == [0]
+    assert entry.find_titles("afvalwater") == [len(PLAN_TITLES) - 1]
+    assert entry.find_titles(lower[-1]) == [len(PLAN_TITLES) - 1]
+    assert entry.find_titles("ĳzer") == [3]
+    # Een match over de grens van twee titels heen telt niet
+    assert entry.find_titles(lower[1][-6:] + lower[2][:9]) == []
+    assert entry.find_titles("\n") == []
+
+
+def search_all(heading_index, terms):
+    return {term: {url: sorted(app.search_headings(heading_index[url], term), key=str) for url in heading_index}
+            for term in terms}
+
+
+def fuzzy_all(heading_index, terms):
+    return {term: {url: sorted(matches, key=str)
+                   for url, matches in app.search_headings_fuzzy(heading_index, list(heading_index), term).items()}
+            for term in terms}
+
+
+def test_search_mapped_equals_dict(corpus):
+    heading_index = app.load_heading_index()
+    assert isinstance(heading_index, mapped_corpus.MappedHeadingIndex)
+    fuzzy_terms = ["gevaarlyke stofen", "afvalwatr", "caffe", "ĳzerhandl", "opslagtnak"]
+    mapped_results = search_all(heading_index, SEARCH_TERMS)
+    mapped_fuzzy = fuzzy_all(heading_index, fuzzy_terms)
+    assert mapped_results["afvalwater"]["https://lokaleregelgeving.example/plan"] == \
+        [("Paragraaf 22.3.9 Zuiveren van afvalwater", "kop5")]
+    assert mapped_results["café"]["https://lokaleregelgeving.example/plan"]
+    assert mapped_fuzzy["afvalwatr"]
+
+    # Zonder gemapt corpus valt de app terug op heading_index.json
+    os.remove(mapped_corpus.MAPPED_CORPUS_PATH)
+    heading_index = app.load_heading_index()
+    assert isinstance(heading_index, dict)
+    assert search_all(heading_index, SEARCH_TERMS) == mapped_results
+    assert fuzzy_all(heading_index, fuzzy_terms) == mapped_fuzzy
+    assert search_all(json_index(), SEARCH_TERMS) == mapped_results
+
+
+def test_stale_mapped_corpus_is_ignored(corpus):
+    assert isinstance(app.load_heading_index(), mapped_corpus.MappedHeadingIndex)
+    # heading_index.json is na het bouwen van het gemapte corpus herschreven
+    os.utime('heading_index.json', ns=(1, 1))
+    assert isinstance(app.load_heading_index(), dict)
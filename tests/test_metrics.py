@@ -0,0 +1,41 @@
+import importlib
+
+import app
+import metrics
+
+
+def series(text):
+    # Regels met een meetwaarde, zonder de waarde: 'metriek{labels}'
+    return [line.rsplit(' ', 1)[0] for line in text.splitlines() if line and not line.startswith('#')]
+
+
+def make_provider(value):
+    def test_gauges():
+        return {'mba_test_gauge': ("Gauge uit de test.", {(): value})}
+    return test_gauges
+
+
+def test_reregistering_a_provider_replaces_it():
+    providers = len(metrics._gauge_providers)
+    metrics.register_gauges(make_provider(1))
+    metrics.register_gauges(make_provider(2))
+    try:
+        assert len(metrics._gauge_providers) == providers + 1
+        text = metrics.render_prometheus()
+        assert 'mba_test_gauge 2' in text.splitlines()
+        assert 'mba_test_gauge 1' not in text.splitlines()
+    finally:
+        del metrics._gauge_providers[(__name__, 'make_provider.<locals>.test_gauges')]
+
+
+def test_rerun_does_not_add_providers_or_duplicate_series():
+    providers = dict(metrics._gauge_providers)
+    # Streamlit voert app.py bij elke interactie opnieuw uit
+    importlib.reload(app)
+    importlib.reload(app)
+    assert metrics._gauge_providers.keys() == providers.keys()
+    # De providers van de vorige run (en daarmee hun caches) worden losgelaten
+    assert metrics._gauge_providers[('app', 'result_cache_gauges')] is app.result_cache_gauges
+    rendered = series(metrics.render_prometheus())
+    assert len(rendered) == len(set(rendered))
+    assert any(line.startswith('mba_result_cache_entries') for line in rendered)
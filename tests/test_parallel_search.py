@@ -0,0 +1,31 @@
+import threading
+
+import app
+
+
+def documents(count):
+    return {
+        f"u{i}": {'name': f"Gemeente {i}", 'category': "Omgevingsplan",
+                  'content': f"<h3>Paragraaf 1.{i} Opslaan van stoffen</h3><h3>§ 2.{i} Geluid</h3>"}
+        for i in range(count)
+    }
+
+
+def test_parallel_scan_matches_serial(monkeypatch):
+    cache = documents(6)
+    serial = app.search_documents_parallel(list(cache), cache, "opslaan", 1)
+    # Als enige thread (zoals in een script) wordt er geforkt
+    monkeypatch.setattr(threading, 'active_count', lambda: 1)
+    assert app.search_documents_parallel(list(cache), cache, "opslaan", 3) == serial
+    assert app._search_state == {}
+
+
+def test_no_fork_with_other_threads(monkeypatch):
+    # In Streamlit en api.py draaien altijd andere threads: daar wordt niet geforkt
+    def no_pool(*args, **kwargs):
+        raise AssertionError("procespool in een proces met meerdere threads")
+    monkeypatch.setattr(app, 'ProcessPoolExecutor', no_pool)
+    monkeypatch.setattr(threading, 'active_count', lambda: 4)
+    cache = documents(6)
+    assert app.search_documents_parallel(list(cache), cache, "geluid", 3) == \
+        app.search_documents_parallel(list(cache), cache, "geluid", 1)
@@ -0,0 +1,56 @@
+import importlib
+
+import app
+
+
+def load_corpus():
+    manifest = app.load_manifest()
+    categories = app.available_categories(manifest)
+    heading_index = app.load_heading_index()
+    return app.load_corpus_for_query(manifest, categories, None, heading_index), categories, heading_index
+
+
+def search(search_term):
+    cache, categories, heading_index = load_corpus()
+    grouped_results, _ = app.process_cache(cache, search_term, categories, None, heading_index,
+                                           corpus_version=app.corpus_version())
+    return grouped_results
+
+
+def test_normalized_terms_share_one_entry(corpus_dir):
+    first = search("opslaan")
+    assert any(first.values())
+    hits = app.RESULT_CACHE.hits
+    for variant in ("Opslaan", "  opslaan ", "OPSLAAN\t"):
+        assert search(variant) == first
+    assert app.RESULT_CACHE.hits == hits + 3
+
+
+def test_multi_word_term_whitespace(corpus_dir):
+    expected = search("gevaarlijke stoffen")
+    hits = app.RESULT_CACHE.hits
+    assert search(" Gevaarlijke   stoffen ") == expected
+    assert app.RESULT_CACHE.hits == hits + 1
+
+
+def test_excel_cache_key_is_normalized(corpus_dir):
+    excel_index, _ = app.load_excel_index()
+    # Een activiteit van het Rijk verwijst naar de besluiten, die voor elke gemeente gelden
+    term = next(key for key, matches in excel_index.items()
+                if ' ' in key and matches[0][0] == "Overzicht activiteiten Rijk")
+    cache, categories, heading_index = load_corpus()
+    version = app.corpus_version()
+    expected = app.search_in_excel(term, None, cache, heading_index, version)
+    assert expected
+    hits = app.EXCEL_RESULT_CACHE.hits
+    variant = f"  {term.upper().replace(' ', '  ')} "
+    assert app.search_in_excel(variant, None, cache, heading_index, version) == expected
+    assert app.EXCEL_RESULT_CACHE.hits == hits + 1
+
+
+def test_caches_survive_a_rerun():
+    # Streamlit voert app.py bij elke interactie opnieuw uit; de caches moeten dan dezelfde objecten blijven
+    result_cache, excel_result_cache = app.RESULT_CACHE, app.EXCEL_RESULT_CACHE
+    importlib.reload(app)
+    assert app.RESULT_CACHE is result_cache
+    assert app.EXCEL_RESULT_CACHE is excel_result_cache
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import app
+
+
+def index_entry(*titles):
+    headings = [{'kind': title.split()[0], 'number': '', 'title': title, 'anchor': f"kop{i}"}
+                for i, title in enumerate(titles)]
+    return app.prepare_index_entry({'headings': headings})
+
+
+def titles_of(results):
+    return sorted(title for title, anchor in results)
+
+
+@pytest.fixture
+def heading_index(corpus_dir):
+    with open('heading_index.json', 'r', encoding='utf-8') as index_file:
+        return {url: app.prepare_index_entry(entry) for url, entry in json.load(index_file).items()}
+
+
+@pytest.mark.parametrize('term', ["3.2", "1.2.3", "§ 1.2", "Afdeling 1.2", "1.1 bodem", "tank", "bodem energie"])
+def test_same_as_substring_search(heading_index, term):
+    # Termen waarvan de woorden aaneengesloten in de kop staan: hetzelfde resultaat als de substring-scan
+    # (en als de regex-scan zonder koppen-index)
+    found = 0
+    for entry in heading_index.values():
+        expected = sorted(title for title, title_lower, anchor in entry['titles'] if term.lower() in title_lower)
+        if len(app.tokenize(term)) == 1:
+            assert titles_of(app.search_headings(entry, term)) == expected
+        else:
+            assert set(expected) <= set(titles_of(app.search_headings(entry, term)))
+        found += len(expected)
+    assert found
+
+
+def test_dotted_numbers_are_one_word():
+    entry = index_entry("§ 1.2.3 Opslaan", "§ 2.1.3 Geluid", "§ 3.1.2 Bodem", "§ 3.2.1 Tanks", "§ 13.2 Lozen")
+    assert titles_of(app.search_headings(entry, "3.2")) == ["§ 13.2 Lozen", "§ 3.2.1 Tanks"]
+    assert titles_of(app.search_headings(entry, "1.2.3")) == ["§ 1.2.3 Opslaan"]
+    assert titles_of(app.search_headings(entry, "3.2 tanks")) == ["§ 3.2.1 Tanks"]
+    assert titles_of(app.search_headings(entry, "tanks 3.2")) == ["§ 3.2.1 Tanks"]
+
+
+def test_words_in_any_order_and_inside_words():
+    entry = index_entry("Paragraaf 3.1 Opslaan van gevaarlijke stoffen", "Paragraaf 3.2 Opslagtank",
+                        "Paragraaf 3.3 Tank voor opslag", "Paragraaf 3.4 Opslag")
+    assert titles_of(app.search_headings(entry, "gevaarlijke stoffen opslaan")) == \
+        ["Paragraaf 3.1 Opslaan van gevaarlijke stoffen"]
+    # 'tank' alleen vindt 'Opslagtank'; 'opslag tank' dus ook
+    assert titles_of(app.search_headings(entry, "tank")) == ["Paragraaf 3.2 Opslagtank", "Paragraaf 3.3 Tank voor opslag"]
+    assert titles_of(app.search_headings(entry, "opslag tank")) == \
+        ["Paragraaf 3.2 Opslagtank", "Paragraaf 3.3 Tank voor opslag"]
+    assert app.search_headings(entry, "opslag windturbine") == []
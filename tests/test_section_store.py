@@ -0,0 +1,61 @@
+import sqlite3
+
+import jsonmaker
+
+
+def record(name, *titles):
+    content = ''.join(f'<h3 id="p{i}">Paragraaf 1.{i} {title}</h3><p>tekst over {title}</p>'
+                      for i, title in enumerate(titles, 1))
+    return {'name': name, 'category': "Omgevingsplan", 'content': content}
+
+
+def sections(path):
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute("SELECT url, heading_path FROM sections ORDER BY rowid").fetchall()
+        documents = connection.execute("SELECT url, first_rowid, last_rowid FROM section_documents").fetchall()
+    return rows, {url: (first, last) for url, first, last in documents}
+
+
+def matches(path, query):
+    with sqlite3.connect(path) as connection:
+        return sorted(row[0] for row in connection.execute("SELECT url FROM sections WHERE sections MATCH ?", (query,)))
+
+
+def test_fresh_build_does_not_delete(tmp_path):
+    path = str(tmp_path / 'sections.db')
+    store = jsonmaker.SectionStore(path)
+    statements = []
+    store.connection.set_trace_callback(statements.append)
+    for i in range(20):
+        store.write(f"u{i}", record(f"Gemeente {i}", "opslaan", "geluid"))
+    store.close()
+    # Bij een nieuwe database is er niets te vervangen; een DELETE zou de hele FTS-tabel doorlopen
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith('DELETE')]
+    rows, documents = sections(path)
+    assert len(rows) == 40
+    assert all(last - first + 1 == 2 for first, last in documents.values())
+
+
+def test_incremental_replace_and_retain(tmp_path):
+    path = str(tmp_path / 'sections.db')
+    store = jsonmaker.SectionStore(path)
+    for url, title in (("a", "opslaan"), ("b", "geluid"), ("c", "windturbine")):
+        store.write(url, record(url, title, "bodem"))
+    store.close()
+
+    store = jsonmaker.SectionStore(path, incremental=True)
+    assert store.urls == {"a", "b", "c"}
+    store.write("b", record("b", "trillingen"))
+    store.retain(["a", "b"])
+    store.close()
+
+    rows, documents = sections(path)
+    assert set(documents) == {"a", "b"}
+    assert {url for url, heading_path in rows} == {"a", "b"}
+    assert matches(path, "geluid") == []
+    assert matches(path, "trillingen") == ["b"]
+    assert matches(path, "bodem") == ["a"]
+    assert matches(path, "windturbine") == []
+    for url, (first, last) in documents.items():
+        assert [row_url for row_url, heading_path in rows if row_url == url] == [url] * (last - first + 1)
+
@@ -0,0 +1,182 @@
+import glob
+import hashlib
+import os
+
+import pytest
+
+import app
+import jsonmaker
+
+
+def record(name, *titles):
+    content = ''.join(f'<h3 id="p{i}">Paragraaf 1.{i} {title}</h3><p>tekst over {title}</p>'
+                      for i, title in enumerate(titles, 1))
+    return {'name': name, 'category': "Omgevingsplan", 'content': content}
+
+
+def commit_generation(records, directory='segments'):
+    # Zoals jsonmaker.py bij een (incrementele) run: ongewijzigde documenten hergebruiken hun segment
+    segments = jsonmaker.IndexSegments(directory)
+    for url, doc in records.items():
+        content_hash = hashlib.sha256(doc['content'].encode('utf-8')).hexdigest()
+        if not segments.reuse(url, content_hash):
+            segments.write(url, doc, jsonmaker.heading_index_entry(doc), content_hash)
+    return segments.commit(list(records))
+
+
+def generation_numbers(directory='segments'):
+    return sorted(int(os.path.basename(path)[len('generation-'):-len('.json')])
+                  for path in glob.glob(os.path.join(directory, 'generation-*.json')))
+
+
+def segment_files(directory='segments'):
+    return set(glob.glob(os.path.join(directory, '*' + jsonmaker.CACHE_FILE_EXTENSION))) | \
+        set(glob.glob(os.path.join(directory, '*.index.json')))
+
+
+def referenced_files(number, directory='segments'):
+    generation = jsonmaker.load_json_file(os.path.join(directory, f"generation-{number:06d}.json"), None)
+    return {path for entry in generation['documents'] for path in (entry['file'], entry['index'])}
+
+
+def read_records(generation):
+    records = {}
+    for entry in generation.manifest:
+        doc, size = app.read_document(entry['file'], entry['offset'], entry['size'])
+        records[doc.pop('url')] = doc
+    return records
+
+
+@pytest.fixture
+def records(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return {
+        "a": record("Gemeente A", "Opslaan van gevaarlijke stoffen"),
+        "b": record("Gemeente B", "Geluid"),
+        "c": record("Gemeente C", "Windturbines", "Bodem"),
+    }
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    # Houdt bij welke koppen-index-entries de SegmentLoader parseert
+    calls = []
+
+    def prepare_index_entry(entry):
+        calls.append(entry)
+        return original(entry)
+    original = app.prepare_index_entry
+    monkeypatch.setattr(app, 'prepare_index_entry', prepare_index_entry)
+    return calls
+
+
+def test_only_changed_segment_is_parsed(records, parsed):
+    loader = app.SegmentLoader('segments')
+    assert loader.current() is None
+    assert commit_generation(records) == 1
+    first = loader.current()
+    assert first.number == 1 and len(parsed) == 3
+
+    parsed.clear()
+    records["b"] = record("Gemeente B", "Trillingen")
+    assert commit_generation(records) == 2
+    second = loader.current()
+    assert second.number == 2 and loader.swaps == 2
+    assert len(parsed) == 1
+    assert second.heading_index["a"] is first.heading_index["a"]
+    assert second.heading_index["c"] is first.heading_index["c"]
+    assert second.heading_index["b"] is not first.heading_index["b"]
+    assert [title for title, lower, anchor in second.heading_index["b"]['titles']] == ["Paragraaf 1.1 Trillingen"]
+    assert loader.current() is second
+
+    # Zonder wijzigingen geen nieuwe generatie en niets opnieuw geparsed
+    parsed.clear()
+    assert commit_generation(records) == 2
+    assert loader.current() is second and not parsed
+
+
+def test_reader_keeps_old_generation_after_swap(records):
+    loader = app.SegmentLoader('segments')
+    commit_generation(records)
+    old = loader.current()
+    old_records = dict(records)
+
+    # Een zoekopdracht die de oude generatie vasthoudt, terwijl er (tot aan de bewaargrens) nieuwe komen
+    for i in range(jsonmaker.KEEP_GENERATIONS - 1):
+        records["b"] = record("Gemeente B", f"Trillingen {i}")
+        commit_generation(records)
+        assert loader.current().number == old.number + i + 1
+        assert old.number == 1
+        assert [title for title, lower, anchor in old.heading_index["b"]['titles']] == ["Paragraaf 1.1 Geluid"]
+        assert read_records(old) == old_records
+    assert read_records(loader.current()) == records
+
+
+def test_gc_keeps_exactly_keep_generations(records):
+    changes = 2 * jsonmaker.KEEP_GENERATIONS + 1
+    for number in range(1, changes + 1):
+        records["b" if number % 2 else "c"] = record(f"Gemeente {number}", f"Onderwerp {number}")
+        assert commit_generation(records) == number
+        kept = generation_numbers()
+        assert kept == list(range(max(1, number - jsonmaker.KEEP_GENERATIONS + 1), number + 1))
+        referenced = set().union(*(referenced_files(kept_number) for kept_number in kept))
+        # Alles waar een bewaarde generatie naar verwijst bestaat nog; de rest is opgeruimd
+        assert segment_files() == referenced
+    # 'a' is nooit gewijzigd: zijn segment uit generatie 1 wordt door alle bewaarde generaties gebruikt
+    first_a = jsonmaker.read_generation('segments')[1]["a"]
+    assert os.path.exists(first_a['file']) and os.path.exists(first_a['index'])
+    assert read_records(app.SegmentLoader('segments').current()) == records
+
+
+def test_swap_with_same_mtime_and_size(records):
+    # Twee generaties kort na elkaar: CURRENT ('1' -> '2') heeft dan mogelijk dezelfde mtime en grootte
+    loader = app.SegmentLoader('segments')
+    commit_generation(records)
+    stat = os.stat(os.path.join('segments', 'CURRENT'))
+    assert loader.current().number == 1
+    records["b"] = record("Gemeente B", "Trillingen")
+    commit_generation(records)
+    os.utime(os.path.join('segments', 'CURRENT'), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert loader.current().number == 2
+
+
+def write_cache_file(records, filename='omgevingsplannen_1.jsonl.gz'):
+    writer = jsonmaker.CacheFileWriter(filename)
+    for url, doc in records.items():
+        writer.write(url, doc)
+    writer.close()
+    return filename
+
+
+def test_run_without_segments_invalidates_current(records, monkeypatch):
+    loader = app.SegmentLoader('segments')
+    monkeypatch.setattr(app, 'segment_loader', lambda: loader)
+    cache_file = write_cache_file(records)
+    jsonmaker.rebuild_indexes_from_files([cache_file], sections_file='sections.db', segments_dir='segments')
+    assert app.current_generation().number == 1
+    assert app.load_manifest() is app.current_generation().manifest
+
+    records["b"] = record("Gemeente B", "Trillingen")
+    jsonmaker.rebuild_indexes_from_files([write_cache_file(records)], sections_file='sections.db')
+    assert not os.path.exists(os.path.join('segments', 'CURRENT'))
+    assert app.current_generation() is None
+    assert [title for title, lower, anchor in app.load_heading_index()["b"]['titles']] == ["Paragraaf 1.1 Trillingen"]
+
+
+def test_generation_older_than_manifest_is_ignored(records, monkeypatch):
+    # Bijv. een CURRENT van vóór deze wijziging, of een handmatig teruggezet manifest
+    loader = app.SegmentLoader('segments')
+    monkeypatch.setattr(app, 'segment_loader', lambda: loader)
+    commit_generation(records)
+    jsonmaker.save_manifest([], 'manifest.json')
+    stat = os.stat(os.path.join('segments', 'CURRENT'))
+    current = stat.st_mtime_ns
+    os.utime('manifest.json', ns=(current + 10**9, current + 10**9))
+    assert app.current_generation() is None
+    assert app.load_manifest() == []
+
+    # Een --segments-run zonder wijzigingen vervangt CURRENT toch, zodat de generatie weer geldt
+    assert commit_generation(records) == 1
+    assert os.stat(os.path.join('segments', 'CURRENT')).st_ino != stat.st_ino
+    os.utime(os.path.join('segments', 'CURRENT'), ns=(current + 2 * 10**9, current + 2 * 10**9))
+    assert app.current_generation().number == 1